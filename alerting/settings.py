@@ -140,3 +140,56 @@ REST_FRAMEWORK = {
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
+
+# Notification delivery: recipients handled and committed per fan-out/reminder chunk
+NOTIFICATIONS_DELIVERY_BATCH_SIZE = 500
+
+# Worker threads per delivery channel for batch sends (1 = run inline on the caller)
+NOTIFICATIONS_CHANNEL_CONCURRENCY = {
+    'in_app': 1,
+    'email': 4,
+    'sms': 4,
+}
+
+# Delivery log retention in days, keyed "<channel>:<status>", "<channel>", "*:<status>"
+# or "*" (most specific wins; None keeps rows). `manage.py prune_deliveries` applies it,
+# writing pruned rows to NOTIFICATIONS_DELIVERY_ARCHIVE_DIR first when that is set.
+NOTIFICATIONS_DELIVERY_RETENTION_DAYS = {
+    '*': 90,
+    'in_app': 30,
+    '*:failed': 180,
+}
+NOTIFICATIONS_DELIVERY_ARCHIVE_DIR = None
+NOTIFICATIONS_PRUNE_BATCH_SIZE = 1000
+
+# Outgoing email for the email alert channel. Defaults point at a local debug
+# server, e.g. `python -m aiosmtpd -n -l localhost:1025`.
+EMAIL_HOST = 'localhost'
+EMAIL_PORT = 1025
+DEFAULT_FROM_EMAIL = 'alerts@example.com'
+# Persistent SMTP connections kept open by the email channel
+NOTIFICATIONS_SMTP_POOL_SIZE = 4
+
+# SMS alert channel: HTTP gateway and provider throughput limit (messages/second,
+# shared by all processes through the database; bursts up to NOTIFICATIONS_SMS_BURST)
+NOTIFICATIONS_SMS_GATEWAY_URL = 'http://localhost:8025/send'
+NOTIFICATIONS_SMS_RATE_PER_SECOND = 10
+NOTIFICATIONS_SMS_BURST = 20
+
+# Per-user visible-alert sets are cached here, keyed by an alert version kept in
+# the database, so a per-process cache stays correct; use a shared cache
+# (e.g. Redis/Memcached) in multi-process deployments for better hit rates.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+NOTIFICATIONS_VISIBILITY_CACHE_SECONDS = 300
+
+# Live push of in-app deliveries (GET /api/my-alerts/stream/, served under ASGI).
+# InProcessBroadcaster only sees deliveries made in the ASGI process itself;
+# DeliveryLogBroadcaster tails delivery rows, so it also picks up sends from
+# run_delivery_worker and run_scheduler.
+NOTIFICATIONS_BROADCAST_BACKEND = 'notifications.broadcast.DeliveryLogBroadcaster'
+NOTIFICATIONS_STREAM_POLL_SECONDS = 1.0
+NOTIFICATIONS_STREAM_KEEPALIVE_SECONDS = 15
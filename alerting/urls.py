@@ -18,18 +18,28 @@ from django.contrib import admin
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from notifications.views import AlertViewSet, MyAlertsViewSet, analytics_view
-from notifications import web_views
+from notifications.views import (
+    AlertViewSet,
+    DeliveryJobViewSet,
+    MyAlertsViewSet,
+    analytics_timeseries,
+    analytics_view,
+)
+from notifications import streams, web_views
 from django.contrib.auth import views as auth_views
 
 router = DefaultRouter()
 router.register(r'alerts', AlertViewSet, basename='alerts')
 router.register(r'my-alerts', MyAlertsViewSet, basename='my-alerts')
+router.register(r'delivery-jobs', DeliveryJobViewSet, basename='delivery-jobs')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Before the router, whose my-alerts/<pk>/ route would otherwise match
+    path('api/my-alerts/stream/', streams.my_alerts_stream, name='my_alerts_stream'),
     path('api/', include(router.urls)),
     path('api/analytics/', analytics_view),
+    path('api/analytics/timeseries/', analytics_timeseries),
     path('', web_views.home, name='home'),
     path('dashboard/', web_views.dashboard, name='dashboard'),
     path('teams/', web_views.manage_teams, name='manage_teams'),
@@ -37,7 +47,7 @@ urlpatterns = [
     path('alerts/', web_views.manage_alerts, name='manage_alerts'),
     path('alerts/<int:alert_id>/', web_views.manage_alerts, name='edit_alert'),
     path('pref/<int:pref_id>/toggle-read/', web_views.toggle_read, name='toggle_read'),
-    path('pref/<int:pref_id>/snooze-today/', web_views.snooze_today, name='snooze_today'),
+    path('pref/<int:pref_id>/snooze/', web_views.snooze_pref, name='snooze_pref'),
     path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
     path('logout/', web_views.logout_to_home, name='logout'),
 ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Team, User, Alert, NotificationDelivery, UserAlertPreference
+from .models import Team, User, Alert, DeferredDelivery, FanOutJob, NotificationDelivery, UserAlertPreference
 
 
 @admin.register(Team)
@@ -10,7 +10,7 @@ class TeamAdmin(admin.ModelAdmin):
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ("id", "username", "email", "team")
+    list_display = ("id", "username", "email", "phone_number", "team", "time_zone")
     list_filter = ("team",)
     search_fields = ("username", "email")
 
@@ -27,10 +27,35 @@ class AlertAdmin(admin.ModelAdmin):
 class NotificationDeliveryAdmin(admin.ModelAdmin):
     list_display = ("id", "alert", "user", "channel", "status", "sent_at")
     list_filter = ("channel", "status")
-    search_fields = ("message_snapshot",)
+    search_fields = ("revision__message",)
 
 
 @admin.register(UserAlertPreference)
 class UserAlertPreferenceAdmin(admin.ModelAdmin):
-    list_display = ("id", "alert", "user", "is_read", "snoozed_on", "last_reminded_at")
+    list_display = ("id", "alert", "user", "is_read", "snoozed_until", "last_reminded_at", "next_reminder_at")
     list_filter = ("is_read",)
+
+
+@admin.register(FanOutJob)
+class FanOutJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "alert",
+        "status",
+        "processed",
+        "sent",
+        "failed",
+        "deferred",
+        "attempts",
+        "not_before",
+        "claimed_by",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status",)
+
+
+@admin.register(DeferredDelivery)
+class DeferredDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("id", "alert", "user", "channel", "reminder", "not_before", "created_at")
+    list_filter = ("channel", "reminder")
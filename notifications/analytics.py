@@ -0,0 +1,127 @@
+"""Hourly and daily event rollups feeding the analytics endpoints.
+
+Write paths call ``record`` with a ``Counter`` of events. Each event key is
+``(metric, severity, channel, status)``, and each event is added to both its
+hour and its day bucket. Reads then sum a bounded number of rollup rows and
+never count deliveries or preferences directly.
+"""
+from __future__ import annotations
+
+import operator
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import reduce
+from typing import Iterable
+
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import AnalyticsRollup
+
+# Event kinds
+DELIVERY = "delivery"  # one per attempted send; status sent/failed/deferred
+ALERT_CREATED = "alert_created"
+READ = "read"
+UNREAD = "unread"
+SNOOZE = "snooze"
+
+METRICS = [DELIVERY, ALERT_CREATED, READ, UNREAD, SNOOZE]
+DIMENSIONS = ["severity", "channel", "status"]
+
+EventKey = tuple[str, str, str, str]
+
+# Longest range a timeseries request may cover, and the default when none is given
+MAX_RANGE = {
+    AnalyticsRollup.Granularity.HOUR: timedelta(days=31),
+    AnalyticsRollup.Granularity.DAY: timedelta(days=366),
+}
+DEFAULT_RANGE = {
+    AnalyticsRollup.Granularity.HOUR: timedelta(days=1),
+    AnalyticsRollup.Granularity.DAY: timedelta(days=30),
+}
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    if granularity == AnalyticsRollup.Granularity.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def record(events: Counter[EventKey], at: datetime | None = None) -> None:
+    """Add ``events`` to the hour and day buckets containing ``at`` (default: now).
+
+    Missing rows are inserted first with conflict-ignore, then all of them are
+    incremented by one ``F()`` UPDATE (a CASE picks each row's amount), so
+    concurrent writers never lose counts.
+    """
+    events = +events  # drop zero/negative entries
+    if not events:
+        return
+    at = at or timezone.now()
+    rows = [
+        (granularity, bucket_start(at, granularity), key, count)
+        for granularity in AnalyticsRollup.Granularity.values
+        for key, count in events.items()
+    ]
+    AnalyticsRollup.objects.bulk_create(
+        [
+            AnalyticsRollup(
+                granularity=granularity, bucket=bucket, metric=metric, severity=severity, channel=channel, status=status
+            )
+            for granularity, bucket, (metric, severity, channel, status), _ in rows
+        ],
+        ignore_conflicts=True,
+    )
+    matches = [
+        (
+            Q(granularity=granularity, bucket=bucket, metric=metric, severity=severity, channel=channel, status=status),
+            count,
+        )
+        for granularity, bucket, (metric, severity, channel, status), count in rows
+    ]
+    AnalyticsRollup.objects.filter(reduce(operator.or_, [match for match, _ in matches])).update(
+        count=F("count") + Case(*[When(match, then=Value(count)) for match, count in matches], default=Value(0))
+    )
+
+
+def event(metric: str, severity: str = "", channel: str = "", status: str = "") -> Counter[EventKey]:
+    return Counter({(metric, severity, channel, status): 1})
+
+
+def timeseries(
+    metric: str,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    group_by: Iterable[str] = (),
+) -> list[dict]:
+    """Per-bucket counts of ``metric`` in ``[start, end)``, optionally split by dimensions."""
+    group_by = [name for name in DIMENSIONS if name in group_by]
+    return list(
+        AnalyticsRollup.objects.filter(
+            granularity=granularity, metric=metric, bucket__gte=bucket_start(start, granularity), bucket__lt=end
+        )
+        .values("bucket", *group_by)
+        .annotate(count=Sum("count"))
+        .order_by("bucket", *group_by)
+    )
+
+
+def day_total(metric: str, day: datetime | None = None) -> int:
+    """Count of ``metric`` in the local day containing ``day`` (default: today), from its daily rollup."""
+    bucket = bucket_start(day or timezone.now(), AnalyticsRollup.Granularity.DAY)
+    rows = AnalyticsRollup.objects.filter(granularity=AnalyticsRollup.Granularity.DAY, metric=metric, bucket=bucket)
+    return rows.aggregate(count=Sum("count"))["count"] or 0
+
+
+def totals(metric: str, group_by: Iterable[str] = ()) -> list[dict]:
+    """All-time counts of ``metric`` summed over the daily rollups."""
+    group_by = [name for name in DIMENSIONS if name in group_by]
+    return list(
+        AnalyticsRollup.objects.filter(granularity=AnalyticsRollup.Granularity.DAY, metric=metric)
+        .values(*group_by)
+        .annotate(count=Sum("count"))
+        .order_by(*group_by)
+    )
+
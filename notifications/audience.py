@@ -0,0 +1,149 @@
+"""Maintenance of the materialized ``AlertAudience`` table.
+
+An alert's audience depends only on its ``visibility`` mode and, for that
+mode, either every user, the members of its target teams or its target
+users. The helpers here apply each kind of change to just the rows it can
+affect; ``rebuild_alert_audience`` recomputes one alert from scratch and is
+also what the ``rebuild_audience`` command runs to repair drift (e.g. after
+raw ``bulk_create`` calls, which send no signals).
+
+Whole-alert rebuilds (a new alert, a visibility or team-target change, an
+alert coming back to life) can touch every user, so saves only ``mark_stale``
+and the delivery worker and reminder runs call ``rebuild_stale`` outside the
+request. Until then visibility falls back to the targeting rule for stale
+alerts. New or moved users only join live alerts; dead ones are rebuilt if
+they revive.
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.db.models import Exists, OuterRef, QuerySet
+
+from . import unread
+from .models import Alert, AlertAudience, Team, User, UserAlertPreference
+from .services import DELIVERY_BATCH_SIZE, bump_change_counter, iter_batches
+from .visibility import ALERTS_VERSION_COUNTER, targets
+
+
+def targeted_users(alert: Alert) -> QuerySet[User]:
+    """Users ``alert`` is aimed at, by its stored targeting (see ``visibility.targets``)."""
+    aimed = Alert.objects.filter(pk=alert.pk).filter(targets(OuterRef(OuterRef("pk")), OuterRef(OuterRef("team_id"))))
+    return User.objects.filter(Exists(aimed))
+
+
+def add_audience(alert_id: int, user_ids: Iterable[int]) -> None:
+    for batch in iter_batches(user_ids, DELIVERY_BATCH_SIZE):
+        AlertAudience.objects.bulk_create(
+            [AlertAudience(alert_id=alert_id, user_id=user_id) for user_id in batch], ignore_conflicts=True
+        )
+
+
+def remove_audience(rows: QuerySet[AlertAudience]) -> None:
+    """Delete audience ``rows`` and cancel the pending reminders they carried.
+
+    Users dropped from an alert are never reminded again, so their rows come
+    out of the due-time index instead of being filtered on every pass.
+    """
+    dropped = rows.filter(alert=OuterRef("alert_id"), user=OuterRef("user_id"))
+    UserAlertPreference.objects.filter(Exists(dropped), next_reminder_at__isnull=False).update(next_reminder_at=None)
+    rows.delete()
+
+
+def remove_user(alert: Alert, user_ids: Iterable[int]) -> None:
+    """Drop directly targeted ``user_ids`` from ``alert``'s audience."""
+    remove_audience(AlertAudience.objects.filter(alert=alert, user__in=user_ids))
+
+
+def rebuild_alert_audience(alert: Alert) -> None:
+    """Make ``alert``'s audience rows match its current targeting."""
+    users = targeted_users(alert)
+    remove_audience(AlertAudience.objects.filter(alert=alert).exclude(user__in=users.values("pk")))
+    # Keyset pages keep memory bounded for org-wide alerts
+    user_ids = users.order_by("pk").values_list("pk", flat=True)
+    last_id = 0
+    while batch := list(user_ids.filter(pk__gt=last_id)[:DELIVERY_BATCH_SIZE]):
+        add_audience(alert.pk, batch)
+        last_id = batch[-1]
+
+
+def rebuild_all() -> int:
+    count = 0
+    Alert.objects.filter(audience_stale=True).update(audience_stale=False)
+    for alert in Alert.objects.only("id", "visibility").iterator():
+        rebuild_alert_audience(alert)
+        count += 1
+    return count
+
+
+def mark_stale(alert: Alert) -> None:
+    """Queue a full rebuild of ``alert``'s audience for the next worker or reminder pass."""
+    alert.audience_stale = True
+    Alert.objects.filter(pk=alert.pk).update(audience_stale=True)
+
+
+def rebuild_if_stale(alert: Alert) -> bool:
+    """Rebuild ``alert``'s audience if it is marked stale; returns whether it was.
+
+    Clearing the flag with a conditional UPDATE claims the rebuild, so two
+    workers never run the same one, and a retargeting saved meanwhile marks
+    the alert stale again for the next pass.
+    """
+    if not Alert.objects.filter(pk=alert.pk, audience_stale=True).update(audience_stale=False):
+        return False
+    alert.audience_stale = False
+    try:
+        rebuild_alert_audience(alert)
+    except BaseException:
+        mark_stale(alert)
+        raise
+    bump_change_counter(ALERTS_VERSION_COUNTER)
+    return True
+
+
+def rebuild_stale() -> int:
+    """Rebuild every alert marked stale; returns how many were rebuilt."""
+    count = 0
+    for alert in Alert.objects.filter(audience_stale=True).only("id", "visibility").order_by("pk"):
+        count += rebuild_if_stale(alert)
+    return count
+
+
+def team_alert_ids(team_id: int, alerts: QuerySet[Alert] | None = None) -> QuerySet:
+    alerts = Alert.objects.all() if alerts is None else alerts
+    return alerts.filter(visibility=Alert.VISIBILITY_TEAM, target_teams=team_id).values_list("pk", flat=True)
+
+
+def live_alerts() -> QuerySet[Alert]:
+    return unread.live_alerts(unread.expiry_watermark())
+
+
+def add_user(user: User) -> None:
+    """Insert a new user into every live org-wide alert and their team's live alerts."""
+    alerts = live_alerts()
+    alert_ids = list(alerts.filter(visibility=Alert.VISIBILITY_ORG).values_list("pk", flat=True))
+    if user.team_id:
+        alert_ids += list(team_alert_ids(user.team_id, alerts))
+    AlertAudience.objects.bulk_create(
+        [AlertAudience(alert_id=alert_id, user=user) for alert_id in alert_ids], ignore_conflicts=True
+    )
+
+
+def move_user(user: User, old_team_id: int | None) -> None:
+    """Swap ``user``'s team-targeted rows after a team change.
+
+    An alert has exactly one visibility mode, so leaving a team can only
+    drop team-visibility alerts; org and direct targets are unaffected.
+    """
+    if old_team_id:
+        remove_audience(AlertAudience.objects.filter(user=user, alert__in=team_alert_ids(old_team_id)))
+    if user.team_id:
+        AlertAudience.objects.bulk_create(
+            [AlertAudience(alert_id=alert_id, user=user) for alert_id in team_alert_ids(user.team_id, live_alerts())],
+            ignore_conflicts=True,
+        )
+
+
+def remove_team(team: Team) -> None:
+    """Drop the rows a team contributed; its members are about to lose the team."""
+    remove_audience(AlertAudience.objects.filter(user__team=team, alert__in=team_alert_ids(team.pk)))
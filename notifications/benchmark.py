@@ -0,0 +1,347 @@
+"""Synthetic-scale data generator and timing harness for the ``benchmark`` command."""
+from __future__ import annotations
+
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from typing import Callable
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import audience, funnel, retention, revisions, stats
+from .audience import rebuild_all
+from .jobs import claim_job, deliver_alert
+from .models import Alert, DeferredDelivery, NotificationDelivery, Team, User, UserAlertPreference
+from .services import (
+    BulkAction,
+    bulk_update_preferences,
+    enqueue_fanout,
+    flush_deferred,
+    iter_batches,
+    mark_read,
+    run_fanout,
+    trigger_reminders,
+)
+
+
+@dataclass
+class Scale:
+    users: int
+    teams: int
+    alerts: int
+    preferences: int
+
+
+SCALES = {
+    "small": Scale(users=1_000, teams=20, alerts=50, preferences=20_000),
+    "medium": Scale(users=10_000, teams=100, alerts=500, preferences=250_000),
+    "large": Scale(users=100_000, teams=500, alerts=2_000, preferences=2_000_000),
+}
+
+INSERT_BATCH_SIZE = 5_000
+
+
+def generate(scale: Scale, seed: int = 0) -> None:
+    """Populate the current database with ``scale`` worth of teams, users, alerts and preferences."""
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    Team.objects.bulk_create([Team(name=f"bench-team-{i}") for i in range(scale.teams)])
+    team_ids = list(Team.objects.values_list("id", flat=True))
+
+    for batch in iter_batches(range(scale.users), INSERT_BATCH_SIZE):
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"bench-user-{i}",
+                    email=f"bench-user-{i}@example.com",
+                    password="!",  # unusable; skips password hashing
+                    team_id=rng.choice(team_ids),
+                )
+                for i in batch
+            ]
+        )
+    user_ids = list(User.objects.values_list("id", flat=True))
+
+    visibilities = [Alert.VISIBILITY_ORG, Alert.VISIBILITY_TEAM, Alert.VISIBILITY_USER]
+    severities = [choice for choice, _ in Alert.Severity.choices]
+    Alert.objects.bulk_create(
+        [
+            Alert(
+                title=f"Bench alert {i}",
+                message="Synthetic benchmark alert. " * 8,
+                severity=rng.choice(severities),
+                visibility=rng.choice(visibilities),
+                start_at=now - timedelta(days=1),
+                expires_at=now + timedelta(days=rng.randint(-1, 30)),
+            )
+            for i in range(scale.alerts)
+        ]
+    )
+    alerts = list(Alert.objects.only("id", "visibility"))
+    team_through = Alert.target_teams.through
+    user_through = Alert.target_users.through
+    team_links, user_links = [], []
+    for alert in alerts:
+        if alert.visibility == Alert.VISIBILITY_TEAM:
+            team_links += [team_through(alert_id=alert.id, team_id=t) for t in rng.sample(team_ids, min(3, len(team_ids)))]
+        elif alert.visibility == Alert.VISIBILITY_USER:
+            user_links += [user_through(alert_id=alert.id, user_id=u) for u in rng.sample(user_ids, min(20, len(user_ids)))]
+    team_through.objects.bulk_create(team_links, batch_size=INSERT_BATCH_SIZE)
+    user_through.objects.bulk_create(user_links, batch_size=INSERT_BATCH_SIZE)
+    # bulk_create sends no signals, so materialize the audience and revisions in one pass
+    rebuild_all()
+    revisions.record_missing()
+
+    per_alert = min(len(user_ids), max(scale.preferences // max(len(alerts), 1), 1))
+    prefs = []
+    for alert in alerts:
+        for user_id in rng.sample(user_ids, per_alert):
+            roll = rng.random()
+            delivered_at = now - timedelta(minutes=rng.randint(0, 600))
+            prefs.append(
+                UserAlertPreference(
+                    alert_id=alert.id,
+                    user_id=user_id,
+                    is_read=roll < 0.4,
+                    snoozed_until=now + timedelta(hours=4) if 0.4 <= roll < 0.5 else None,
+                    seen_at=delivered_at,
+                    delivered_at=delivered_at,
+                    first_read_at=now if roll < 0.4 else None,
+                    first_snoozed_at=now if 0.4 <= roll < 0.5 else None,
+                    last_reminded_at=delivered_at,
+                    next_reminder_at=None if roll < 0.4 else now - timedelta(minutes=rng.randint(-120, 120)),
+                )
+            )
+            if len(prefs) >= INSERT_BATCH_SIZE:
+                UserAlertPreference.objects.bulk_create(prefs, ignore_conflicts=True)
+                prefs = []
+    UserAlertPreference.objects.bulk_create(prefs, ignore_conflicts=True)
+    stats.reconcile()
+    funnel.reconcile()
+
+
+@dataclass
+class Case:
+    name: str
+    # Prepares state (untimed) and returns the operation to measure
+    setup: Callable[[], Callable[[], object]]
+
+
+@dataclass
+class Measurement:
+    wall_seconds: list[float] = field(default_factory=list)
+    queries: int = 0
+    peak_memory_bytes: int = 0
+
+    def summary(self) -> dict:
+        return {
+            "wall_seconds": {
+                "min": min(self.wall_seconds),
+                "median": statistics.median(self.wall_seconds),
+                "runs": self.wall_seconds,
+            },
+            "queries": self.queries,
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+
+def api_get(user: User, path: str) -> Callable[[], object]:
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def run():
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        return response
+
+    return run
+
+
+def api_post(user: User, path: str, data: dict, status: int = 200) -> Callable[[], object]:
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def run():
+        response = client.post(path, data, format="json")
+        assert response.status_code == status, (path, response.status_code)
+        return response
+
+    return run
+
+
+def web_get(user: User, path: str) -> Callable[[], object]:
+    client = Client()
+    client.force_login(user)
+
+    def run():
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        return response
+
+    return run
+
+
+def default_cases() -> list[Case]:
+    regular = User.objects.filter(is_staff=False).order_by("pk").first()
+    staff = User.objects.filter(username="bench-admin").first() or User.objects.create(
+        username="bench-admin", password="!", is_staff=True
+    )
+    recipients = User.objects.filter(is_staff=False).order_by("pk")
+
+    def own_preference() -> UserAlertPreference:
+        pref, _ = UserAlertPreference.objects.get_or_create(user=regular, alert=Alert.objects.earliest("pk"))
+        return pref
+
+    def deliver():
+        alert = Alert.objects.create(title="Bench org alert", message="Synthetic org-wide alert")
+        return lambda: deliver_alert(alert)
+
+    def fanout():
+        # A job already claimed by a worker, with its audience built: just the fan-out loop
+        alert = Alert.objects.create(title="Bench worker alert", message="Synthetic org-wide alert")
+        job = enqueue_fanout(alert)
+        claim_job(job, "bench:1")
+        audience.rebuild_if_stale(alert)
+        return lambda: run_fanout(job)
+
+    def reminders():
+        UserAlertPreference.objects.filter(is_read=False).update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+        return trigger_reminders
+
+    def flush():
+        alert = Alert.objects.earliest("pk")
+        due = timezone.now() - timedelta(minutes=1)
+        DeferredDelivery.objects.bulk_create(
+            [
+                DeferredDelivery(alert=alert, user=user, channel=alert.delivery_type, not_before=due)
+                for user in recipients
+            ]
+        )
+        return flush_deferred
+
+    def prune():
+        alert = Alert.objects.earliest("pk")
+        rows = NotificationDelivery.objects.bulk_create(
+            [NotificationDelivery(alert=alert, user=user) for user in recipients]
+        )
+        # sent_at is set on insert; age the new rows past the policy below
+        NotificationDelivery.objects.filter(pk__in=[row.pk for row in rows]).update(
+            sent_at=timezone.now() - timedelta(days=60)
+        )
+        return lambda: retention.prune(archive_dir=None, policy={"*": 30})
+
+    def read_one():
+        pref = mark_read(own_preference(), False)
+        return api_post(regular, f"/api/my-alerts/{pref.pk}/read/", {"is_read": True})
+
+    def snooze_one():
+        pref = own_preference()
+        bulk_update_preferences(regular, UserAlertPreference.objects.filter(pk=pref.pk), BulkAction.UNSNOOZE)
+        return api_post(regular, f"/api/my-alerts/{pref.pk}/snooze/", {"duration": "1h"})
+
+    def mark_all_read():
+        bulk_update_preferences(regular, UserAlertPreference.objects.all(), BulkAction.UNREAD)
+        return api_post(regular, "/api/my-alerts/bulk/", {"action": "read", "filter": {}})
+
+    def bulk_snooze():
+        own_preference()
+        bulk_update_preferences(regular, UserAlertPreference.objects.all(), BulkAction.UNSNOOZE)
+        ids = list(UserAlertPreference.objects.filter(user=regular).values_list("pk", flat=True))
+        return api_post(regular, "/api/my-alerts/bulk/", {"action": "snooze", "ids": ids, "duration": "1h"})
+
+    def deliver_now():
+        alert = Alert.objects.create(title="Bench queued alert", message="Synthetic org-wide alert")
+        return api_post(staff, f"/api/alerts/{alert.pk}/deliver_now/", {}, status=202)
+
+    def job_status():
+        job = enqueue_fanout(Alert.objects.earliest("pk"))
+        return api_get(staff, f"/api/delivery-jobs/{job.pk}/")
+
+    return [
+        Case("deliver_alert", deliver),
+        Case("run_fanout", fanout),
+        Case("trigger_reminders", reminders),
+        Case("flush_deferred", flush),
+        Case("prune_deliveries", prune),
+        Case("my_alerts_list", lambda: api_get(regular, "/api/my-alerts/")),
+        Case("my_alert_detail", lambda: api_get(regular, f"/api/my-alerts/{own_preference().pk}/")),
+        Case("unread_count", lambda: api_get(regular, "/api/my-alerts/unread-count/")),
+        Case("mark_read", read_one),
+        Case("snooze", snooze_one),
+        Case("mark_all_read", mark_all_read),
+        Case("bulk_snooze", bulk_snooze),
+        Case("dashboard", lambda: web_get(regular, "/dashboard/")),
+        Case("analytics_view", lambda: api_get(staff, "/api/analytics/")),
+        Case("analytics_timeseries", lambda: api_get(staff, "/api/analytics/timeseries/?group_by=severity,channel")),
+        Case("alerts_admin_list", lambda: api_get(staff, "/api/alerts/")),
+        Case("alert_funnel", lambda: api_get(staff, f"/api/alerts/{Alert.objects.earliest('pk').pk}/funnel/")),
+        Case("deliver_now", deliver_now),
+        Case("job_status", job_status),
+    ]
+
+
+def measure(case: Case, repeat: int) -> Measurement:
+    result = Measurement()
+    for _ in range(repeat):
+        operation = case.setup()
+        started = time.perf_counter()
+        operation()
+        result.wall_seconds.append(time.perf_counter() - started)
+    # One extra instrumented run, so query logging and tracemalloc don't skew the timings
+    operation = case.setup()
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        operation()
+    result.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result.queries = len(queries)
+    return result
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale: Scale, repeat: int = 3, only: list[str] | None = None, log=print) -> dict:
+    started = time.perf_counter()
+    generate(scale)
+    log(f"Generated data in {time.perf_counter() - started:.1f}s")
+    results = {}
+    for case in default_cases():
+        if only and case.name not in only:
+            continue
+        results[case.name] = measure(case, repeat).summary()
+        log(
+            f"{case.name}: median {results[case.name]['wall_seconds']['median'] * 1000:.1f} ms, "
+            f"{results[case.name]['queries']} queries, "
+            f"peak {results[case.name]['peak_memory_bytes'] / 1024:.0f} KiB"
+        )
+    return {
+        "meta": {
+            "timestamp": timezone.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "scale": asdict(scale),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
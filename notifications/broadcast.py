@@ -0,0 +1,191 @@
+"""Pub/sub for pushing in-app deliveries to connected stream clients.
+
+``InAppChannel`` publishes one event per delivered user; the SSE view in
+``notifications.streams`` subscribes per connection. Subscribers are plain
+``asyncio.Queue`` objects on the ASGI event loop, so an idle connection costs
+a queue and a suspended coroutine, not a thread or a polling request.
+
+The backend is chosen with ``NOTIFICATIONS_BROADCAST_BACKEND``:
+
+* ``InProcessBroadcaster`` hands events straight to subscribers of the same
+  process. Enough when deliveries run in the ASGI process itself.
+* ``DeliveryLogBroadcaster`` ignores ``publish`` and instead tails the
+  in-app ``NotificationDelivery`` rows with one primary-key range query per
+  poll per process, so deliveries made by ``run_delivery_worker`` or
+  ``run_scheduler`` reach clients connected to any ASGI process.
+
+Other transports (Redis pub/sub, Postgres LISTEN/NOTIFY) can subclass
+``Broadcaster`` and call ``deliver`` from their receive loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Alert, NotificationDelivery
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection; a client further behind than this misses
+# events and should resync through the REST API
+SUBSCRIBER_QUEUE_SIZE = getattr(settings, "NOTIFICATIONS_STREAM_QUEUE_SIZE", 100)
+
+
+def delivery_event(alert: Alert, sent_at: datetime | None = None) -> dict[str, Any]:
+    return {
+        "alert": {
+            "id": alert.pk,
+            "title": alert.title,
+            "message": alert.message,
+            "severity": alert.severity,
+        },
+        "sent_at": (sent_at or timezone.now()).isoformat(),
+    }
+
+
+class Subscription:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Dropping stream event for user %s: subscriber is too far behind", self.user_id)
+
+    async def get(self, timeout: float) -> dict | None:
+        """Next event, or None if nothing arrived within ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broadcaster(ABC):
+    """Tracks the subscribers of this process and hands them events."""
+
+    def __init__(self):
+        self._subscribers: dict[int, set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscribed_user_ids(self) -> set[int]:
+        with self._lock:
+            return set(self._subscribers)
+
+    def deliver(self, user_id: int, event: dict) -> None:
+        """Queue ``event`` for every local subscriber of ``user_id``; safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    @abstractmethod
+    def publish(self, user_id: int, event: dict) -> None:
+        """Hand ``event`` to ``user_id``'s subscribers, wherever they are connected."""
+
+
+class InProcessBroadcaster(Broadcaster):
+    def publish(self, user_id: int, event: dict) -> None:
+        self.deliver(user_id, event)
+
+
+class DeliveryLogBroadcaster(Broadcaster):
+    """Feeds subscribers from new in-app delivery rows instead of ``publish`` calls."""
+
+    POLL_INTERVAL = getattr(settings, "NOTIFICATIONS_STREAM_POLL_SECONDS", 1.0)
+    BATCH_SIZE = 1000
+
+    def __init__(self):
+        super().__init__()
+        self._last_id: int | None = None
+        self._poller: asyncio.Task | None = None
+
+    def publish(self, user_id: int, event: dict) -> None:
+        pass  # the delivery row written by the dispatcher is the event
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = super().subscribe(user_id)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        return subscription
+
+    def _fetch(self) -> list[dict]:
+        deliveries = NotificationDelivery.objects.filter(
+            channel=Alert.DeliveryType.IN_APP, status=NotificationDelivery.Status.SENT
+        )
+        if self._last_id is None:
+            # Start at the current end of the log; clients load history over REST
+            self._last_id = NotificationDelivery.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+            return []
+        return list(
+            deliveries.filter(pk__gt=self._last_id)
+            .order_by("pk")
+            .values("pk", "user_id", "sent_at", "alert_id", "alert__title", "revision__message", "alert__severity")[
+                : self.BATCH_SIZE
+            ]
+        )
+
+    async def _poll(self) -> None:
+        while self.subscribed_user_ids():
+            try:
+                rows = await sync_to_async(self._fetch)()
+            except Exception:
+                logger.exception("Polling deliveries for stream subscribers failed")
+                rows = []
+            if rows:
+                self._last_id = rows[-1]["pk"]
+                subscribed = self.subscribed_user_ids()
+                for row in rows:
+                    if row["user_id"] in subscribed:
+                        alert = Alert(
+                            pk=row["alert_id"],
+                            title=row["alert__title"],
+                            message=row["revision__message"],
+                            severity=row["alert__severity"],
+                        )
+                        self.deliver(row["user_id"], delivery_event(alert, row["sent_at"]))
+            if len(rows) < self.BATCH_SIZE:
+                await asyncio.sleep(self.POLL_INTERVAL)
+        # Nobody is listening; the next subscriber starts from the then-current end
+        self._last_id = None
+
+
+_broadcaster: Broadcaster | None = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster() -> Broadcaster:
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            backend = getattr(
+                settings, "NOTIFICATIONS_BROADCAST_BACKEND", "notifications.broadcast.InProcessBroadcaster"
+            )
+            _broadcaster = import_string(backend)()
+    return _broadcaster
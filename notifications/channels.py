@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import http.client
+import json
+import logging
+import queue
+import smtplib
+import threading
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, Sequence
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from .models import Alert, NotificationDelivery, User
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPConnectionPool:
+    """Bounded pool of persistent SMTP connections shared by sender threads.
+
+    Connections are handed out one thread at a time and returned after use,
+    so a batch of messages pays for one TCP/TLS handshake and login instead
+    of one per message. A connection that errors is discarded, never reused.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = False,
+        use_ssl: bool = False,
+        timeout: float | None = None,
+        size: int = 4,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[smtplib.SMTP] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connects = 0
+
+    @classmethod
+    def from_settings(cls) -> SMTPConnectionPool:
+        return cls(
+            host=settings.EMAIL_HOST,
+            port=settings.EMAIL_PORT,
+            username=settings.EMAIL_HOST_USER,
+            password=settings.EMAIL_HOST_PASSWORD,
+            use_tls=settings.EMAIL_USE_TLS,
+            use_ssl=settings.EMAIL_USE_SSL,
+            timeout=settings.EMAIL_TIMEOUT,
+            size=getattr(settings, "NOTIFICATIONS_SMTP_POOL_SIZE", 4),
+        )
+
+    def connect(self) -> smtplib.SMTP:
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        kwargs = {"timeout": self.timeout} if self.timeout is not None else {}
+        conn = smtp_class(self.host, self.port, **kwargs)
+        if self.use_tls:
+            conn.starttls()
+        if self.username and self.password:
+            conn.login(self.username, self.password)
+        self.connects += 1
+        return conn
+
+    @staticmethod
+    def discard(conn: smtplib.SMTP | None) -> None:
+        if conn is None:
+            return
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+            pooled = PooledConnection(self, conn)
+            try:
+                yield pooled
+            except BaseException:
+                self.discard(pooled.conn)
+                raise
+            if pooled.conn is not None:
+                self._idle.put(pooled.conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+@dataclass
+class PooledConnection:
+    pool: SMTPConnectionPool
+    conn: smtplib.SMTP | None
+
+    def sendmail(self, from_addr: str, to_addrs: list[str], msg: bytes) -> None:
+        """Send on the pooled connection, reconnecting once if the server dropped it."""
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = self.pool.connect()
+            try:
+                self.conn.sendmail(from_addr, to_addrs, msg)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self.pool.discard(self.conn)
+                self.conn = None
+                if attempt == 2:
+                    raise
+            except smtplib.SMTPResponseException:
+                # The server rejected the transaction; reset it so the connection stays usable
+                self.conn.rset()
+                raise
+
+
+class DeliveryError(Exception):
+    """A message was refused by the remote side; recorded as a FAILED delivery."""
+
+
+class Channel(ABC):
+    """Send loop shared by the network channels.
+
+    ``send_many`` opens one ``session`` per batch and calls ``_transmit`` for
+    each recipient with an address. ``DeliveryError`` or any of ``errors``
+    fails only that recipient; the rest of the batch still goes out. Rows are
+    returned unsaved, so ``send_many`` is safe to run on a worker thread.
+    """
+
+    delivery_type: str
+    errors: tuple[type[Exception], ...] = (OSError,)
+
+    @abstractmethod
+    def address(self, user: User) -> str: ...
+
+    @abstractmethod
+    def session(self) -> AbstractContextManager: ...
+
+    @abstractmethod
+    def _transmit(self, session, user: User, alert: Alert) -> None: ...
+
+    def send(self, user: User, alert: Alert) -> bool:
+        delivery = self.send_many([user], alert)[0]
+        delivery.save()
+        return delivery.status == NotificationDelivery.Status.SENT
+
+    def send_many(self, users: Sequence[User], alert: Alert) -> list[NotificationDelivery]:
+        deliveries = []
+        with self.session() as session:
+            for user in users:
+                status = NotificationDelivery.Status.FAILED
+                if self.address(user):
+                    try:
+                        self._transmit(session, user, alert)
+                        status = NotificationDelivery.Status.SENT
+                    except (DeliveryError, *self.errors) as exc:
+                        logger.warning(
+                            "%s for alert %s to user %s failed: %s", self.delivery_type, alert.pk, user.pk, exc
+                        )
+                deliveries.append(
+                    NotificationDelivery(
+                        alert=alert,
+                        user=user,
+                        channel=self.delivery_type,
+                        status=status,
+                        revision_id=alert.current_revision_id,
+                    )
+                )
+        return deliveries
+
+
+@dataclass
+class EmailChannel(Channel):
+    """Email channel sending each batch over a pooled, persistent SMTP connection.
+
+    Recipients without an address, refused recipients and rejected messages
+    are recorded as FAILED deliveries; the rest of the batch still goes out.
+    """
+
+    delivery_type = Alert.DeliveryType.EMAIL
+    errors = (smtplib.SMTPException, OSError)
+
+    pool: SMTPConnectionPool | None = None
+    from_email: str | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def get_pool(self) -> SMTPConnectionPool:
+        with self._lock:
+            if self.pool is None:
+                self.pool = SMTPConnectionPool.from_settings()
+            return self.pool
+
+    def build_message(self, user: User, alert: Alert) -> bytes:
+        message = EmailMessage(
+            subject=f"[{alert.get_severity_display()}] {alert.title}",
+            body=alert.message,
+            from_email=self.from_email or settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+        )
+        return message.message().as_bytes(linesep="\r\n")
+
+    def address(self, user: User) -> str:
+        return user.email
+
+    def session(self) -> AbstractContextManager[PooledConnection]:
+        return self.get_pool().connection()
+
+    def _transmit(self, session: PooledConnection, user: User, alert: Alert) -> None:
+        session.sendmail(self.from_email or settings.DEFAULT_FROM_EMAIL, [user.email], self.build_message(user, alert))
+
+
+@dataclass
+class SMSChannel(Channel):
+    """SMS channel posting to an HTTP gateway under a shared token-bucket rate limit.
+
+    The dispatcher asks ``rate_limiter`` for tokens before calling
+    ``send_many`` and defers whatever is over the limit, so this class only
+    has to talk to the gateway. Each batch reuses one keep-alive connection;
+    a non-2xx response fails that recipient.
+    """
+
+    delivery_type = Alert.DeliveryType.SMS
+    errors = (http.client.HTTPException, OSError)
+
+    gateway_url: str | None = None
+    rate_limiter: TokenBucket | None = None
+    timeout: float = 10.0
+
+    def __post_init__(self):
+        if self.rate_limiter is None:
+            self.rate_limiter = TokenBucket(
+                "sms",
+                rate=getattr(settings, "NOTIFICATIONS_SMS_RATE_PER_SECOND", 10),
+                capacity=getattr(settings, "NOTIFICATIONS_SMS_BURST", None),
+            )
+
+    def build_payload(self, user: User, alert: Alert) -> bytes:
+        text = f"[{alert.get_severity_display()}] {alert.title}: {alert.message}"
+        return json.dumps({"to": user.phone_number, "message": text}).encode()
+
+    def connect(self) -> tuple[http.client.HTTPConnection, str]:
+        url = urlsplit(self.gateway_url or settings.NOTIFICATIONS_SMS_GATEWAY_URL)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        return connection_class(url.netloc, timeout=self.timeout), url.path or "/"
+
+    def post(self, conn: http.client.HTTPConnection, path: str, body: bytes) -> int:
+        conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+    def address(self, user: User) -> str:
+        return user.phone_number
+
+    @contextmanager
+    def session(self) -> Iterator[tuple[http.client.HTTPConnection, str]]:
+        conn, path = self.connect()
+        try:
+            yield conn, path
+        finally:
+            conn.close()
+
+    def _transmit(self, session: tuple[http.client.HTTPConnection, str], user: User, alert: Alert) -> None:
+        conn, path = session
+        body = self.build_payload(user, alert)
+        try:
+            try:
+                code = self.post(conn, path, body)
+            except (http.client.HTTPException, ConnectionError):
+                # Keep-alive connection went away; retry once on a fresh one
+                conn.close()
+                code = self.post(conn, path, body)
+        except self.errors:
+            # Start the next recipient on a clean connection
+            conn.close()
+            raise
+        if not 200 <= code < 300:
+            raise DeliveryError(f"gateway returned {code}")
@@ -29,10 +29,12 @@ class TeamForm(BaseStyledModelForm):
 class AdminUserForm(BaseStyledModelForm):
     class Meta:
         model = User
-        fields = ["username", "email", "team", "is_staff", "is_superuser"]
+        fields = ["username", "email", "phone_number", "time_zone", "team", "is_staff", "is_superuser"]
         widgets = {
             "username": forms.TextInput(attrs={"placeholder": "username"}),
             "email": forms.EmailInput(attrs={"placeholder": "name@example.com"}),
+            "phone_number": forms.TextInput(attrs={"placeholder": "+15551234567"}),
+            "time_zone": forms.TextInput(attrs={"placeholder": "Europe/Berlin (blank: server time zone)"}),
         }
 
 
@@ -0,0 +1,159 @@
+"""Per-alert delivery funnel and time-to-read histogram.
+
+Preference write paths in ``services`` set the milestone timestamps on
+``UserAlertPreference`` (each only once) and report the transitions here, so
+``AlertFunnel`` counts are bumped with ``F()`` updates rather than recounted.
+Time to read, measured from first delivery (or from when the user first saw
+the alert if it was never delivered), goes into a fixed set of log-spaced
+``ReadLatencyBucket`` rows. ``summary`` therefore reads one funnel row and at
+most ``len(LATENCY_BOUNDS) + 1`` bucket rows, however many recipients the
+alert has. ``reconcile`` recomputes the stage counts from the milestones.
+"""
+from __future__ import annotations
+
+import operator
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import datetime
+from functools import reduce
+from typing import Iterable, Mapping, Sequence
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Value, When
+
+from .models import Alert, AlertFunnel, ReadLatencyBucket, UserAlertPreference
+from .reconciliation import count_of, reconcile_columns
+from .stats import delta_case
+
+# Upper bounds in seconds: 1m 5m 15m 30m 1h 2h 4h 8h 1d 2d 1w; the last bucket is open-ended
+LATENCY_BOUNDS = [60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400, 172800, 604800]
+PERCENTILES = [50, 90, 99]
+
+
+def create_for(alert: Alert) -> None:
+    AlertFunnel.objects.create(alert=alert)
+
+
+def bump(alert_ids: int | Iterable[int], **counts: int) -> None:
+    """Add ``counts`` (e.g. ``seen=1``) to the funnel row of each alert."""
+    alert_ids = [alert_ids] if isinstance(alert_ids, int) else list(alert_ids)
+    counts = {field: n for field, n in counts.items() if n}
+    if alert_ids and counts:
+        AlertFunnel.objects.filter(alert_id__in=alert_ids).update(
+            **{field: F(field) + n for field, n in counts.items()}
+        )
+
+
+def bump_each(**deltas: Mapping[int, int]) -> None:
+    """Add per-alert amounts (e.g. ``delivered={alert_id: n}``) to the funnel rows with a single UPDATE."""
+    alert_ids = {alert_id for per_alert in deltas.values() for alert_id, n in per_alert.items() if n}
+    if alert_ids:
+        AlertFunnel.objects.filter(alert_id__in=alert_ids).update(
+            **{field: F(field) + delta_case(per_alert) for field, per_alert in deltas.items()}
+        )
+
+
+def bucket_for(seconds: float) -> int:
+    return bisect_left(LATENCY_BOUNDS, seconds)
+
+
+def first_reads(prefs: Sequence[UserAlertPreference], read_at: datetime) -> None:
+    """Record the first read of each of ``prefs``: the read stage, its reminders and its latency.
+
+    Costs the same three statements however many preferences are passed: one
+    funnel UPDATE, one bucket insert and one bucket UPDATE whose CASE has a
+    WHEN per distinct (bucket, increment).
+    """
+    reads: Counter[int] = Counter()
+    reminders: Counter[int] = Counter()
+    latencies: Counter[tuple[int, int]] = Counter()
+    for pref in prefs:
+        reads[pref.alert_id] += 1
+        reminders[pref.alert_id] += pref.reminder_count
+        started = pref.delivered_at or pref.seen_at or pref.first_seen_at
+        latencies[pref.alert_id, bucket_for(max((read_at - started).total_seconds(), 0))] += 1
+    bump_each(read=reads, reminders_before_read=reminders)
+    if not latencies:
+        return
+    ReadLatencyBucket.objects.bulk_create(
+        [ReadLatencyBucket(alert_id=alert_id, bucket=bucket) for alert_id, bucket in latencies],
+        ignore_conflicts=True,
+    )
+    by_increment: dict[tuple[int, int], list[int]] = defaultdict(list)
+    for (alert_id, bucket), n in latencies.items():
+        by_increment[bucket, n].append(alert_id)
+    groups = [(Q(alert_id__in=alert_ids, bucket=bucket), n) for (bucket, n), alert_ids in by_increment.items()]
+    ReadLatencyBucket.objects.filter(reduce(operator.or_, [match for match, _ in groups])).update(
+        count=F("count") + Case(*[When(match, then=Value(n)) for match, n in groups], default=Value(0))
+    )
+
+
+def percentile(histogram: list[int], p: float) -> float | None:
+    """Estimate the ``p``th percentile, interpolating linearly inside its bucket.
+
+    Values in the open-ended last bucket are reported as its lower bound.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = total * p / 100
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            lower = LATENCY_BOUNDS[index - 1] if index else 0
+            if index == len(LATENCY_BOUNDS):
+                return float(lower)
+            return lower + (LATENCY_BOUNDS[index] - lower) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BOUNDS[-1])
+
+
+def summary(alert_id: int) -> dict | None:
+    funnel = AlertFunnel.objects.filter(pk=alert_id).first()
+    if funnel is None:
+        return None
+    histogram = [0] * (len(LATENCY_BOUNDS) + 1)
+    for bucket, count in ReadLatencyBucket.objects.filter(alert_id=alert_id).values_list("bucket", "count"):
+        histogram[bucket] = count
+    return {
+        "alert": alert_id,
+        "delivered": funnel.delivered,
+        "seen": funnel.seen,
+        "read": funnel.read,
+        "snoozed": funnel.snoozed,
+        "read_rate": funnel.read / funnel.delivered if funnel.delivered else None,
+        "avg_reminders_before_read": funnel.reminders_before_read / funnel.read if funnel.read else None,
+        "time_to_read": {
+            "count": sum(histogram),
+            **{f"p{p}_seconds": percentile(histogram, p) for p in PERCENTILES},
+            "histogram": [
+                {"le_seconds": LATENCY_BOUNDS[i] if i < len(LATENCY_BOUNDS) else None, "count": count}
+                for i, count in enumerate(histogram)
+            ],
+        },
+    }
+
+
+def reconcile() -> int:
+    """Recompute every alert's stage counts from its preferences; returns how many rows changed.
+
+    ``reminders_before_read`` and the latency histogram describe reads as they
+    happened and are left as they are.
+    """
+
+    def count(milestone: str):
+        prefs = UserAlertPreference.objects.filter(alert=OuterRef("alert_id"), **{f"{milestone}__isnull": False})
+        return count_of(prefs, "alert_id")
+
+    with transaction.atomic():
+        missing = Alert.objects.filter(funnel__isnull=True).values_list("pk", flat=True)
+        AlertFunnel.objects.bulk_create([AlertFunnel(alert_id=pk) for pk in missing], ignore_conflicts=True)
+        return reconcile_columns(
+            AlertFunnel,
+            {
+                "delivered": count("delivered_at"),
+                "seen": count("seen_at"),
+                "read": count("first_read_at"),
+                "snoozed": count("first_snoozed_at"),
+            },
+        )
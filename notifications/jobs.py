@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from . import audience
+from .models import Alert, FanOutJob
+from .services import enqueue_fanout, run_fanout
+
+logger = logging.getLogger(__name__)
+
+# A running job whose heartbeat is older than this is considered abandoned
+JOB_LEASE = timedelta(seconds=getattr(settings, "NOTIFICATIONS_JOB_LEASE_SECONDS", 300))
+# Attempts before a repeatedly crashing job is marked failed
+MAX_JOB_ATTEMPTS = getattr(settings, "NOTIFICATIONS_JOB_MAX_ATTEMPTS", 5)
+# Delay before the first retry of a failed job; doubled on each further failure
+JOB_RETRY_BACKOFF = timedelta(seconds=getattr(settings, "NOTIFICATIONS_JOB_RETRY_BACKOFF_SECONDS", 30))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claimable_jobs():
+    now = timezone.now()
+    return FanOutJob.objects.filter(
+        Q(status=FanOutJob.Status.PENDING, not_before__isnull=True)
+        | Q(status=FanOutJob.Status.PENDING, not_before__lte=now)
+        | Q(status=FanOutJob.Status.RUNNING, updated_at__lt=now - JOB_LEASE)
+    )
+
+
+def retry_backoff(attempts: int) -> timedelta:
+    return JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+
+
+# Reloaded on claim: the lease columns plus the checkpoint a run resumes from
+CLAIMED_FIELDS = [
+    "status", "claimed_by", "claimed_at", "updated_at", "attempts", "last_user_id", "processed", "sent", "failed",
+    "deferred",
+]
+
+
+def claim_job(job: FanOutJob, worker_id: str) -> bool:
+    """Claim ``job`` for ``worker_id`` if it is pending or its lease has expired.
+
+    The conditional UPDATE only succeeds for one worker, so concurrent workers
+    never run the same job.
+    """
+    now = timezone.now()
+    claimed = claimable_jobs().filter(pk=job.pk).update(
+        status=FanOutJob.Status.RUNNING, claimed_by=worker_id, claimed_at=now, updated_at=now
+    )
+    if claimed:
+        # The previous holder may have checkpointed after ``job`` was read
+        job.refresh_from_db(fields=CLAIMED_FIELDS)
+    return bool(claimed)
+
+
+def claim_next_job(worker_id: str) -> FanOutJob | None:
+    """Atomically claim the oldest pending (or abandoned) job for ``worker_id``.
+
+    Losers of a race for one candidate simply try the next.
+    """
+    for job in claimable_jobs().order_by("pk")[:10]:
+        if claim_job(job, worker_id):
+            return job
+    return None
+
+
+def run_job(job: FanOutJob) -> None:
+    job.attempts += 1
+    job.save(update_fields=["attempts", "updated_at"])
+    try:
+        audience.rebuild_if_stale(job.alert)
+        run_fanout(job)
+    except Exception as exc:
+        logger.exception("Fan-out job %s failed", job.pk)
+        job.error = repr(exc)
+        # Leave the checkpoint in place so the next attempt resumes after it
+        if job.attempts >= MAX_JOB_ATTEMPTS:
+            job.status = FanOutJob.Status.FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = FanOutJob.Status.PENDING
+            job.not_before = timezone.now() + retry_backoff(job.attempts)
+        job.save(update_fields=["error", "status", "not_before", "finished_at", "updated_at"])
+
+
+def deliver_alert(alert: Alert, worker_id: str | None = None) -> int:
+    """Deliver ``alert`` on the calling thread; an interrupted fan-out is resumed, not restarted.
+
+    A job that another process is running under a live lease is left to it
+    and nothing is sent here.
+    """
+    if not alert.is_active_now:
+        return 0
+    job = enqueue_fanout(alert)
+    if not claim_job(job, worker_id or default_worker_id()):
+        return 0
+    audience.rebuild_if_stale(alert)
+    return run_fanout(job)
+
+
+class DeliveryWorker:
+    """Claims queued fan-out jobs and runs them until stopped."""
+
+    def __init__(self, worker_id: str | None = None, poll_interval: float = 2.0):
+        self.worker_id = worker_id or default_worker_id()
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_once(self) -> int:
+        """Rebuild stale audiences, then run claimable jobs until the queue is empty; returns how many jobs ran."""
+        close_old_connections()
+        audience.rebuild_stale()
+        count = 0
+        while not self._stop.is_set():
+            close_old_connections()
+            job = claim_next_job(self.worker_id)
+            if job is None:
+                break
+            logger.info("Worker %s running fan-out job %s", self.worker_id, job.pk)
+            run_job(job)
+            count += 1
+        return count
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            if not self.run_once():
+                self._stop.wait(self.poll_interval)
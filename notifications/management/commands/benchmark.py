@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from ...benchmark import SCALES, Scale, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark delivery, reminders and read endpoints on synthetic data. "
+        "Runs in a throwaway test database; results can be written as JSON to diff between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+        parser.add_argument("--users", type=int, help="Override the number of users for the chosen scale")
+        parser.add_argument("--teams", type=int, help="Override the number of teams")
+        parser.add_argument("--alerts", type=int, help="Override the number of alerts")
+        parser.add_argument("--preferences", type=int, help="Override the number of user/alert preferences")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark")
+        parser.add_argument("--only", nargs="+", help="Benchmark names to run (default: all)")
+        parser.add_argument("--output", help="Write JSON results to this path")
+
+    def handle(self, *args, **options):
+        base = SCALES[options["scale"]]
+        scale = Scale(
+            users=options["users"] or base.users,
+            teams=options["teams"] or base.teams,
+            alerts=options["alerts"] or base.alerts,
+            preferences=options["preferences"] or base.preferences,
+        )
+
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            report = run(scale, repeat=options["repeat"], only=options["only"], log=self.stdout.write)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ...retention import ARCHIVE_DIR, PRUNE_BATCH_SIZE, prune
+
+
+class Command(BaseCommand):
+    help = "Delete notification deliveries past their retention period, optionally archiving them first"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PRUNE_BATCH_SIZE, help="Rows deleted per transaction")
+        parser.add_argument(
+            "--archive-dir",
+            default=ARCHIVE_DIR,
+            help="Write pruned rows to a gzipped NDJSON file in this directory before deleting them",
+        )
+        parser.add_argument("--no-archive", action="store_true", help="Skip the archive even if one is configured")
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+
+    def handle(self, *args, **options):
+        result = prune(
+            batch_size=options["batch_size"],
+            archive_dir=None if options["no_archive"] else options["archive_dir"],
+            pause=options["pause"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Pruned {result.deleted} deliveries in {result.batches} batches ({result.seconds:.2f}s)"
+            )
+        )
+        if result.archive:
+            self.stdout.write(f"Archived to {result.archive}")
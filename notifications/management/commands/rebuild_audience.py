@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...audience import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized alert audience table from alert targeting"
+
+    def handle(self, *args, **options):
+        count = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt audience for {count} alerts"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from ... import funnel, stats, unread
+
+# Table name -> (pending sweep applied first, its label, reconcile, what it corrects)
+TABLES = {
+    "stats": (stats.sweep_expired_snoozes, "expired snoozes", stats.reconcile, "alert stats rows"),
+    "funnel": (None, "", funnel.reconcile, "alert funnels"),
+    "unread": (unread.sweep_expired, "expired alerts", unread.reconcile, "unread counters"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute incrementally maintained counts from preferences: per-alert stats (admin alert list), "
+        "per-alert funnel stages, or per-user unread counters"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=TABLES, help="Counts to recompute")
+
+    def handle(self, *args, **options):
+        sweep, swept_label, reconcile, label = TABLES[options["table"]]
+        if sweep is not None:
+            self.stdout.write(f"Swept {sweep()} {swept_label}")
+        drifted = reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Corrected {drifted} {label}"))
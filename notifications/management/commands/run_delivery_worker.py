@@ -0,0 +1,31 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from ...jobs import DeliveryWorker
+
+
+class Command(BaseCommand):
+    help = "Claim and run queued alert deliveries until SIGTERM/SIGINT"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+
+    def handle(self, *args, **options):
+        worker = DeliveryWorker(poll_interval=options["poll_interval"])
+        if options["once"]:
+            count = worker.run_once()
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} delivery jobs"))
+            return
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping worker after the current job...")
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(self.style.SUCCESS(f"Delivery worker {worker.worker_id} started"))
+        worker.run()
+        self.stdout.write(self.style.SUCCESS("Delivery worker stopped"))
@@ -0,0 +1,31 @@
+import signal
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from ...scheduler import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = "Run the reminder scheduler until SIGTERM/SIGINT, sending reminders as they fall due"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between change-counter polls")
+        parser.add_argument("--horizon-minutes", type=int, default=10, help="How far ahead due times are loaded")
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler(
+            horizon=timedelta(minutes=options["horizon_minutes"]),
+            poll_interval=options["poll_interval"],
+        )
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping scheduler...")
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(self.style.SUCCESS("Reminder scheduler started"))
+        scheduler.run()
+        self.stdout.write(self.style.SUCCESS("Reminder scheduler stopped"))
@@ -1,13 +1,23 @@
 from django.core.management.base import BaseCommand
 
-from ...services import trigger_reminders
+from ...audience import rebuild_stale
+from ...services import flush_deferred, trigger_reminders
+from ...stats import sweep_expired_snoozes
+from ...unread import sweep_expired
 
 
 class Command(BaseCommand):
     help = "Trigger reminder deliveries for due user-alert preferences"
 
     def handle(self, *args, **options):
+        # Reminders go to the materialized audience; bring new or retargeted alerts up to date first
+        rebuild_stale()
         count = trigger_reminders()
         self.stdout.write(self.style.SUCCESS(f"Triggered {count} reminders"))
-
-
+        flushed = flush_deferred()
+        if flushed.sent or flushed.failed or flushed.deferred:
+            self.stdout.write(
+                f"Deferred deliveries: {flushed.sent} sent, {flushed.failed} failed, {flushed.deferred} still rate-limited"
+            )
+        sweep_expired()
+        sweep_expired_snoozes()
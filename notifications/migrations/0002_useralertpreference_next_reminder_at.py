@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useralertpreference',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='useralertpreference',
+            index=models.Index(fields=['is_read', 'next_reminder_at'], name='pref_due_reminder_idx'),
+        ),
+    ]
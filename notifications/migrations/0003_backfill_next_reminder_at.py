@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:38
+
+from datetime import datetime, timedelta
+
+from django.db import migrations
+from django.db.models import F
+from django.utils import timezone
+
+
+def backfill_next_reminder_at(apps, schema_editor):
+    Alert = apps.get_model('notifications', 'Alert')
+    UserAlertPreference = apps.get_model('notifications', 'UserAlertPreference')
+    today = timezone.localdate()
+    tomorrow = timezone.make_aware(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+
+    UserAlertPreference.objects.filter(is_read=True).update(next_reminder_at=None)
+    for alert in Alert.objects.all().iterator():
+        prefs = UserAlertPreference.objects.filter(alert=alert, is_read=False)
+        if alert.archived or not alert.reminders_enabled:
+            prefs.update(next_reminder_at=None)
+            continue
+        frequency = timedelta(minutes=alert.reminder_frequency_minutes)
+        prefs.filter(last_reminded_at__isnull=True).update(next_reminder_at=alert.start_at)
+        prefs.filter(last_reminded_at__isnull=False).update(next_reminder_at=F('last_reminded_at') + frequency)
+        prefs.filter(snoozed_on=today, next_reminder_at__lt=tomorrow).update(next_reminder_at=tomorrow)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_useralertpreference_next_reminder_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_next_reminder_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_sms_rate_limiting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertAudience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audience', to='notifications.alert')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_audience', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['alert', 'user'], name='audience_alert_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'alert'), name='unique_audience_user_alert')],
+            },
+        ),
+    ]
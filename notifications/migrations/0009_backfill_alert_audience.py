@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:48
+
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def backfill_alert_audience(apps, schema_editor):
+    Alert = apps.get_model('notifications', 'Alert')
+    AlertAudience = apps.get_model('notifications', 'AlertAudience')
+    User = apps.get_model('notifications', 'User')
+
+    for alert in Alert.objects.all().iterator():
+        if alert.visibility == 'org':
+            users = User.objects.all()
+        elif alert.visibility == 'team':
+            users = User.objects.filter(team__in=alert.target_teams.all())
+        else:
+            users = alert.target_users.all()
+        user_ids = users.order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        while batch := list(user_ids.filter(pk__gt=last_id)[:BATCH_SIZE]):
+            AlertAudience.objects.bulk_create(
+                [AlertAudience(alert_id=alert.pk, user_id=user_id) for user_id in batch], ignore_conflicts=True
+            )
+            last_id = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_alertaudience'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_alert_audience, migrations.RunPython.noop),
+    ]
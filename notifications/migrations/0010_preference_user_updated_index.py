@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0009_backfill_alert_audience'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useralertpreference',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='pref_user_updated_idx'),
+        ),
+    ]
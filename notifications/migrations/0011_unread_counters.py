@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0010_preference_user_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SweepWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('swept_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserUnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
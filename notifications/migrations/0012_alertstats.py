@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0011_unread_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertStats',
+            fields=[
+                ('alert', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='notifications.alert')),
+                ('preferences', models.IntegerField(default=0)),
+                ('read', models.IntegerField(default=0)),
+                ('snoozed', models.IntegerField(default=0)),
+                ('snoozed_day', models.DateField(blank=True, null=True)),
+            ],
+        ),
+    ]
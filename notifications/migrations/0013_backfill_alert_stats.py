@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:01
+
+from django.db import migrations
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+def backfill_alert_stats(apps, schema_editor):
+    Alert = apps.get_model('notifications', 'Alert')
+    AlertStats = apps.get_model('notifications', 'AlertStats')
+    UserAlertPreference = apps.get_model('notifications', 'UserAlertPreference')
+    today = timezone.localdate()
+
+    counts = {
+        row['alert_id']: row
+        for row in UserAlertPreference.objects.order_by().values('alert_id').annotate(
+            preferences=Count('id'),
+            read=Count('id', filter=Q(is_read=True)),
+            snoozed=Count('id', filter=Q(snoozed_on=today)),
+        )
+    }
+    empty = {'preferences': 0, 'read': 0, 'snoozed': 0}
+    AlertStats.objects.bulk_create(
+        [
+            AlertStats(
+                alert_id=alert_id,
+                preferences=counts.get(alert_id, empty)['preferences'],
+                read=counts.get(alert_id, empty)['read'],
+                snoozed=counts.get(alert_id, empty)['snoozed'],
+                snoozed_day=today,
+            )
+            for alert_id in Alert.objects.values_list('pk', flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0012_alertstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_alert_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:05
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour
+
+
+def backfill_analytics_rollups(apps, schema_editor):
+    """Rebuild delivery and alert-creation rollups from history.
+
+    Read/unread/snooze events were never logged with a timestamp, so those
+    rollups start accruing from here on.
+    """
+    Alert = apps.get_model('notifications', 'Alert')
+    AnalyticsRollup = apps.get_model('notifications', 'AnalyticsRollup')
+    NotificationDelivery = apps.get_model('notifications', 'NotificationDelivery')
+
+    rows = []
+    for granularity, trunc in (('hour', TruncHour), ('day', TruncDay)):
+        deliveries = (
+            NotificationDelivery.objects.annotate(bucket=trunc('sent_at'))
+            .values('bucket', 'alert__severity', 'channel', 'status')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        rows += [
+            AnalyticsRollup(
+                granularity=granularity,
+                bucket=row['bucket'],
+                metric='delivery',
+                severity=row['alert__severity'],
+                channel=row['channel'],
+                status=row['status'],
+                count=row['count'],
+            )
+            for row in deliveries
+        ]
+        alerts = (
+            Alert.objects.annotate(bucket=trunc('created_at'))
+            .values('bucket', 'severity')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        rows += [
+            AnalyticsRollup(
+                granularity=granularity,
+                bucket=row['bucket'],
+                metric='alert_created',
+                severity=row['severity'],
+                count=row['count'],
+            )
+            for row in alerts
+        ]
+    AnalyticsRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0014_analyticsrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_analytics_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0015_backfill_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertFunnel',
+            fields=[
+                ('alert', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='funnel', serialize=False, to='notifications.alert')),
+                ('delivered', models.PositiveIntegerField(default=0)),
+                ('seen', models.PositiveIntegerField(default=0)),
+                ('read', models.PositiveIntegerField(default=0)),
+                ('snoozed', models.PositiveIntegerField(default=0)),
+                ('reminders_before_read', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='useralertpreference',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='useralertpreference',
+            name='first_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='useralertpreference',
+            name='first_snoozed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='useralertpreference',
+            name='reminder_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='useralertpreference',
+            name='seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ReadLatencyBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_latency', to='notifications.alert')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('alert', 'bucket'), name='unique_read_latency_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:02
+
+from django.db import migrations
+from django.db.models import Count, F, IntegerField, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_alert_funnel(apps, schema_editor):
+    """Derive the milestones of existing preferences and build the funnel rows.
+
+    Earlier rows only carry ``first_seen_at``/``updated_at``, so ``seen_at`` is
+    taken from creation and the read/snooze times from the last update. The
+    time-to-read histogram only covers reads made from now on.
+    """
+    Alert = apps.get_model('notifications', 'Alert')
+    AlertFunnel = apps.get_model('notifications', 'AlertFunnel')
+    NotificationDelivery = apps.get_model('notifications', 'NotificationDelivery')
+    UserAlertPreference = apps.get_model('notifications', 'UserAlertPreference')
+
+    sent = NotificationDelivery.objects.filter(
+        alert=OuterRef('alert_id'), user=OuterRef('user_id'), status='sent'
+    ).order_by().values('alert_id', 'user_id')
+    UserAlertPreference.objects.update(
+        seen_at=F('first_seen_at'),
+        delivered_at=Subquery(sent.annotate(first=Min('sent_at')).values('first')),
+        reminder_count=Greatest(
+            Coalesce(Subquery(sent.annotate(n=Count('id')).values('n'), output_field=IntegerField()), Value(0)) - 1,
+            Value(0),
+        ),
+    )
+    UserAlertPreference.objects.filter(is_read=True).update(first_read_at=F('updated_at'))
+    UserAlertPreference.objects.filter(snoozed_on__isnull=False).update(first_snoozed_at=F('updated_at'))
+
+    counts = {
+        row['alert_id']: row
+        for row in UserAlertPreference.objects.order_by().values('alert_id').annotate(
+            delivered=Count('id', filter=Q(delivered_at__isnull=False)),
+            seen=Count('id'),
+            read=Count('id', filter=Q(is_read=True)),
+            snoozed=Count('id', filter=Q(first_snoozed_at__isnull=False)),
+            reminders_before_read=Coalesce(Sum('reminder_count', filter=Q(is_read=True)), 0),
+        )
+    }
+    fields = ['delivered', 'seen', 'read', 'snoozed', 'reminders_before_read']
+    AlertFunnel.objects.bulk_create(
+        [
+            AlertFunnel(alert_id=alert_id, **{field: counts.get(alert_id, {}).get(field, 0) for field in fields})
+            for alert_id in Alert.objects.values_list('pk', flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0016_alert_funnel'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_alert_funnel, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:10
+
+import notifications.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0017_backfill_alert_funnel'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='useralertpreference',
+            name='pref_due_reminder_idx',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='time_zone',
+            field=models.CharField(blank=True, default='', max_length=64, validators=[notifications.models.validate_time_zone]),
+        ),
+        migrations.AddField(
+            model_name='useralertpreference',
+            name='snoozed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='useralertpreference',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['next_reminder_at', 'snoozed_until'], name='pref_due_reminder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useralertpreference',
+            index=models.Index(fields=['snoozed_until'], name='pref_snoozed_until_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:10
+
+from datetime import datetime, timedelta
+
+from django.db import migrations
+from django.db.models import Count
+from django.utils import timezone
+
+
+def backfill_snoozed_until(apps, schema_editor):
+    """Turn today's ``snoozed_on`` snoozes into ones lasting until local midnight.
+
+    Snoozes from earlier days have already run out and are dropped. The
+    snoozed counts in ``AlertStats`` become "snoozed as of now", which also
+    starts the snooze sweep's watermark.
+    """
+    AlertStats = apps.get_model('notifications', 'AlertStats')
+    SweepWatermark = apps.get_model('notifications', 'SweepWatermark')
+    UserAlertPreference = apps.get_model('notifications', 'UserAlertPreference')
+    now = timezone.now()
+    today = timezone.localdate(now)
+    midnight = timezone.make_aware(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+
+    UserAlertPreference.objects.filter(snoozed_on=today).update(snoozed_until=midnight)
+    SweepWatermark.objects.update_or_create(name='snooze-expiry', defaults={'swept_until': now})
+    AlertStats.objects.update(snoozed=0)
+    snoozed = (
+        UserAlertPreference.objects.filter(snoozed_until__gt=now)
+        .order_by()
+        .values('alert_id')
+        .annotate(n=Count('id'))
+    )
+    for row in snoozed:
+        AlertStats.objects.filter(alert_id=row['alert_id']).update(snoozed=row['n'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0018_snoozed_until'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_snoozed_until, migrations.RunPython.noop),
+    ]
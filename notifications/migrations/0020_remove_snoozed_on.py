@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0019_backfill_snoozed_until'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='alertstats',
+            name='snoozed_day',
+        ),
+        migrations.RemoveField(
+            model_name='useralertpreference',
+            name='snoozed_on',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0020_remove_snoozed_on'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificationdelivery',
+            index=models.Index(fields=['channel', 'status', 'sent_at'], name='delivery_retention_idx'),
+        ),
+    ]
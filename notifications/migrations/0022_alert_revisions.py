@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0021_delivery_retention_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='notifications.alert')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='current_revision',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='notifications.alertrevision'),
+        ),
+        migrations.AddField(
+            model_name='notificationdelivery',
+            name='revision',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='notifications.alertrevision'),
+        ),
+        migrations.AddConstraint(
+            model_name='alertrevision',
+            constraint=models.UniqueConstraint(fields=('alert', 'digest'), name='unique_alert_revision_digest'),
+        ),
+    ]
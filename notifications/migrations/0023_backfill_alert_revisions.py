@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:17
+
+import hashlib
+
+from django.db import migrations
+
+
+def backfill_alert_revisions(apps, schema_editor):
+    """Give every alert a revision for its message and point deliveries at their text's revision.
+
+    Each distinct ``(alert, message_snapshot)`` pair becomes one revision, so
+    snapshots taken before an edit keep their original text.
+    """
+    Alert = apps.get_model('notifications', 'Alert')
+    AlertRevision = apps.get_model('notifications', 'AlertRevision')
+    NotificationDelivery = apps.get_model('notifications', 'NotificationDelivery')
+
+    def revision(alert_id, message):
+        digest = hashlib.sha256(message.encode()).hexdigest()
+        return AlertRevision.objects.get_or_create(alert_id=alert_id, digest=digest, defaults={'message': message})[0]
+
+    for alert_id, message in Alert.objects.values_list('pk', 'message').iterator():
+        Alert.objects.filter(pk=alert_id).update(current_revision=revision(alert_id, message))
+    snapshots = NotificationDelivery.objects.order_by().values_list('alert_id', 'message_snapshot').distinct()
+    for alert_id, message in list(snapshots):
+        NotificationDelivery.objects.filter(alert_id=alert_id, message_snapshot=message).update(
+            revision=revision(alert_id, message)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0022_alert_revisions'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_alert_revisions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:15
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0023_backfill_alert_revisions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='notificationdelivery',
+            name='message_snapshot',
+        ),
+    ]
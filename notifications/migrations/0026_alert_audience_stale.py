@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0025_fanoutjob_not_before'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='audience_stale',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
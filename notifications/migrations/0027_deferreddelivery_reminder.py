@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0026_alert_audience_stale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deferreddelivery',
+            name='reminder',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,8 +1,23 @@
+import zoneinfo
+from datetime import datetime, timedelta, tzinfo
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
 
+def start_of_next_day(tz: tzinfo | None = None, now: datetime | None = None) -> datetime:
+    """Midnight at the end of the day ``now`` falls on in ``tz`` (default: today in the current time zone)."""
+    tomorrow = timezone.localdate(now, timezone=tz) + timedelta(days=1)
+    return timezone.make_aware(datetime.combine(tomorrow, datetime.min.time()), tz)
+
+
+def validate_time_zone(value: str) -> None:
+    if value and value not in zoneinfo.available_timezones():
+        raise ValidationError(f"Unknown time zone: {value}")
+
+
 class Team(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
@@ -13,10 +28,16 @@ class Team(models.Model):
 class User(AbstractUser):
     # Extend default user with team association
     team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='users')
+    phone_number = models.CharField(max_length=32, blank=True, default='')
+    # IANA name such as "Europe/Berlin"; blank uses the server's TIME_ZONE
+    time_zone = models.CharField(max_length=64, blank=True, default='', validators=[validate_time_zone])
 
     def __str__(self) -> str:
         return self.get_username()
 
+    def get_time_zone(self) -> tzinfo:
+        return zoneinfo.ZoneInfo(self.time_zone) if self.time_zone else timezone.get_default_timezone()
+
 
 class Alert(models.Model):
     class Severity(models.TextChoices):
@@ -59,6 +80,12 @@ class Alert(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when targeting changes; the delivery worker rebuilds the audience (notifications.audience)
+    audience_stale = models.BooleanField(default=False, editable=False)
+    # Maintained by notifications.revisions whenever the message changes
+    current_revision = models.ForeignKey(
+        'AlertRevision', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
 
     def __str__(self) -> str:
         return f"[{self.severity}] {self.title}"
@@ -75,6 +102,96 @@ class Alert(models.Model):
         return True
 
 
+class AlertAudience(models.Model):
+    """Materialized targeting: one row per user an alert is aimed at.
+
+    Kept in step with alert visibility/targets and user team membership by
+    ``notifications.audience``, so "alerts for user X" and "users for alert
+    Y" are both plain index lookups instead of an OR of joins.
+    """
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='audience')
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='alert_audience')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'alert'], name='unique_audience_user_alert'),
+        ]
+        indexes = [
+            models.Index(fields=['alert', 'user'], name='audience_alert_user_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Audience u={self.user_id} a={self.alert_id}"
+
+
+class AlertStats(models.Model):
+    """Preference counts per alert, maintained incrementally by ``notifications.stats``.
+
+    ``snoozed`` counts preferences whose ``snoozed_until`` is later than the
+    snooze sweep's watermark, i.e. still snoozed when the sweep last ran.
+    """
+
+    alert = models.OneToOneField(Alert, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    preferences = models.IntegerField(default=0)
+    read = models.IntegerField(default=0)
+    snoozed = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Stats a={self.alert_id}: {self.read}/{self.preferences} read"
+
+
+class AlertFunnel(models.Model):
+    """How far an alert's recipients got: delivered, seen, read, snoozed.
+
+    Each stage counts users once. ``reminders_before_read`` sums the
+    reminders every reader had received when they first read the alert.
+    """
+
+    alert = models.OneToOneField(Alert, on_delete=models.CASCADE, primary_key=True, related_name='funnel')
+    delivered = models.PositiveIntegerField(default=0)
+    seen = models.PositiveIntegerField(default=0)
+    read = models.PositiveIntegerField(default=0)
+    snoozed = models.PositiveIntegerField(default=0)
+    reminders_before_read = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Funnel a={self.alert_id}: {self.delivered}/{self.seen}/{self.read}"
+
+
+class ReadLatencyBucket(models.Model):
+    """One bar of an alert's time-to-read histogram (bounds in ``funnel.LATENCY_BOUNDS``)."""
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='read_latency')
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['alert', 'bucket'], name='unique_read_latency_bucket'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Latency a={self.alert_id} #{self.bucket}: {self.count}"
+
+
+class AlertRevision(models.Model):
+    """One distinct message body of an alert, stored once and shared by its deliveries."""
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='revisions')
+    digest = models.CharField(max_length=64)  # SHA-256 of the message
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['alert', 'digest'], name='unique_alert_revision_digest'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Revision a={self.alert_id} {self.digest[:12]}"
+
+
 class NotificationDelivery(models.Model):
     class Status(models.TextChoices):
         SENT = 'sent', 'Sent'
@@ -84,9 +201,16 @@ class NotificationDelivery(models.Model):
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='deliveries')
     channel = models.CharField(max_length=20, choices=Alert.DeliveryType.choices, default=Alert.DeliveryType.IN_APP)
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.SENT)
-    message_snapshot = models.TextField(blank=True, default='')
+    # The message as delivered; NULL only for alerts bulk-inserted without a revision
+    revision = models.ForeignKey(AlertRevision, on_delete=models.CASCADE, null=True, blank=True, related_name='deliveries')
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Retention: oldest rows first within each channel/status policy
+            models.Index(fields=['channel', 'status', 'sent_at'], name='delivery_retention_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"Delivery [{self.channel}] to {self.user} for {self.alert_id} at {self.sent_at:%Y-%m-%d %H:%M}"
 
@@ -96,21 +220,209 @@ class UserAlertPreference(models.Model):
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='alert_preferences')
 
     is_read = models.BooleanField(default=False)
-    snoozed_on = models.DateField(null=True, blank=True)  # If set to today, skip reminders until next day
+    snoozed_until = models.DateTimeField(null=True, blank=True)  # No reminders before this time
     last_reminded_at = models.DateTimeField(null=True, blank=True)
+    # Denormalized due time for the reminder pass; NULL when no reminder is pending
+    next_reminder_at = models.DateTimeField(null=True, blank=True, default=timezone.now)
 
     first_seen_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Funnel milestones (see notifications.funnel); each is set once
+    seen_at = models.DateTimeField(null=True, blank=True)  # first listed to the user
+    delivered_at = models.DateTimeField(null=True, blank=True)  # first sent through the alert's channel
+    first_read_at = models.DateTimeField(null=True, blank=True)
+    first_snoozed_at = models.DateTimeField(null=True, blank=True)
+    reminder_count = models.PositiveIntegerField(default=0)
+
     class Meta:
         unique_together = ('alert', 'user')
+        indexes = [
+            # Unread rows only: the reminder pass range-scans next_reminder_at and
+            # checks snoozes on the index entries it already reads
+            models.Index(
+                fields=['next_reminder_at', 'snoozed_until'],
+                condition=models.Q(is_read=False),
+                name='pref_due_reminder_idx',
+            ),
+            models.Index(fields=['user', 'updated_at', 'id'], name='pref_user_updated_idx'),
+            models.Index(fields=['snoozed_until'], name='pref_snoozed_until_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"Pref u={self.user_id} a={self.alert_id} read={self.is_read}"
 
-    def is_snoozed_today(self) -> bool:
-        if not self.snoozed_on:
-            return False
-        return self.snoozed_on == timezone.localdate()
+    def is_snoozed(self, now: datetime | None = None) -> bool:
+        return self.snoozed_until is not None and self.snoozed_until > (now or timezone.now())
+
+    def compute_next_reminder_at(self) -> datetime | None:
+        alert = self.alert
+        if self.is_read or alert.archived or not alert.reminders_enabled:
+            return None
+        if self.last_reminded_at is None:
+            due = alert.start_at
+        else:
+            due = self.last_reminded_at + timedelta(minutes=alert.reminder_frequency_minutes)
+        if self.is_snoozed():
+            due = max(due, self.snoozed_until)
+        if alert.expires_at is not None and due >= alert.expires_at:
+            return None
+        return due
+
+
+class FanOutJob(models.Model):
+    """Queued delivery of one alert to its audience, checkpointed per chunk.
+
+    Workers claim pending jobs; a running job whose ``updated_at`` heartbeat
+    has gone stale is reclaimed and resumes after ``last_user_id``. A failed
+    attempt puts the job back to pending with a ``not_before`` backoff.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        COMPLETED = 'completed', 'Completed'
+        FAILED = 'failed', 'Failed'
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='fanout_jobs')
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    requested_by = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True, related_name='fanout_jobs')
+    # Highest user id already handled; the next chunk starts after it
+    last_user_id = models.PositiveBigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    deferred = models.PositiveIntegerField(default=0)
+
+    claimed_by = models.CharField(max_length=100, blank=True, default='')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    # Earliest retry after a failed attempt
+    not_before = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='fanout_claim_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"FanOut a={self.alert_id} {self.status} processed={self.processed}"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.Status.COMPLETED, self.Status.FAILED)
+
+
+class DeferredDelivery(models.Model):
+    """A send held back by a channel rate limit, retried once ``not_before`` passes."""
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='deferred_deliveries')
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='deferred_deliveries')
+    channel = models.CharField(max_length=20, choices=Alert.DeliveryType.choices)
+    not_before = models.DateTimeField()
+    # A held-back reminder: the flush that sends it advances the preference's reminder schedule
+    reminder = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['not_before'], name='deferred_due_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Deferred [{self.channel}] to {self.user_id} for {self.alert_id} after {self.not_before:%H:%M:%S}"
+
+
+class RateLimitBucket(models.Model):
+    """Shared token-bucket state, so every process draws from the same budget."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    tokens = models.FloatField()
+    refilled_at = models.DateTimeField()
+    # Bumped on every write; updates are conditional on it (optimistic locking)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.tokens:.1f} tokens"
+
+
+class ChangeCounter(models.Model):
+    """Named version number bumped on writes so other processes can poll for changes."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name}={self.value}"
+
+
+class AnalyticsRollup(models.Model):
+    """Event counts per hour/day bucket, broken down by severity, channel and status.
+
+    ``metric`` is the event kind (see ``notifications.analytics``); dimensions
+    that don't apply to a metric are stored as ``''``.
+    """
+
+    class Granularity(models.TextChoices):
+        HOUR = 'hour', 'Hour'
+        DAY = 'day', 'Day'
+
+    granularity = models.CharField(max_length=4, choices=Granularity.choices)
+    bucket = models.DateTimeField()
+    metric = models.CharField(max_length=20)
+    severity = models.CharField(max_length=20, blank=True, default='')
+    channel = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=20, blank=True, default='')
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'metric', 'bucket', 'severity', 'channel', 'status'],
+                name='unique_analytics_rollup',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.metric} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}: {self.count}"
+
+
+class UserUnreadCounter(models.Model):
+    """Denormalized count of a user's unread preferences on live alerts.
+
+    "Live" means not archived and not expired as of the last expiry sweep
+    (``SweepWatermark`` "unread-expiry"). Maintained by ``notifications.unread``.
+    """
+
+    user = models.OneToOneField('User', on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    unread = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Unread u={self.user_id}: {self.unread}"
+
+
+class SweepWatermark(models.Model):
+    """How far a periodic sweep over time-based transitions has progressed."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    swept_until = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"{self.name} @ {self.swept_until:%Y-%m-%d %H:%M:%S}"
+
+    @classmethod
+    def current(cls, name: str) -> datetime:
+        """``swept_until`` of sweep ``name``; a sweep that never ran starts now."""
+        mark = cls.objects.filter(name=name).values_list("swept_until", flat=True).first()
+        if mark is None:
+            mark = cls.objects.get_or_create(name=name, defaults={"swept_until": timezone.now()})[0].swept_until
+        return mark
 
 # Create your models here.
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import RateLimitBucket
+
+
+class TokenBucket:
+    """Token bucket whose state lives in ``RateLimitBucket`` so all processes share it.
+
+    ``acquire`` never blocks: it grants as many tokens as are available right
+    now and leaves the caller to defer the rest. Writes are conditional on
+    the row version, so concurrent processes cannot both spend the same tokens.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float | None = None, retries: int = 5):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.retries = retries
+
+    def acquire(self, requested: int) -> int:
+        for _ in range(self.retries):
+            now = timezone.now()
+            bucket, _ = RateLimitBucket.objects.get_or_create(
+                name=self.name, defaults={"tokens": self.capacity, "refilled_at": now}
+            )
+            elapsed = max((now - bucket.refilled_at).total_seconds(), 0.0)
+            tokens = min(self.capacity, bucket.tokens + elapsed * self.rate)
+            granted = min(requested, math.floor(tokens))
+            updated = RateLimitBucket.objects.filter(name=self.name, version=bucket.version).update(
+                tokens=tokens - granted, refilled_at=now, version=bucket.version + 1
+            )
+            if updated:
+                return granted
+        return 0
+
+    def available_at(self, position: int, now: datetime | None = None) -> datetime:
+        """Earliest time the ``position``-th (1-based) queued send may get a token."""
+        now = now or timezone.now()
+        return now + timedelta(seconds=math.ceil(position / self.rate))
@@ -0,0 +1,39 @@
+"""Repair pass shared by the incrementally maintained count tables.
+
+``stats``, ``funnel`` and ``unread`` keep counts that are moved with ``F()``
+updates as preferences change. Their ``reconcile`` functions describe each
+column as a correlated count over ``UserAlertPreference`` and hand the
+columns to ``reconcile_columns``, which reports how many rows had drifted and
+overwrites them all in one UPDATE.
+"""
+from __future__ import annotations
+
+import operator
+from functools import reduce
+
+from django.db.models import Count, Expression, F, IntegerField, Model, Q, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(rows: QuerySet, group_by: str) -> Coalesce:
+    """Correlated count of ``rows`` (already filtered on an ``OuterRef``), 0 when there are none."""
+    return Coalesce(
+        Subquery(rows.order_by().values(group_by).annotate(n=Count("id")).values("n"), output_field=IntegerField()),
+        Value(0),
+    )
+
+
+def reconcile_columns(model: type[Model], actual: dict[str, Expression], **also) -> int:
+    """Set every ``model`` row's columns to ``actual``; returns how many rows had drifted.
+
+    ``also`` holds extra assignments (e.g. ``updated_at``) made only when
+    something changed. Callers run this in their own transaction.
+    """
+    drifted = (
+        model.objects.annotate(**{f"actual_{column}": value for column, value in actual.items()})
+        .filter(reduce(operator.or_, [~Q(**{column: F(f"actual_{column}")}) for column in actual]))
+        .count()
+    )
+    if drifted:
+        model.objects.update(**actual, **also)
+    return drifted
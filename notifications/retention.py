@@ -0,0 +1,122 @@
+"""Retention of the ``NotificationDelivery`` log.
+
+Every send and reminder appends a delivery row, so the log is pruned by age
+with a TTL per channel and status (``NOTIFICATIONS_DELIVERY_RETENTION_DAYS``).
+Counts of pruned rows survive in the analytics rollups, which ``dispatch``
+updates as each delivery is written, so pruning never has to re-aggregate.
+
+``prune`` deletes in primary-key batches, each in its own short transaction,
+walking the ``(channel, status, sent_at)`` index. With an archive directory
+every batch is first appended to a gzipped NDJSON file.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import Alert, NotificationDelivery
+
+# Days to keep deliveries, keyed "<channel>:<status>", "<channel>", "*:<status>"
+# or "*" (most specific wins); None keeps them forever
+RETENTION_DAYS: dict[str, int | None] = getattr(settings, "NOTIFICATIONS_DELIVERY_RETENTION_DAYS", {})
+PRUNE_BATCH_SIZE = getattr(settings, "NOTIFICATIONS_PRUNE_BATCH_SIZE", 1000)
+ARCHIVE_DIR = getattr(settings, "NOTIFICATIONS_DELIVERY_ARCHIVE_DIR", None)
+
+# Archived rows carry the delivered text so the archive stands on its own
+ARCHIVE_FIELDS = ["id", "alert_id", "user_id", "channel", "status", "revision__message", "sent_at"]
+
+
+def retention_days(channel: str, status: str, policy: dict[str, int | None] | None = None) -> int | None:
+    policy = RETENTION_DAYS if policy is None else policy
+    for key in (f"{channel}:{status}", channel, f"*:{status}", "*"):
+        if key in policy:
+            return policy[key]
+    return None
+
+
+def cutoffs(now: datetime | None = None, policy: dict[str, int | None] | None = None) -> dict[tuple[str, str], datetime]:
+    """Deliveries sent before the returned time are expired, per ``(channel, status)``."""
+    now = now or timezone.now()
+    result = {}
+    for channel in Alert.DeliveryType.values:
+        for status in NotificationDelivery.Status.values:
+            days = retention_days(channel, status, policy)
+            if days is not None:
+                result[channel, status] = now - timedelta(days=days)
+    return result
+
+
+def expired_deliveries(channel: str, status: str, cutoff: datetime) -> QuerySet[NotificationDelivery]:
+    """Oldest first, read from ``delivery_retention_idx``."""
+    return NotificationDelivery.objects.filter(channel=channel, status=status, sent_at__lt=cutoff).order_by("sent_at")
+
+
+@dataclass
+class PruneResult:
+    deleted: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    archive: Path | None = None
+
+
+def prune(
+    now: datetime | None = None,
+    batch_size: int = PRUNE_BATCH_SIZE,
+    archive_dir: str | Path | None = ARCHIVE_DIR,
+    pause: float = 0.0,
+    policy: dict[str, int | None] | None = None,
+) -> PruneResult:
+    """Delete expired deliveries ``batch_size`` rows at a time, archiving them first if asked.
+
+    ``pause`` seconds are slept between batches to leave room for other writers.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    result = PruneResult()
+    archive = None
+    if archive_dir:
+        result.archive = Path(archive_dir) / f"deliveries-{now:%Y%m%dT%H%M%S}.ndjson.gz"
+        result.archive.parent.mkdir(parents=True, exist_ok=True)
+        archive = gzip.open(result.archive, "wt", encoding="utf-8")
+    try:
+        for (channel, status), cutoff in cutoffs(now, policy).items():
+            expired = expired_deliveries(channel, status, cutoff)
+            while True:
+                if archive is None:
+                    ids = list(expired.values_list("pk", flat=True)[:batch_size])
+                else:
+                    rows = list(expired.values(*ARCHIVE_FIELDS)[:batch_size])
+                    for row in rows:
+                        row["message"] = row.pop("revision__message")
+                        archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+                    # On disk before the rows go away
+                    archive.flush()
+                    ids = [row["id"] for row in rows]
+                if not ids:
+                    break
+                with transaction.atomic():
+                    deleted, _ = NotificationDelivery.objects.filter(pk__in=ids).delete()
+                result.deleted += deleted
+                result.batches += 1
+                if len(ids) < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+    finally:
+        if archive is not None:
+            archive.close()
+            if not result.deleted:
+                result.archive.unlink()
+                result.archive = None
+    result.seconds = time.perf_counter() - started
+    return result
@@ -0,0 +1,41 @@
+"""Content-addressed message revisions for the delivery log.
+
+Deliveries reference an ``AlertRevision`` instead of copying the message, so a
+delivery row has the same size whatever the message length. ``record`` runs
+when an alert is created or its message is edited. Identical text resolves to
+the same revision through its SHA-256 digest, so re-saving or reverting a
+message adds no rows. Channels read ``alert.current_revision_id`` from the
+alert they are sending, so each delivery points at the text it actually sent.
+"""
+from __future__ import annotations
+
+import hashlib
+
+from django.db.models import QuerySet
+
+from .models import Alert, AlertRevision
+
+
+def message_digest(message: str) -> str:
+    return hashlib.sha256(message.encode()).hexdigest()
+
+
+def record(alert: Alert) -> AlertRevision:
+    """Make the revision of ``alert``'s current message its ``current_revision``."""
+    revision, _ = AlertRevision.objects.get_or_create(
+        alert=alert, digest=message_digest(alert.message), defaults={"message": alert.message}
+    )
+    # A plain UPDATE, so saving the pointer doesn't re-run the alert signals
+    Alert.objects.filter(pk=alert.pk).update(current_revision=revision)
+    alert.current_revision = revision
+    return revision
+
+
+def record_missing(alerts: QuerySet[Alert] | None = None) -> int:
+    """``record`` every alert without a current revision (e.g. after a ``bulk_create``)."""
+    alerts = Alert.objects.all() if alerts is None else alerts
+    count = 0
+    for alert in alerts.filter(current_revision__isnull=True).only("pk", "message").iterator():
+        record(alert)
+        count += 1
+    return count
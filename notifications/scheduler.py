@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .audience import rebuild_stale
+from .services import (
+    DELIVERY_BATCH_SIZE,
+    REMINDER_SCHEDULE_COUNTER,
+    due_reminders,
+    flush_deferred,
+    iter_batches,
+    pending_reminders,
+    read_change_counter,
+    send_reminders,
+)
+from .stats import sweep_expired_snoozes
+from .unread import sweep_expired
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """Keeps upcoming reminder due times in a min-heap and fires them on time.
+
+    The heap only covers due times up to ``horizon`` ahead, loaded with an index
+    range scan on ``next_reminder_at``. It is reloaded when the horizon runs out
+    or when the reminder change counter moves, i.e. after any write that may
+    have scheduled a reminder earlier than what the heap holds. Entries are
+    re-validated in SQL when they fire, so stale ones are simply dropped.
+    Each loop also rebuilds stale alert audiences (reminders only go to the
+    audience), retries rate-limited sends whose deferral has expired and
+    drops newly expired alerts from the unread counters.
+    """
+
+    def __init__(self, horizon: timedelta = timedelta(minutes=10), poll_interval: float = 5.0):
+        self.horizon = horizon
+        self.poll_interval = poll_interval
+        self._heap: list[tuple[datetime, int]] = []
+        self._horizon_end: datetime | None = None
+        self._version: int | None = None
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def reload(self) -> None:
+        # Read the counter first so writes racing with the scan trigger another reload
+        self._version = read_change_counter(REMINDER_SCHEDULE_COUNTER)
+        self._horizon_end = timezone.now() + self.horizon
+        self._heap = list(pending_reminders(self._horizon_end).values_list("next_reminder_at", "pk"))
+        heapq.heapify(self._heap)
+        logger.debug("Loaded %d pending reminders up to %s", len(self._heap), self._horizon_end)
+
+    def needs_reload(self) -> bool:
+        if self._horizon_end is None or timezone.now() >= self._horizon_end:
+            return True
+        return read_change_counter(REMINDER_SCHEDULE_COUNTER) != self._version
+
+    def run_pending(self) -> int:
+        now = timezone.now()
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            due_ids.append(heapq.heappop(self._heap)[1])
+        sent = 0
+        for ids in iter_batches(due_ids, DELIVERY_BATCH_SIZE):
+            sent += send_reminders(due_reminders(now).filter(pk__in=ids))
+        return sent
+
+    def seconds_until_next(self) -> float:
+        wait = self.poll_interval
+        if self._heap:
+            wait = min(wait, (self._heap[0][0] - timezone.now()).total_seconds())
+        return max(wait, 0.0)
+
+    def run(self) -> None:
+        while not self.stopped:
+            close_old_connections()
+            rebuild_stale()
+            if self.needs_reload():
+                self.reload()
+            sent = self.run_pending()
+            if sent:
+                logger.info("Sent %d reminders", sent)
+            flushed = flush_deferred()
+            if flushed.sent or flushed.failed:
+                logger.info("Sent %d deferred deliveries (%d failed)", flushed.sent, flushed.failed)
+            sweep_expired()
+            sweep_expired_snoozes()
+            self._stop.wait(self.seconds_until_next())
@@ -1,9 +1,13 @@
-from typing import Any
+from datetime import datetime
+from typing import Any, Iterable, Sequence
 
 from django.utils import timezone
-from rest_framework import serializers
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
-from .models import Alert, Team, User, UserAlertPreference
+from . import analytics
+from .models import Alert, AnalyticsRollup, FanOutJob, Team, User, UserAlertPreference
+from .services import BulkAction, SnoozeDuration, bulk_update_preferences, snooze, snooze_until
 
 
 class TeamSerializer(serializers.ModelSerializer):
@@ -70,7 +74,8 @@ class AlertAdminListSerializer(AlertSerializer):
     num_preferences = serializers.IntegerField(read_only=True)
     num_read = serializers.IntegerField(read_only=True)
     num_unread = serializers.IntegerField(read_only=True)
-    num_snoozed_today = serializers.IntegerField(read_only=True)
+    # Public name kept from the per-day snooze: counts preferences snoozed right now
+    num_snoozed_today = serializers.IntegerField(source="num_snoozed", read_only=True)
     is_recurring_active = serializers.SerializerMethodField()
 
     class Meta(AlertSerializer.Meta):
@@ -87,12 +92,12 @@ class AlertAdminListSerializer(AlertSerializer):
         return obj.is_active_now
 
     def get_is_recurring_active(self, obj: Alert) -> bool:
-        # Recurring if: reminders enabled, active window, and there exist users not snoozed today and not read
+        # Recurring if: reminders enabled, active window, and there exist users not snoozed and not read
         unread = getattr(obj, "num_unread", 0)
-        snoozed = getattr(obj, "num_snoozed_today", 0)
+        snoozed = getattr(obj, "num_snoozed", 0)
         total = getattr(obj, "num_preferences", 0)
-        not_snoozed_today = max(total - snoozed, 0)
-        return bool(obj.reminders_enabled and obj.is_active_now and (unread > 0 or not_snoozed_today > 0))
+        not_snoozed = max(total - snoozed, 0)
+        return bool(obj.reminders_enabled and obj.is_active_now and (unread > 0 or not_snoozed > 0))
 
 
 class UserAlertPreferenceSerializer(serializers.ModelSerializer):
@@ -104,12 +109,133 @@ class UserAlertPreferenceSerializer(serializers.ModelSerializer):
             "id",
             "alert",
             "is_read",
-            "snoozed_on",
+            "snoozed_until",
             "last_reminded_at",
+            "next_reminder_at",
             "first_seen_at",
             "updated_at",
         ]
-        read_only_fields = ["last_reminded_at", "first_seen_at", "updated_at"]
+        read_only_fields = ["last_reminded_at", "next_reminder_at", "first_seen_at", "updated_at"]
+
+
+class PreferenceRowSerializer:
+    """Renders my-alerts rows straight from ``values()`` dicts.
+
+    Output matches ``UserAlertPreferenceSerializer`` (same keys, nesting and
+    formatting, since each column goes through the matching DRF field's
+    ``to_representation``) without instantiating a model or a serializer per
+    row. ``fields`` selects a sparse fieldset, using ``alert.<name>`` for
+    nested alert fields; ``summary`` leaves out the alert message body.
+    """
+
+    SUMMARY_EXCLUDE = {"alert.message"}
+
+    def __init__(self, fields: Sequence[str] | None = None, summary: bool = False):
+        available = self.available_fields()
+        if fields:
+            groups = {name.split(".", 1)[0] for name in available}
+            unknown = [f for f in fields if f not in available and f not in groups]
+            if unknown:
+                raise serializers.ValidationError({"fields": [f"Unknown field(s): {', '.join(unknown)}"]})
+            # "alert" on its own expands to every alert field
+            wanted = [name for name in available if name in fields or name.split(".", 1)[0] in fields]
+        else:
+            wanted = list(available)
+        if summary:
+            wanted = [name for name in wanted if name not in self.SUMMARY_EXCLUDE]
+        self.columns = [name.replace(".", "__") for name in wanted]
+        self.converters = [(name.split("."), self.converter(available[name])) for name in wanted]
+
+    @staticmethod
+    def converter(field: serializers.Field):
+        output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+        if isinstance(field, serializers.DateTimeField) and output_format and output_format.lower() == ISO_8601:
+            # Same output as DateTimeField.to_representation for aware values,
+            # but the active timezone is looked up once instead of per value
+            tz = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+            if tz is not None:
+
+                def to_iso(value: datetime) -> str:
+                    value = value.astimezone(tz).isoformat()
+                    return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+                return to_iso
+        return field.to_representation
+
+    @staticmethod
+    def available_fields() -> dict[str, serializers.Field]:
+        fields = {}
+        for name, field in UserAlertPreferenceSerializer().fields.items():
+            if isinstance(field, serializers.Serializer):
+                for sub_name, sub_field in field.fields.items():
+                    if not sub_field.write_only:
+                        fields[f"{name}.{sub_name}"] = sub_field
+            elif not field.write_only:
+                fields[name] = field
+        return fields
+
+    def to_representation(self, row: dict[str, Any]) -> dict[str, Any]:
+        data: dict[str, Any] = {}
+        for column, (path, convert) in zip(self.columns, self.converters):
+            value = row[column]
+            target = data
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = None if value is None else convert(value)
+        return data
+
+    def many(self, rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [self.to_representation(row) for row in rows]
+
+
+class FanOutJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FanOutJob
+        fields = [
+            "id",
+            "alert",
+            "status",
+            "processed",
+            "sent",
+            "failed",
+            "deferred",
+            "attempts",
+            "error",
+            "not_before",
+            "created_at",
+            "updated_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class TimeseriesQuerySerializer(serializers.Serializer):
+    metric = serializers.ChoiceField(choices=analytics.METRICS, default=analytics.DELIVERY)
+    bucket = serializers.ChoiceField(
+        choices=AnalyticsRollup.Granularity.choices, default=AnalyticsRollup.Granularity.HOUR
+    )
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    group_by = serializers.CharField(required=False, default="")
+
+    def validate_group_by(self, value: str) -> list[str]:
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in analytics.DIMENSIONS]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown dimension(s): {', '.join(unknown)}")
+        return names
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        granularity = attrs["bucket"]
+        attrs["end"] = attrs.get("end") or timezone.now()
+        attrs["start"] = attrs.get("start") or attrs["end"] - analytics.DEFAULT_RANGE[granularity]
+        if attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError("start must be before end")
+        if attrs["end"] - attrs["start"] > analytics.MAX_RANGE[granularity]:
+            raise serializers.ValidationError(
+                f"Range too long for {granularity} buckets (max {analytics.MAX_RANGE[granularity].days} days)"
+            )
+        return attrs
 
 
 class MarkReadSerializer(serializers.Serializer):
@@ -117,14 +243,49 @@ class MarkReadSerializer(serializers.Serializer):
 
 
 class SnoozeSerializer(serializers.Serializer):
-    snooze_for_today = serializers.BooleanField(default=True)
+    # null lifts the snooze
+    duration = serializers.ChoiceField(
+        choices=SnoozeDuration.choices, default=SnoozeDuration.TOMORROW, allow_null=True
+    )
 
-    def save(self, preference: UserAlertPreference) -> UserAlertPreference:
-        if self.validated_data.get("snooze_for_today"):
-            preference.snoozed_on = timezone.localdate()
-        else:
-            preference.snoozed_on = None
-        preference.save(update_fields=["snoozed_on", "updated_at"])
-        return preference
+    def save(self, preference: UserAlertPreference, user: User) -> UserAlertPreference:
+        duration = self.validated_data["duration"]
+        return snooze(preference, snooze_until(user, duration) if duration else None)
+
+
+class BulkPreferenceFilterSerializer(serializers.Serializer):
+    is_read = serializers.BooleanField(required=False)
+    severity = serializers.ChoiceField(choices=Alert.Severity.choices, required=False)
+
+
+class BulkPreferenceSerializer(serializers.Serializer):
+    """Selects the caller's preferences by ``ids`` or by ``filter`` (``{}`` selects all)."""
 
+    MAX_IDS = 1000
 
+    action = serializers.ChoiceField(choices=BulkAction.choices)
+    # How long a "snooze" action lasts
+    duration = serializers.ChoiceField(choices=SnoozeDuration.choices, default=SnoozeDuration.TOMORROW)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=MAX_IDS, required=False
+    )
+    filter = BulkPreferenceFilterSerializer(required=False)
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        if ("ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError("Pass either ids or filter")
+        return attrs
+
+    def save(self, user: User) -> int:
+        preferences = UserAlertPreference.objects.all()
+        if "ids" in self.validated_data:
+            preferences = preferences.filter(pk__in=self.validated_data["ids"])
+        else:
+            criteria = self.validated_data["filter"]
+            if "is_read" in criteria:
+                preferences = preferences.filter(is_read=criteria["is_read"])
+            if "severity" in criteria:
+                preferences = preferences.filter(alert__severity=criteria["severity"])
+        action = self.validated_data["action"]
+        until = snooze_until(user, self.validated_data["duration"]) if action == BulkAction.SNOOZE else None
+        return bulk_update_preferences(user, preferences, action, until)
@@ -1,66 +1,461 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import timedelta
-from typing import Iterable, Protocol
+import math
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterable, Iterator, Protocol, Sequence
 
-from django.db import transaction
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, QuerySet, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
-from .models import Alert, NotificationDelivery, User, UserAlertPreference
+from . import analytics, funnel, stats, unread
+from .broadcast import delivery_event, get_broadcaster
+from .channels import EmailChannel, SMSChannel
+from .models import (
+    Alert,
+    AlertAudience,
+    ChangeCounter,
+    DeferredDelivery,
+    FanOutJob,
+    NotificationDelivery,
+    User,
+    UserAlertPreference,
+    start_of_next_day,
+)
+
+# Bumped whenever a reminder may have become due earlier than previously scheduled
+REMINDER_SCHEDULE_COUNTER = "reminder-schedule"
 
 
 class NotificationChannel(Protocol):
     def send(self, user: User, alert: Alert) -> bool: ...
 
 
+class BatchNotificationChannel(NotificationChannel, Protocol):
+    """Optional batch extension of ``NotificationChannel``.
+
+    ``send_many`` may run on a worker thread, so it must not touch the
+    database: it returns unsaved ``NotificationDelivery`` rows (SENT or FAILED)
+    and the dispatcher persists them from the calling thread.
+    """
+
+    def send_many(self, users: Sequence[User], alert: Alert) -> list[NotificationDelivery]: ...
+
+
 @dataclass
 class InAppChannel:
+    """Records deliveries for the dashboard and pushes them to connected streams."""
+
     def send(self, user: User, alert: Alert) -> bool:
         NotificationDelivery.objects.create(
             alert=alert,
             user=user,
             channel=Alert.DeliveryType.IN_APP,
             status=NotificationDelivery.Status.SENT,
-            message_snapshot=alert.message,
+            revision_id=alert.current_revision_id,
         )
+        get_broadcaster().publish(user.pk, delivery_event(alert))
         return True
 
+    def send_many(self, users: Sequence[User], alert: Alert) -> list[NotificationDelivery]:
+        broadcaster = get_broadcaster()
+        event = delivery_event(alert)
+        for user in users:
+            broadcaster.publish(user.pk, event)
+        # Build unsaved rows; the dispatcher persists them with a single bulk_create
+        return [
+            NotificationDelivery(
+                alert=alert,
+                user=user,
+                channel=Alert.DeliveryType.IN_APP,
+                status=NotificationDelivery.Status.SENT,
+                revision_id=alert.current_revision_id,
+            )
+            for user in users
+        ]
+
 
 CHANNEL_REGISTRY: dict[str, NotificationChannel] = {
     Alert.DeliveryType.IN_APP: InAppChannel(),
+    Alert.DeliveryType.EMAIL: EmailChannel(),
+    Alert.DeliveryType.SMS: SMSChannel(),
 }
 
 
+def bump_change_counter(name: str) -> None:
+    if not ChangeCounter.objects.filter(name=name).update(value=F("value") + 1):
+        ChangeCounter.objects.get_or_create(name=name, defaults={"value": 1})
+
+
+def read_change_counter(name: str) -> int:
+    return ChangeCounter.objects.filter(name=name).values_list("value", flat=True).first() or 0
+
+
 def get_channel(channel_key: str) -> NotificationChannel:
     return CHANNEL_REGISTRY[channel_key]
 
 
-def iter_visible_users(alert: Alert) -> Iterable[User]:
-    if alert.visibility == Alert.VISIBILITY_ORG:
-        return User.objects.all()
-    if alert.visibility == Alert.VISIBILITY_TEAM:
-        return User.objects.filter(team__in=alert.target_teams.all())
-    if alert.visibility == Alert.VISIBILITY_USER:
-        return alert.target_users.all()
-    return User.objects.none()
+def iter_visible_users(alert: Alert) -> QuerySet[User]:
+    """Users in ``alert``'s materialized audience (see ``notifications.audience``)."""
+    return User.objects.filter(alert_audience__alert=alert)
 
 
-@transaction.atomic
-def deliver_alert(alert: Alert) -> int:
-    if not alert.is_active_now:
-        return 0
-    channel = get_channel(alert.delivery_type)
-    sent_count = 0
-    for user in iter_visible_users(alert):
-        pref, _ = UserAlertPreference.objects.get_or_create(alert=alert, user=user)
-        if pref.is_snoozed_today():
+# Number of recipients handled (and committed) per round of bulk queries
+DELIVERY_BATCH_SIZE = getattr(settings, "NOTIFICATIONS_DELIVERY_BATCH_SIZE", 500)
+
+
+def iter_batches(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# Worker threads per channel for send_many; 1 means the channel runs inline
+CHANNEL_CONCURRENCY: dict[str, int] = getattr(settings, "NOTIFICATIONS_CHANNEL_CONCURRENCY", {})
+
+_executors: dict[str, ThreadPoolExecutor] = {}
+
+
+def get_executor(channel_key: str, workers: int) -> ThreadPoolExecutor:
+    executor = _executors.get(channel_key)
+    if executor is None:
+        executor = _executors[channel_key] = ThreadPoolExecutor(workers, thread_name_prefix=f"notify-{channel_key}")
+    return executor
+
+
+@dataclass
+class DispatchResult:
+    sent: int = 0
+    failed: int = 0
+    deferred: int = 0
+
+
+@dataclass
+class SendOutcome:
+    """What one round of sends produced, held in memory until ``record_outcome`` writes it."""
+
+    deliveries: list[NotificationDelivery] = field(default_factory=list)
+    deferred: list[DeferredDelivery] = field(default_factory=list)
+    events: Counter[analytics.EventKey] = field(default_factory=Counter)
+    # Users reached per alert id by channels that save their own delivery rows
+    sent: defaultdict[int, list[int]] = field(default_factory=lambda: defaultdict(list))
+
+
+def defer(alert: Alert, users: Sequence[User], limiter) -> list[DeferredDelivery]:
+    # Spread retries over the time the limiter needs to free enough tokens
+    now = timezone.now()
+    return [
+        DeferredDelivery(alert=alert, user=user, channel=alert.delivery_type, not_before=limiter.available_at(i, now))
+        for i, user in enumerate(users, start=1)
+    ]
+
+
+def send_groups(groups: Sequence[tuple[Alert, Sequence[User]]]) -> SendOutcome:
+    """Send each ``(alert, users)`` group through the alert's channel.
+
+    Groups for channels with a concurrency limit above 1 are split across that
+    channel's thread pool and run while the inline channels (such as in-app)
+    are handled on the calling thread. Channels exposing a ``rate_limiter``
+    only send what it grants right now; the rest becomes unsaved
+    ``DeferredDelivery`` rows instead of waiting. Channels without
+    ``send_many`` fall back to one ``send`` call per user on the calling
+    thread.
+
+    Call this outside any transaction: the sends are network round trips and
+    must not hold the database write lock. The returned outcome is persisted
+    afterwards by ``record_outcome``.
+    """
+    outcome = SendOutcome()
+    futures: list[Future] = []
+    inline: list[tuple[NotificationChannel, Alert, Sequence[User]]] = []
+    for alert, users in groups:
+        channel = get_channel(alert.delivery_type)
+        limiter = getattr(channel, "rate_limiter", None)
+        if limiter is not None and users:
+            granted = limiter.acquire(len(users))
+            if granted < len(users):
+                outcome.deferred.extend(defer(alert, users[granted:], limiter))
+                users = users[:granted]
+        if not users:
+            continue
+        workers = CHANNEL_CONCURRENCY.get(alert.delivery_type, 1)
+        if workers <= 1 or not hasattr(channel, "send_many"):
+            inline.append((channel, alert, users))
+            continue
+        executor = get_executor(alert.delivery_type, workers)
+        chunk_size = math.ceil(len(users) / workers)
+        for chunk in iter_batches(users, chunk_size):
+            futures.append(executor.submit(channel.send_many, chunk, alert))
+
+    for channel, alert, users in inline:
+        if hasattr(channel, "send_many"):
+            outcome.deliveries.extend(channel.send_many(users, alert))
             continue
-        channel.send(user, alert)
-        pref.last_reminded_at = timezone.now()
-        pref.save(update_fields=["last_reminded_at", "updated_at"])
-        sent_count += 1
-    return sent_count
+        for user in users:
+            if channel.send(user, alert):
+                status = NotificationDelivery.Status.SENT
+                outcome.sent[alert.pk].append(user.pk)
+            else:
+                status = NotificationDelivery.Status.FAILED
+            outcome.events[(analytics.DELIVERY, alert.severity, alert.delivery_type, status)] += 1
+    for future in futures:
+        outcome.deliveries.extend(future.result())
+    return outcome
+
+
+def mark_delivered(sent: dict[int, list[int]], now: datetime) -> None:
+    """Stamp ``delivered_at`` on the preferences that ``sent`` reached for the first time.
+
+    ``sent`` maps alert ids to the users whose send succeeded; failed and
+    deferred sends are not deliveries. The funnel's delivered stage counts the
+    same rows.
+    """
+    reached = Q()
+    for alert_id, user_ids in sent.items():
+        reached |= Q(alert_id=alert_id, user_id__in=user_ids)
+    if not reached:
+        return
+    first = list(UserAlertPreference.objects.filter(reached, delivered_at__isnull=True).values_list("pk", "alert_id"))
+    if first:
+        UserAlertPreference.objects.filter(pk__in=[pk for pk, _ in first]).update(delivered_at=now)
+        funnel.bump_each(delivered=Counter(alert_id for _, alert_id in first))
+
+
+def sent_pairs(outcome: SendOutcome) -> set[tuple[int, int]]:
+    """``(alert_id, user_id)`` of every send in ``outcome`` that went out."""
+    pairs = {(d.alert_id, d.user_id) for d in outcome.deliveries if d.status == NotificationDelivery.Status.SENT}
+    pairs.update((alert_id, user_id) for alert_id, user_ids in outcome.sent.items() for user_id in user_ids)
+    return pairs
+
+
+def advance_reminders(prefs: Sequence[UserAlertPreference], now: datetime, reminded: bool) -> None:
+    """Move ``prefs`` on to their next reminder after one was attempted at ``now``, in one UPDATE.
+
+    Only ``reminded`` rows (the reminder went out) count it in
+    ``last_reminded_at`` and ``reminder_count``; failed ones just retry at
+    the next interval.
+    """
+    if not prefs:
+        return
+    # Alerts sharing a frequency share a WHEN
+    due_at: dict = defaultdict(list)
+    for pref in prefs:
+        due_at[next_reminder_after(pref.alert, now)].append(pref.alert_id)
+    fields = {
+        "next_reminder_at": Case(
+            *[When(alert_id__in=alert_ids, then=Value(due)) for due, alert_ids in due_at.items()],
+            default=None,
+            output_field=models.DateTimeField(),
+        ),
+        "updated_at": now,
+    }
+    if reminded:
+        fields.update(last_reminded_at=now, reminder_count=F("reminder_count") + 1)
+    UserAlertPreference.objects.filter(pk__in=[pref.pk for pref in prefs]).update(**fields)
+
+
+def record_outcome(outcome: SendOutcome) -> DispatchResult:
+    """Persist the deliveries, deferrals and analytics of ``send_groups`` with bulk queries."""
+    result = DispatchResult(deferred=len(outcome.deferred))
+    events = outcome.events.copy()
+    sent = defaultdict(list, outcome.sent)
+    DeferredDelivery.objects.bulk_create(outcome.deferred, batch_size=DELIVERY_BATCH_SIZE)
+    NotificationDelivery.objects.bulk_create(outcome.deliveries, batch_size=DELIVERY_BATCH_SIZE)
+    for row in outcome.deferred:
+        events[(analytics.DELIVERY, row.alert.severity, row.channel, "deferred")] += 1
+    for delivery in outcome.deliveries:
+        events[(analytics.DELIVERY, delivery.alert.severity, delivery.channel, delivery.status)] += 1
+        if delivery.status == NotificationDelivery.Status.SENT:
+            sent[delivery.alert_id].append(delivery.user_id)
+    mark_delivered(sent, timezone.now())
+    for (_, _, _, status), count in events.items():
+        if status == NotificationDelivery.Status.SENT:
+            result.sent += count
+        elif status == NotificationDelivery.Status.FAILED:
+            result.failed += count
+    analytics.record(events)
+    return result
+
+
+def dispatch(groups: Sequence[tuple[Alert, Sequence[User]]]) -> DispatchResult:
+    """Send ``groups`` (see ``send_groups``), then record the outcome in one short transaction."""
+    outcome = send_groups(groups)
+    with transaction.atomic():
+        return record_outcome(outcome)
+
+
+def claim_deferred(batch: Sequence[DeferredDelivery]) -> list[DeferredDelivery]:
+    """Delete ``batch``'s rows that no other flush has taken; returns the ones deleted here.
+
+    Rows another flusher holds locked are skipped, and rows it already
+    deleted are gone from the locking read, so each row is sent only once.
+    """
+    with transaction.atomic():
+        claimed = set(
+            DeferredDelivery.objects.filter(pk__in=[row.pk for row in batch])
+            .select_for_update(skip_locked=True)
+            .values_list("pk", flat=True)
+        )
+        DeferredDelivery.objects.filter(pk__in=claimed).delete()
+    return [row for row in batch if row.pk in claimed]
+
+
+def flush_deferred(now=None) -> DispatchResult:
+    """Retry deferred sends whose ``not_before`` has passed.
+
+    Rows are removed (and so claimed, see ``claim_deferred``) in a
+    transaction of their own before they are sent; anything still over the
+    rate limit is deferred again and left for a later flush. Held-back
+    reminders advance their preference's schedule once they are sent.
+    """
+    now = now or timezone.now()
+    total = DispatchResult()
+    due = DeferredDelivery.objects.filter(not_before__lte=now).select_related("alert", "user").order_by("pk")
+    # Rows re-deferred during this flush get higher ids; stop before reaching them
+    max_pk = DeferredDelivery.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    due = due.filter(pk__lte=max_pk)
+    last_pk = 0
+    while batch := list(due.filter(pk__gt=last_pk)[:DELIVERY_BATCH_SIZE]):
+        last_pk = batch[-1].pk
+        by_alert: dict[int, list[DeferredDelivery]] = {}
+        for row in claim_deferred(batch):
+            by_alert.setdefault(row.alert_id, []).append(row)
+        if not by_alert:
+            continue
+        reminders = {(row.alert_id, row.user_id) for rows in by_alert.values() for row in rows if row.reminder}
+        outcome = send_groups([(rows[0].alert, [row.user for row in rows]) for rows in by_alert.values()])
+        for row in outcome.deferred:
+            row.reminder = (row.alert_id, row.user_id) in reminders
+        with transaction.atomic():
+            result = record_outcome(outcome)
+            settled = reminders - {(row.alert_id, row.user_id) for row in outcome.deferred}
+            if settled:
+                settle_reminders(settled, sent_pairs(outcome))
+        total.sent += result.sent
+        total.failed += result.failed
+        total.deferred += result.deferred
+    return total
+
+
+def settle_reminders(pairs: set[tuple[int, int]], sent: set[tuple[int, int]]) -> None:
+    """Advance the schedule of held-back reminders ``pairs`` that a flush has now sent (or failed)."""
+    by_alert: dict[int, list[int]] = defaultdict(list)
+    for alert_id, user_id in pairs:
+        by_alert[alert_id].append(user_id)
+    rows = Q()
+    for alert_id, user_ids in by_alert.items():
+        rows |= Q(alert_id=alert_id, user_id__in=user_ids)
+    # Read meanwhile: no further reminders
+    prefs = list(UserAlertPreference.objects.filter(rows, is_read=False).select_related("alert"))
+    now = timezone.now()
+    advance_reminders([pref for pref in prefs if (pref.alert_id, pref.user_id) in sent], now, reminded=True)
+    advance_reminders([pref for pref in prefs if (pref.alert_id, pref.user_id) not in sent], now, reminded=False)
+
+
+def insert_preferences(rows: list[UserAlertPreference], stamp: str) -> list[tuple[int, int]]:
+    """Insert ``rows`` with conflict-ignore and return the ``(user_id, alert_id)`` pairs really inserted.
+
+    All rows carry the same timestamp in field ``stamp``. A row a concurrent
+    writer inserted first holds another value, so re-reading the pairs by
+    stamp (inside the caller's transaction) leaves it out.
+    """
+    UserAlertPreference.objects.bulk_create(rows, ignore_conflicts=True)
+    return list(
+        UserAlertPreference.objects.filter(
+            user_id__in={row.user_id for row in rows},
+            alert_id__in={row.alert_id for row in rows},
+            **{stamp: getattr(rows[0], stamp)},
+        ).values_list("user_id", "alert_id")
+    )
+
+
+def prepare_batch(alert: Alert, user_ids: list[int]) -> list[User]:
+    """Create one batch's missing preferences and fetch who to send ``alert`` to.
+
+    Missing preferences are inserted with conflict-ignore, and only those
+    really inserted are counted as unread. Recipients are read through their
+    preferences with the snooze condition in SQL, so snoozed users are never
+    loaded.
+    """
+    prefs = UserAlertPreference.objects.filter(alert=alert, user_id__in=user_ids)
+    existing = set(prefs.values_list("user_id", flat=True))
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    now = timezone.now()
+    if missing:
+        inserted = insert_preferences(
+            [UserAlertPreference(alert=alert, user_id=user_id, next_reminder_at=now) for user_id in missing],
+            stamp="next_reminder_at",
+        )
+        # Only active alerts are fanned out, so they are live for the unread counters
+        unread.adjust([user_id for user_id, _ in inserted], 1)
+        stats.preferences_created([alert.pk], len(inserted))
+    awake = prefs.filter(Q(snoozed_until__isnull=True) | Q(snoozed_until__lte=now))
+    return [pref.user for pref in awake.select_related("user").order_by("user_id")]
+
+
+def finish_batch(alert: Alert, recipients: list[User], outcome: SendOutcome) -> DispatchResult:
+    """Record a sent batch and set ``last_reminded_at`` with a single UPDATE."""
+    result = record_outcome(outcome)
+    if recipients:
+        now = timezone.now()
+        UserAlertPreference.objects.filter(alert=alert, user__in=recipients).update(
+            last_reminded_at=now, next_reminder_at=next_reminder_after(alert, now), updated_at=now
+        )
+    return result
+
+
+def run_fanout(job: FanOutJob) -> int:
+    """Deliver ``job.alert`` chunk by chunk, committing a checkpoint after each chunk.
+
+    Users are streamed by keyset pagination on primary key, so memory stays
+    bounded by the chunk size and an interrupted job resumes after
+    ``job.last_user_id``. Each chunk takes two short transactions around its
+    sends: the first writes its preferences, the second its deliveries and
+    the checkpoint, which also refreshes the job heartbeat. A chunk
+    interrupted between the two is sent again on resume.
+    """
+    alert = job.alert
+    if job.status != FanOutJob.Status.RUNNING:
+        job.status = FanOutJob.Status.RUNNING
+        job.save(update_fields=["status", "updated_at"])
+    if alert.is_active_now:
+        get_channel(alert.delivery_type)  # fail before any chunk for an unsupported channel
+        user_ids = iter_visible_users(alert).order_by("pk").values_list("pk", flat=True)
+        while batch := list(user_ids.filter(pk__gt=job.last_user_id)[:DELIVERY_BATCH_SIZE]):
+            with transaction.atomic():
+                recipients = prepare_batch(alert, batch)
+            outcome = send_groups([(alert, recipients)])
+            with transaction.atomic():
+                result = finish_batch(alert, recipients, outcome)
+                job.sent += result.sent
+                job.failed += result.failed
+                job.deferred += result.deferred
+                job.processed += len(batch)
+                job.last_user_id = batch[-1]
+                job.save(update_fields=["sent", "failed", "deferred", "processed", "last_user_id", "updated_at"])
+        bump_change_counter(REMINDER_SCHEDULE_COUNTER)
+    job.status = FanOutJob.Status.COMPLETED
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "finished_at", "updated_at"])
+    return job.sent
+
+
+def enqueue_fanout(alert: Alert, requested_by: User | None = None) -> FanOutJob:
+    """Queue delivery of ``alert``, reusing a job that has not finished yet.
+
+    The job may already be running elsewhere; only ``jobs.claim_job`` decides
+    who gets to execute it.
+    """
+    unfinished = FanOutJob.objects.filter(
+        alert=alert, status__in=[FanOutJob.Status.PENDING, FanOutJob.Status.RUNNING]
+    )
+    return unfinished.order_by("pk").first() or FanOutJob.objects.create(alert=alert, requested_by=requested_by)
 
 
 def should_remind(pref: UserAlertPreference) -> bool:
@@ -70,26 +465,331 @@ def should_remind(pref: UserAlertPreference) -> bool:
         return False
     if pref.is_read:
         return False
-    if pref.is_snoozed_today():
+    if pref.is_snoozed():
         return False
     if pref.last_reminded_at is None:
         return True
     return timezone.now() - pref.last_reminded_at >= timedelta(minutes=pref.alert.reminder_frequency_minutes)
 
 
-def trigger_reminders() -> int:
-    to_notify: list[UserAlertPreference] = []
-    qs = UserAlertPreference.objects.select_related("alert").all()
-    for pref in qs:
-        if should_remind(pref):
-            to_notify.append(pref)
+def next_reminder_after(alert: Alert, reminded_at):
+    """Due time of the reminder following one sent at ``reminded_at``."""
+    if alert.archived or not alert.reminders_enabled:
+        return None
+    due = reminded_at + timedelta(minutes=alert.reminder_frequency_minutes)
+    if alert.expires_at is not None and due >= alert.expires_at:
+        return None
+    return due
+
+
+def reschedule_alert(alert: Alert) -> None:
+    """Recompute ``next_reminder_at`` for every preference of ``alert`` after a schedule edit.
+
+    ``UserAlertPreference.compute_next_reminder_at`` is evaluated in SQL, and
+    only rows whose due time actually moves are written, so their
+    ``updated_at`` (the my-alerts polling cursor) stays put otherwise.
+    """
+    now = timezone.now()
+    rows = UserAlertPreference.objects.filter(alert=alert)
+    expired = alert.expires_at is not None and alert.expires_at <= now
+    if alert.archived or not alert.reminders_enabled or expired:
+        rows = rows.alias(due=Value(None, output_field=models.DateTimeField()))
+    else:
+        rows = rows.alias(
+            scheduled=Case(
+                When(last_reminded_at__isnull=True, then=Value(alert.start_at)),
+                default=F("last_reminded_at") + timedelta(minutes=alert.reminder_frequency_minutes),
+                output_field=models.DateTimeField(),
+            )
+        )
+        snoozed = Q(snoozed_until__gt=now) & Q(snoozed_until__gt=F("scheduled"))
+        cases = [When(is_read=True, then=Value(None))]
+        if alert.expires_at is not None:
+            past_expiry = Q(scheduled__gte=alert.expires_at) | (snoozed & Q(snoozed_until__gte=alert.expires_at))
+            cases.append(When(past_expiry, then=Value(None)))
+        cases.append(When(snoozed, then=F("snoozed_until")))
+        rows = rows.alias(due=Case(*cases, default=F("scheduled"), output_field=models.DateTimeField()))
+    moved = (
+        Q(next_reminder_at__isnull=True, due__isnull=False)
+        | Q(next_reminder_at__isnull=False, due__isnull=True)
+        | Q(next_reminder_at__lt=F("due"))
+        | Q(next_reminder_at__gt=F("due"))
+    )
+    rows.filter(moved).update(next_reminder_at=F("due"), updated_at=now)
+
+
+def ensure_preferences(user: User, alert_ids: Sequence[int]) -> int:
+    """Create the user's missing preferences for ``alert_ids`` in one INSERT.
+
+    Existing rows are looked up first, so once every listed alert has a
+    preference that the user has seen this costs a single query regardless of
+    how many alerts are visible. Alerts listed for the first time are marked
+    seen for the funnel.
+    """
+    if not alert_ids:
+        return 0
+    seen_at = dict(
+        UserAlertPreference.objects.filter(user=user, alert_id__in=alert_ids).values_list("alert_id", "seen_at")
+    )
+    missing = [alert_id for alert_id in alert_ids if alert_id not in seen_at]
+    unseen = [alert_id for alert_id, seen in seen_at.items() if seen is None]
+    if not missing and not unseen:
+        return 0
+    now = timezone.now()
+    inserted = []
+    with transaction.atomic():
+        if missing:
+            pairs = insert_preferences(
+                [UserAlertPreference(alert_id=alert_id, user=user, seen_at=now) for alert_id in missing],
+                stamp="seen_at",
+            )
+            inserted = [alert_id for _, alert_id in pairs]
+            # Callers pass currently visible (hence live) alerts, which all count as unread
+            unread.adjust([user.pk], len(inserted))
+            stats.preferences_created(inserted)
+        if unseen:
+            UserAlertPreference.objects.filter(user=user, alert_id__in=unseen, seen_at__isnull=True).update(
+                seen_at=now
+            )
+        # A row another writer inserted first is left unseen here if it was, and marked on the next listing
+        funnel.bump(inserted + unseen, seen=1)
+    if inserted:
+        bump_change_counter(REMINDER_SCHEDULE_COUNTER)
+    return len(inserted)
+
+
+def read_changed(user_id: int, prefs: Sequence[UserAlertPreference], is_read: bool) -> None:
+    """Keep the unread counter, stats and analytics in step with a read-state flip of ``prefs``."""
+    unread.read_state_changed(user_id, [pref.alert for pref in prefs], is_read)
+    stats.read_changed([pref.alert_id for pref in prefs], is_read)
+    metric = analytics.READ if is_read else analytics.UNREAD
+    analytics.record(Counter((metric, pref.alert.severity, "", "") for pref in prefs))
+
+
+def snooze_changed(prefs: Sequence[UserAlertPreference], previous: Sequence[datetime | None]) -> None:
+    """As ``read_changed``, for ``prefs`` whose ``snoozed_until`` was ``previous`` before this edit."""
+    stats.snoozes_changed((pref.alert_id, old, pref.snoozed_until) for pref, old in zip(prefs, previous))
+    now = timezone.now()
+    started = [pref for pref, old in zip(prefs, previous) if pref.is_snoozed(now) and not is_snoozed(old, now)]
+    analytics.record(Counter((analytics.SNOOZE, pref.alert.severity, "", "") for pref in started))
+
+
+def mark_read(pref: UserAlertPreference, is_read: bool) -> UserAlertPreference:
+    changed = pref.is_read != is_read
+    first_read = is_read and pref.first_read_at is None
+    pref.is_read = is_read
+    pref.next_reminder_at = pref.compute_next_reminder_at()
+    if first_read:
+        pref.first_read_at = timezone.now()
+    with transaction.atomic():
+        pref.save(update_fields=["is_read", "next_reminder_at", "first_read_at", "updated_at"])
+        if first_read:
+            funnel.first_reads([pref], pref.first_read_at)
+        if changed:
+            read_changed(pref.user_id, [pref], is_read)
+    return pref
+
+
+class SnoozeDuration(models.TextChoices):
+    ONE_HOUR = "1h", "1 hour"
+    FOUR_HOURS = "4h", "4 hours"
+    TOMORROW = "tomorrow", "Until tomorrow"
+
+
+def is_snoozed(snoozed_until: datetime | None, now: datetime) -> bool:
+    return snoozed_until is not None and snoozed_until > now
+
+
+def snooze_until(user: User, duration: str, now: datetime | None = None) -> datetime:
+    """When a snooze of ``duration`` taken now ends; "tomorrow" is midnight in the user's time zone."""
+    now = now or timezone.now()
+    if duration == SnoozeDuration.TOMORROW:
+        return start_of_next_day(user.get_time_zone(), now)
+    return now + {SnoozeDuration.ONE_HOUR: timedelta(hours=1), SnoozeDuration.FOUR_HOURS: timedelta(hours=4)}[duration]
+
+
+def snooze(pref: UserAlertPreference, until: datetime | None) -> UserAlertPreference:
+    """Hold back ``pref``'s reminders until ``until``, or lift the snooze with None."""
+    previous = pref.snoozed_until
+    first_snooze = until is not None and pref.first_snoozed_at is None
+    pref.snoozed_until = until
+    pref.next_reminder_at = pref.compute_next_reminder_at()
+    if first_snooze:
+        pref.first_snoozed_at = timezone.now()
+    with transaction.atomic():
+        pref.save(update_fields=["snoozed_until", "next_reminder_at", "first_snoozed_at", "updated_at"])
+        if first_snooze:
+            funnel.bump(pref.alert_id, snoozed=1)
+        if until != previous:
+            snooze_changed([pref], [previous])
+    return pref
+
+
+class BulkAction(models.TextChoices):
+    READ = "read", "Mark read"
+    UNREAD = "unread", "Mark unread"
+    SNOOZE = "snooze", "Snooze"
+    UNSNOOZE = "unsnooze", "Lift snooze"
+
+
+# Columns ``bulk_update_preferences`` needs to recompute reminders and feed the hooks
+BULK_FIELDS = [
+    "user_id",
+    "is_read",
+    "snoozed_until",
+    "last_reminded_at",
+    "first_seen_at",
+    "seen_at",
+    "delivered_at",
+    "first_read_at",
+    "first_snoozed_at",
+    "reminder_count",
+    "alert__severity",
+    "alert__archived",
+    "alert__expires_at",
+    "alert__start_at",
+    "alert__reminders_enabled",
+    "alert__reminder_frequency_minutes",
+]
+
+
+def bulk_update_preferences(
+    user: User, preferences: QuerySet[UserAlertPreference], action: str, until: datetime | None = None
+) -> int:
+    """Apply ``action`` to ``user``'s ``preferences`` with a single UPDATE; returns how many changed.
+
+    ``until`` is when a snooze ends (required for ``BulkAction.SNOOZE``).
+    Rows the action would not change are skipped. The changing rows are read
+    (and locked) once up front, so the new ``next_reminder_at`` values and the
+    counter, stats, analytics and funnel hooks all see exactly the rows the
+    UPDATE writes.
+    """
+    now = timezone.now()
+    changes = {
+        BulkAction.READ: Q(is_read=False),
+        BulkAction.UNREAD: Q(is_read=True),
+        BulkAction.SNOOZE: ~Q(snoozed_until=until),
+        BulkAction.UNSNOOZE: Q(snoozed_until__gt=now),
+    }
+    with transaction.atomic():
+        prefs = list(
+            preferences.filter(changes[action], user=user)
+            .select_related("alert")
+            .select_for_update(of=("self",))
+            .only(*BULK_FIELDS)
+            .order_by()
+        )
+        if not prefs:
+            return 0
+        previous = [pref.snoozed_until for pref in prefs]
+        fields = {"updated_at": now}
+        if action in (BulkAction.READ, BulkAction.UNREAD):
+            fields["is_read"] = action == BulkAction.READ
+            if action == BulkAction.READ:
+                fields["first_read_at"] = Coalesce("first_read_at", Value(now))
+        else:
+            fields["snoozed_until"] = until if action == BulkAction.SNOOZE else None
+            if action == BulkAction.SNOOZE:
+                fields["first_snoozed_at"] = Coalesce("first_snoozed_at", Value(now))
+        # Reminder times depend on each row's alert and history: compute them with
+        # the model's own rule and write them through one CASE keyed by primary key
+        due_at: dict = defaultdict(list)
+        for pref in prefs:
+            for name in ("is_read", "snoozed_until"):
+                if name in fields:
+                    setattr(pref, name, fields[name])
+            due = pref.compute_next_reminder_at()
+            if due is not None:
+                due_at[due].append(pref.pk)
+        fields["next_reminder_at"] = Case(
+            *[When(pk__in=pks, then=Value(due)) for due, pks in due_at.items()],
+            default=None,
+            output_field=models.DateTimeField(),
+        )
+        UserAlertPreference.objects.filter(user=user, pk__in=[pref.pk for pref in prefs]).update(**fields)
+
+        if action == BulkAction.READ:
+            funnel.first_reads([pref for pref in prefs if pref.first_read_at is None], now)
+        elif action == BulkAction.SNOOZE:
+            funnel.bump([pref.alert_id for pref in prefs if pref.first_snoozed_at is None], snoozed=1)
+        if action in (BulkAction.READ, BulkAction.UNREAD):
+            read_changed(user.pk, prefs, action == BulkAction.READ)
+        else:
+            snooze_changed(prefs, previous)
+    if due_at:
+        bump_change_counter(REMINDER_SCHEDULE_COUNTER)
+    return len(prefs)
+
+
+def active_alerts(now=None) -> QuerySet[Alert]:
+    now = now or timezone.now()
+    return Alert.objects.filter(archived=False, start_at__lte=now).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+    )
+
+
+def due_reminders(now=None) -> QuerySet[UserAlertPreference]:
+    """Preferences that ``should_remind`` would accept, selected entirely in SQL.
+
+    The pass is a range scan of the partial ``(next_reminder_at,
+    snoozed_until)`` index over unread rows, which also drops snoozed rows
+    without reading them; the alert and audience conditions are correlated
+    lookups on rows that are already due, so users since retargeted away from
+    an alert stop being reminded.
+    """
+    now = now or timezone.now()
+    alerts = active_alerts(now).filter(reminders_enabled=True, pk=OuterRef("alert_id"))
+    targeted = AlertAudience.objects.filter(alert=OuterRef("alert_id"), user=OuterRef("user_id"))
+    return (
+        UserAlertPreference.objects.filter(is_read=False, next_reminder_at__lte=now)
+        .exclude(snoozed_until__gt=now)
+        .filter(Exists(alerts), Exists(targeted))
+    )
+
+
+def pending_reminders(until) -> QuerySet[UserAlertPreference]:
+    """Unread preferences whose next reminder falls at or before ``until``.
+
+    Used by the scheduler to fill its due-time heap ahead of time; rows are
+    re-checked against ``due_reminders`` when they fire.
+    """
+    alerts = Alert.objects.filter(archived=False, reminders_enabled=True, pk=OuterRef("alert_id")).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+    )
+    return UserAlertPreference.objects.filter(is_read=False, next_reminder_at__lte=until).filter(Exists(alerts))
+
+
+def send_reminders(due: QuerySet[UserAlertPreference]) -> int:
     count = 0
-    for pref in to_notify:
-        channel = get_channel(pref.alert.delivery_type)
-        channel.send(pref.user, pref.alert)
-        pref.last_reminded_at = timezone.now()
-        pref.save(update_fields=["last_reminded_at", "updated_at"])
-        count += 1
+    due = due.select_related("alert", "user").order_by("pk")
+    last_pk = 0
+    # Keyset pagination: each batch is updated before the next one is read
+    while batch := list(due.filter(pk__gt=last_pk)[:DELIVERY_BATCH_SIZE]):
+        last_pk = batch[-1].pk
+        by_alert: dict[int, list[UserAlertPreference]] = {}
+        for pref in batch:
+            by_alert.setdefault(pref.alert_id, []).append(pref)
+        outcome = send_groups([(prefs[0].alert, [p.user for p in prefs]) for prefs in by_alert.values()])
+        held = {(row.alert_id, row.user_id) for row in outcome.deferred}
+        for row in outcome.deferred:
+            row.reminder = True
+        sent = sent_pairs(outcome)
+        with transaction.atomic():
+            record_outcome(outcome)
+            now = timezone.now()
+            advance_reminders([p for p in batch if (p.alert_id, p.user_id) in sent], now, reminded=True)
+            attempted = sent | held
+            advance_reminders([p for p in batch if (p.alert_id, p.user_id) not in attempted], now, reminded=False)
+            if held:
+                # Out of the due range until the flush that sends them (see settle_reminders)
+                UserAlertPreference.objects.filter(
+                    pk__in=[p.pk for p in batch if (p.alert_id, p.user_id) in held]
+                ).update(next_reminder_at=None, updated_at=now)
+        count += len(batch)
+    if count:
+        bump_change_counter(REMINDER_SCHEDULE_COUNTER)
     return count
 
 
+def trigger_reminders() -> int:
+    return send_reminders(due_reminders())
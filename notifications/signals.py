@@ -0,0 +1,137 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import analytics, audience, funnel, revisions, stats, unread
+from .models import Alert, Team, User, UserAlertPreference
+from .services import REMINDER_SCHEDULE_COUNTER, bump_change_counter, reschedule_alert
+from .visibility import ALERTS_VERSION_COUNTER
+
+
+# Fields that move pending reminders (see UserAlertPreference.compute_next_reminder_at)
+SCHEDULE_FIELDS = ("start_at", "expires_at", "reminder_frequency_minutes", "reminders_enabled", "archived")
+# Stored (visibility, live, message, schedule) of an alert not saved before
+UNSAVED = (None, False, None, None)
+
+
+def schedule_of(alert: Alert) -> tuple:
+    return tuple(getattr(alert, name) for name in SCHEDULE_FIELDS)
+
+
+@receiver(pre_save, sender=Alert)
+def alert_saving(sender, instance: Alert, update_fields=None, **kwargs):
+    # Remember the stored targeting/liveness/message/schedule so post_save only does the work an edit calls for
+    tracked = {"visibility", "message", *SCHEDULE_FIELDS}
+    if update_fields is not None and not tracked & set(update_fields):
+        instance._stored = (
+            instance.visibility,
+            unread.is_live(instance, unread.expiry_watermark()),
+            instance.message,
+            schedule_of(instance),
+        )
+    elif instance.pk and (stored := Alert.objects.filter(pk=instance.pk).first()) is not None:
+        instance._stored = (
+            stored.visibility,
+            unread.is_live(stored, unread.expiry_watermark()),
+            stored.message,
+            schedule_of(stored),
+        )
+    else:
+        instance._stored = UNSAVED
+
+
+@receiver(post_save, sender=Alert)
+def alert_saved(sender, instance: Alert, created: bool, **kwargs):
+    stored_visibility, was_live, stored_message, stored_schedule = getattr(instance, "_stored", UNSAVED)
+    if not created:
+        # Only edits to the window, frequency or archive flag move pending reminders
+        if schedule_of(instance) != stored_schedule:
+            reschedule_alert(instance)
+        unread.alert_changed(instance, was_live)
+    else:
+        stats.create_for(instance)
+        funnel.create_for(instance)
+        analytics.record(analytics.event(analytics.ALERT_CREATED, instance.severity), at=instance.created_at)
+    if created or instance.message != stored_message:
+        revisions.record(instance)
+    # Users created while the alert was archived or expired never joined it
+    revived = not created and not was_live and unread.is_live(instance, unread.expiry_watermark())
+    if created or instance.visibility != stored_visibility or revived:
+        audience.mark_stale(instance)
+    bump_change_counter(REMINDER_SCHEDULE_COUNTER)
+    bump_change_counter(ALERTS_VERSION_COUNTER)
+
+
+@receiver(m2m_changed, sender=Alert.target_teams.through)
+@receiver(m2m_changed, sender=Alert.target_users.through)
+def alert_targets_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    by_team = sender is Alert.target_teams.through
+    visibility = Alert.VISIBILITY_TEAM if by_team else Alert.VISIBILITY_USER
+    if reverse:
+        # Changed from the team.alerts / user.direct_alerts side; pk_set holds alert ids
+        related = instance.alerts if by_team else instance.direct_alerts
+        if action == "pre_clear":
+            instance._cleared_alert_ids = list(related.values_list("pk", flat=True))
+            return
+        if action == "post_clear":
+            pk_set = instance._cleared_alert_ids
+        alerts = list(Alert.objects.filter(pk__in=pk_set or [], visibility=visibility))
+    else:
+        alerts = [instance] if instance.visibility == visibility else []
+    if not action.startswith("post_"):
+        return
+
+    for alert in alerts:
+        if not by_team and not reverse and action in ("post_add", "post_remove"):
+            # Direct targets map one-to-one onto audience rows
+            if action == "post_add":
+                audience.add_audience(alert.pk, pk_set)
+            else:
+                audience.remove_user(alert, pk_set)
+        else:
+            audience.mark_stale(alert)
+    # Invalidates every cached visible-alert set (see visibility.visible_alert_windows)
+    bump_change_counter(ALERTS_VERSION_COUNTER)
+
+
+@receiver(pre_delete, sender=Alert)
+def alert_deleting(sender, instance: Alert, **kwargs):
+    # Its preferences cascade away; stop counting the unread ones
+    if unread.is_live(instance, unread.expiry_watermark()):
+        unread.adjust(unread.alert_unread_users(instance), -1)
+
+
+@receiver(post_delete, sender=Alert)
+def alert_deleted(sender, **kwargs):
+    bump_change_counter(ALERTS_VERSION_COUNTER)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance: User, update_fields=None, **kwargs):
+    # Logins save last_login only; skip the lookup unless the team may have changed
+    if update_fields is not None and "team" not in update_fields:
+        instance._stored_team_id = instance.team_id
+    elif instance.pk:
+        instance._stored_team_id = User.objects.filter(pk=instance.pk).values_list("team_id", flat=True).first()
+    else:
+        instance._stored_team_id = None
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance: User, created: bool, **kwargs):
+    if created:
+        audience.add_user(instance)
+    elif instance.team_id != getattr(instance, "_stored_team_id", instance.team_id):
+        audience.move_user(instance, instance._stored_team_id)
+
+
+@receiver(pre_delete, sender=Team)
+def team_deleting(sender, instance: Team, **kwargs):
+    # Members are detached with a plain UPDATE and links cascade without m2m signals
+    audience.remove_team(instance)
+
+
+@receiver(post_save, sender=UserAlertPreference)
+def preference_saved(sender, instance: UserAlertPreference, created: bool, **kwargs):
+    # Reads only cancel reminders; the scheduler drops those lazily when they fire
+    if instance.next_reminder_at is not None:
+        bump_change_counter(REMINDER_SCHEDULE_COUNTER)
@@ -0,0 +1,126 @@
+"""Maintenance of the per-alert ``AlertStats`` counts shown in the admin alert list.
+
+Every preference write path in ``services`` reports here inside its own
+transaction, so counts move with relative ``F()`` updates instead of being
+recounted. Snoozes that run out are subtracted by ``sweep_expired_snoozes``,
+which scans ``snoozed_until`` between its watermark and now. ``reconcile``
+recomputes them all (e.g. after users were deleted, whose preferences cascade
+away without passing through these hooks).
+"""
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Iterable, Mapping
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Alert, AlertStats, SweepWatermark, UserAlertPreference
+from .reconciliation import count_of, reconcile_columns
+
+SNOOZE_WATERMARK = "snooze-expiry"
+
+
+def snooze_watermark() -> datetime:
+    return SweepWatermark.current(SNOOZE_WATERMARK)
+
+
+def counts_as_snoozed(snoozed_until: datetime | None, watermark: datetime) -> bool:
+    return snoozed_until is not None and snoozed_until > watermark
+
+
+def delta_case(deltas: Mapping[int, int]) -> Case:
+    """Each alert's delta as one CASE, with a WHEN per distinct delta."""
+    by_delta: dict[int, list[int]] = defaultdict(list)
+    for alert_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(alert_id)
+    return Case(
+        *[When(alert_id__in=alert_ids, then=Value(delta)) for delta, alert_ids in by_delta.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def add_by_delta(deltas: Mapping[int, int], field: str) -> None:
+    """Add each alert's delta to ``field`` with a single UPDATE."""
+    alert_ids = [alert_id for alert_id, delta in deltas.items() if delta]
+    if alert_ids:
+        AlertStats.objects.filter(alert_id__in=alert_ids).update(**{field: F(field) + delta_case(deltas)})
+
+
+def create_for(alert: Alert) -> None:
+    AlertStats.objects.create(alert=alert)
+
+
+def preferences_created(alert_ids: Iterable[int], count: int = 1) -> None:
+    """``count`` new unread, unsnoozed preferences for each of ``alert_ids``."""
+    AlertStats.objects.filter(alert_id__in=alert_ids).update(preferences=F("preferences") + count)
+
+
+def read_changed(alert_ids: Iterable[int], is_read: bool) -> None:
+    """One preference of each of ``alert_ids`` flipped to ``is_read``."""
+    AlertStats.objects.filter(alert_id__in=alert_ids).update(read=F("read") + (1 if is_read else -1))
+
+
+def snoozes_changed(changes: Iterable[tuple[int, datetime | None, datetime | None]]) -> None:
+    """Apply snooze edits given as ``(alert_id, old snoozed_until, new snoozed_until)``."""
+    watermark = snooze_watermark()
+    deltas: Counter[int] = Counter()
+    for alert_id, old, new in changes:
+        deltas[alert_id] += counts_as_snoozed(new, watermark) - counts_as_snoozed(old, watermark)
+    add_by_delta(deltas, "snoozed")
+
+
+def sweep_expired_snoozes(now: datetime | None = None) -> int:
+    """Stop counting snoozes that ran out since the last sweep; returns how many did."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        watermark = snooze_watermark()
+        if now <= watermark:
+            return 0
+        expired = Counter(
+            dict(
+                UserAlertPreference.objects.filter(snoozed_until__gt=watermark, snoozed_until__lte=now)
+                .order_by()
+                .values("alert_id")
+                .annotate(n=Count("id"))
+                .values_list("alert_id", "n")
+            )
+        )
+        add_by_delta(Counter({alert_id: -n for alert_id, n in expired.items()}), "snoozed")
+        SweepWatermark.objects.filter(name=SNOOZE_WATERMARK).update(swept_until=now)
+    return expired.total()
+
+
+def annotate_counts(queryset):
+    """Add ``num_preferences``/``num_read``/``num_unread``/``num_snoozed`` from the stats rows."""
+    return queryset.annotate(
+        num_preferences=Coalesce(F("stats__preferences"), 0),
+        num_read=Coalesce(F("stats__read"), 0),
+        num_unread=Coalesce(F("stats__preferences") - F("stats__read"), 0),
+        num_snoozed=Coalesce(F("stats__snoozed"), 0),
+    )
+
+
+def reconcile() -> int:
+    """Recompute every alert's stats from its preferences; returns how many rows changed."""
+
+    def count(condition: Q = Q()):
+        return count_of(UserAlertPreference.objects.filter(condition, alert=OuterRef("alert_id")), "alert_id")
+
+    with transaction.atomic():
+        watermark = snooze_watermark()
+        missing = Alert.objects.filter(stats__isnull=True).values_list("pk", flat=True)
+        AlertStats.objects.bulk_create([AlertStats(alert_id=pk) for pk in missing], ignore_conflicts=True)
+        return reconcile_columns(
+            AlertStats,
+            {
+                "preferences": count(),
+                "read": count(Q(is_read=True)),
+                "snoozed": count(Q(snoozed_until__gt=watermark)),
+            },
+        )
@@ -0,0 +1,53 @@
+"""Server-sent event stream of a user's in-app deliveries (serve under ASGI)."""
+from __future__ import annotations
+
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .broadcast import get_broadcaster
+
+# Comment lines sent on idle connections so proxies don't time them out
+KEEPALIVE_SECONDS = getattr(settings, "NOTIFICATIONS_STREAM_KEEPALIVE_SECONDS", 15)
+
+
+async def event_stream(user_id: int):
+    broadcaster = get_broadcaster()
+    subscription = broadcaster.subscribe(user_id)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            event = await subscription.get(KEEPALIVE_SECONDS)
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: delivery\ndata: {json.dumps(event)}\n\n"
+    finally:
+        # Runs when the client disconnects and the server cancels the response
+        broadcaster.unsubscribe(subscription)
+
+
+def supports_streaming(request) -> bool:
+    """Whether ``request`` is served by ASGI, which can hold a stream open.
+
+    Under WSGI (e.g. ``runserver``) each open stream would pin a worker thread
+    for as long as the client stays connected.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+@require_GET
+async def my_alerts_stream(request):
+    if not supports_streaming(request):
+        # 204 tells EventSource clients to stop reconnecting
+        return HttpResponse(status=204)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    response = StreamingHttpResponse(event_stream(user.pk), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
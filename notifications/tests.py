@@ -1,3 +1,1700 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import math
+import os
+import signal
+import socketserver
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import analytics, audience, broadcast, funnel, jobs, retention, revisions, services, stats, unread
+from .benchmark import Scale, default_cases, generate
+from .channels import EmailChannel, SMSChannel, SMTPConnectionPool
+from .jobs import deliver_alert
+from .models import (
+    Alert,
+    AlertAudience,
+    AlertFunnel,
+    AlertRevision,
+    AlertStats,
+    DeferredDelivery,
+    FanOutJob,
+    NotificationDelivery,
+    RateLimitBucket,
+    Team,
+    User,
+    UserAlertPreference,
+    UserUnreadCounter,
+)
+from .ratelimit import TokenBucket
+from .scheduler import ReminderScheduler
+from .serializers import PreferenceRowSerializer, SnoozeSerializer, UserAlertPreferenceSerializer
+from .visibility import visible_alert_ids, visible_alert_windows
+
+
+class DebugSMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server: accepts mail, refuses recipients at bounce.example.com."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost debug SMTP")
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "RCPT":
+                if "bounce.example.com" in command:
+                    self.reply("550 No such user")
+                else:
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                server.messages += 1
+                self.reply("250 OK")
+                if server.drop_after and server.messages % server.drop_after == 0:
+                    return
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after: int = 0):
+        super().__init__(("127.0.0.1", 0), DebugSMTPHandler)
+        self.connections = 0
+        self.messages = 0
+        self.drop_after = drop_after
+
+
+class EmailChannelTests(TestCase):
+    def start_server(self, **kwargs) -> SMTPConnectionPool:
+        server = DebugSMTPServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        pool = SMTPConnectionPool("127.0.0.1", server.server_address[1], timeout=5, size=2)
+        self.addCleanup(pool.close)
+        return pool
+
+    def setUp(self):
+        # Users first: bulk_create sends no signals, the alert's audience is built on save
+        self.users = User.objects.bulk_create(
+            [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(30)]
+        )
+        self.alert = Alert.objects.create(title="Disk full", message="Free some space", delivery_type="email")
+
+    def test_batch_reuses_one_connection(self):
+        pool = self.start_server()
+        deliveries = EmailChannel(pool=pool).send_many(self.users, self.alert)
+        self.assertEqual(len(deliveries), 30)
+        self.assertTrue(all(d.status == NotificationDelivery.Status.SENT for d in deliveries))
+        self.assertEqual(self.server.messages, 30)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_refused_recipients_and_missing_addresses_fail(self):
+        pool = self.start_server()
+        bounced = User.objects.create(username="gone", email="gone@bounce.example.com")
+        no_email = User.objects.create(username="nomail")
+        deliveries = EmailChannel(pool=pool).send_many([bounced, no_email, self.users[0]], self.alert)
+        statuses = [d.status for d in deliveries]
+        self.assertEqual(statuses, ["failed", "failed", "sent"])
+
+    def test_reconnects_when_server_drops_connection(self):
+        pool = self.start_server(drop_after=10)
+        deliveries = EmailChannel(pool=pool).send_many(self.users, self.alert)
+        self.assertTrue(all(d.status == NotificationDelivery.Status.SENT for d in deliveries))
+        self.assertEqual(self.server.messages, 30)
+        self.assertEqual(self.server.connections, 3)
+
+    def test_deliver_alert_records_email_deliveries(self):
+        pool = self.start_server()
+        self.addCleanup(setattr, services.CHANNEL_REGISTRY["email"], "pool", services.CHANNEL_REGISTRY["email"].pool)
+        services.CHANNEL_REGISTRY["email"].pool = pool
+        self.assertEqual(deliver_alert(self.alert), 30)
+        self.assertEqual(NotificationDelivery.objects.filter(channel="email", status="sent").count(), 30)
+        self.assertLessEqual(self.server.connections, 2)
+
+
+class StubSMSGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.received.append(payload)
+        code = 400 if payload["to"].startswith("+000") else 200
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SMSChannelTests(TestCase):
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubSMSGatewayHandler)
+        server.received = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        self.channel = SMSChannel(
+            gateway_url=f"http://127.0.0.1:{server.server_address[1]}/send",
+            rate_limiter=TokenBucket("sms-test", rate=5, capacity=5),
+        )
+        self.alert = Alert.objects.create(title="Outage", message="API down", delivery_type="sms")
+        self.users = User.objects.bulk_create(
+            [User(username=f"user{i}", phone_number=f"+1555000{i:04d}") for i in range(12)]
+        )
+        patcher = mock.patch.dict(services.CHANNEL_REGISTRY, {"sms": self.channel})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_gateway_statuses(self):
+        bad = User.objects.create(username="bad", phone_number="+0001")
+        no_phone = User.objects.create(username="nophone")
+        deliveries = self.channel.send_many([bad, no_phone, self.users[0]], self.alert)
+        self.assertEqual([d.status for d in deliveries], ["failed", "failed", "sent"])
+        self.assertEqual(len(self.server.received), 2)
+
+    def test_token_bucket_is_shared_and_non_blocking(self):
+        first = TokenBucket("shared", rate=1, capacity=3)
+        second = TokenBucket("shared", rate=1, capacity=3)
+        self.assertEqual(first.acquire(2), 2)
+        self.assertEqual(second.acquire(5), 1)
+        self.assertEqual(first.acquire(1), 0)
+
+    def test_over_limit_sends_are_deferred_then_flushed(self):
+        result = services.dispatch([(self.alert, self.users)])
+        self.assertEqual((result.sent, result.failed, result.deferred), (5, 0, 7))
+        self.assertEqual(len(self.server.received), 5)
+        self.assertEqual(DeferredDelivery.objects.count(), 7)
+
+        # Nothing is due yet, so a flush sends nothing and does not wait
+        self.assertEqual(services.flush_deferred().sent, 0)
+
+        # Two seconds later the bucket holds 5 more tokens again
+        later = timezone.now() + timedelta(seconds=2)
+        RateLimitBucket.objects.filter(name="sms-test").update(refilled_at=F("refilled_at") - timedelta(seconds=2))
+        result = services.flush_deferred(now=later)
+        self.assertEqual((result.sent, result.deferred), (5, 2))
+        self.assertEqual(len(self.server.received), 10)
+        self.assertEqual(NotificationDelivery.objects.filter(channel="sms", status="sent").count(), 10)
+
+    def test_overlapping_flushes_send_each_row_once(self):
+        services.dispatch([(self.alert, self.users)])
+        RateLimitBucket.objects.filter(name="sms-test").update(refilled_at=F("refilled_at") - timedelta(seconds=2))
+        later = timezone.now() + timedelta(seconds=2)
+        claim = services.claim_deferred
+        results, overlapped = [], []
+
+        def other_flush_first(batch):
+            # Both flushes have read the same due rows; the other one claims and sends them first
+            if not overlapped:
+                overlapped.append(True)
+                results.append(services.flush_deferred(now=later))
+            return claim(batch)
+
+        with mock.patch.object(services, "claim_deferred", side_effect=other_flush_first):
+            results.append(services.flush_deferred(now=later))
+        self.assertEqual([(r.sent, r.deferred) for r in results], [(5, 2), (0, 0)])
+        self.assertEqual(len(self.server.received), 10)
+        self.assertEqual(DeferredDelivery.objects.count(), 2)
+
+    def test_held_back_reminders_advance_only_when_sent(self):
+        audience.rebuild_alert_audience(self.alert)
+        UserAlertPreference.objects.bulk_create(
+            [UserAlertPreference(alert=self.alert, user=user, next_reminder_at=timezone.now()) for user in self.users]
+        )
+        prefs = UserAlertPreference.objects.filter(alert=self.alert)
+        self.assertEqual(services.trigger_reminders(), 12)
+        self.assertEqual(prefs.filter(reminder_count=1, last_reminded_at__isnull=False).count(), 5)
+        held = prefs.filter(reminder_count=0, last_reminded_at__isnull=True, next_reminder_at__isnull=True)
+        self.assertEqual(held.count(), 7)
+        self.assertEqual(DeferredDelivery.objects.filter(reminder=True).count(), 7)
+        # Held rows are out of the due range, so the next pass does not queue them twice
+        self.assertEqual(services.trigger_reminders(), 0)
+
+        RateLimitBucket.objects.filter(name="sms-test").update(refilled_at=F("refilled_at") - timedelta(seconds=2))
+        self.assertEqual(services.flush_deferred(now=timezone.now() + timedelta(seconds=2)).sent, 5)
+        self.assertEqual(prefs.filter(reminder_count=1).count(), 10)
+        self.assertEqual(prefs.filter(reminder_count=1, next_reminder_at__isnull=True).count(), 0)
+        self.assertEqual(held.count(), 2)
+        self.assertEqual(DeferredDelivery.objects.filter(reminder=True).count(), 2)
+
+    def test_sends_run_outside_transactions(self):
+        depths = []
+        send_many = self.channel.send_many
+        dispatcher_connection = connections["default"]  # sends may run on pool threads
+
+        def record_depth(users, alert):
+            depths.append(len(dispatcher_connection.savepoint_ids))
+            return send_many(users, alert)
+
+        audience.rebuild_alert_audience(self.alert)  # bulk_create skipped the user signals
+        outer = len(connection.savepoint_ids)
+        with mock.patch.object(self.channel, "send_many", side_effect=record_depth):
+            deliver_alert(self.alert)
+        self.assertEqual(set(depths), {outer})
+        self.assertEqual(NotificationDelivery.objects.filter(channel="sms").count(), 5)
+
+    def test_only_successful_sends_count_as_delivered(self):
+        audience.rebuild_alert_audience(self.alert)
+        User.objects.filter(pk=self.users[0].pk).update(phone_number="+0001")
+        self.assertEqual(deliver_alert(self.alert), 4)
+        delivered = UserAlertPreference.objects.filter(alert=self.alert, delivered_at__isnull=False)
+        self.assertEqual(delivered.count(), 4)
+        self.assertEqual(AlertFunnel.objects.get(alert=self.alert).delivered, 4)
+
+        # Deferred sends become deliveries when a flush actually sends them
+        RateLimitBucket.objects.filter(name="sms-test").update(refilled_at=F("refilled_at") - timedelta(seconds=2))
+        self.assertEqual(services.flush_deferred(now=timezone.now() + timedelta(seconds=2)).sent, 5)
+        self.assertEqual(delivered.count(), 9)
+        self.assertEqual(AlertFunnel.objects.get(alert=self.alert).delivered, 9)
+
+    def test_in_app_not_held_up_by_sms_limit(self):
+        in_app = Alert.objects.create(title="FYI", message="Deploy done")
+        result = services.dispatch([(self.alert, self.users), (in_app, self.users)])
+        self.assertEqual(result.sent, 5 + 12)
+        self.assertEqual(NotificationDelivery.objects.filter(channel="in_app").count(), 12)
+
+
+class RecordingChannel:
+    """A batch channel that remembers which thread sent which chunk."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def send_many(self, users, alert):
+        self.chunks.append((threading.current_thread().name, [user.pk for user in users]))
+        return [NotificationDelivery(alert=alert, user=user, channel="email", status="sent") for user in users]
+
+
+class SingleSendChannel:
+    """A channel without ``send_many``; odd user ids fail."""
+
+    def send(self, user, alert):
+        return user.pk % 2 == 0
+
+
+class SendGroupsTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f"user{i}") for i in range(7)]
+        self.email = Alert.objects.create(title="Mail", message="Batch", delivery_type="email")
+        self.in_app = Alert.objects.create(title="Inline", message="Here")
+
+    def test_concurrent_channels_split_batches_across_their_pool(self):
+        channel = RecordingChannel()
+        with mock.patch.dict(services.CHANNEL_REGISTRY, {"email": channel}), mock.patch.dict(
+            services.CHANNEL_CONCURRENCY, {"email": 3}
+        ), mock.patch.dict(services._executors, {}):
+            outcome = services.send_groups([(self.email, self.users), (self.in_app, self.users)])
+            services._executors["email"].shutdown()
+        self.assertEqual(sorted(len(pks) for _, pks in channel.chunks), [1, 3, 3])
+        self.assertEqual(sorted(pk for _, pks in channel.chunks for pk in pks), [user.pk for user in self.users])
+        self.assertTrue(all(name.startswith("notify-email") for name, _ in channel.chunks))
+        self.assertEqual(len(outcome.deliveries), 14)
+
+        with transaction.atomic():
+            result = services.record_outcome(outcome)
+        self.assertEqual((result.sent, result.failed), (14, 0))
+        self.assertEqual(NotificationDelivery.objects.filter(channel="email").count(), 7)
+
+    def test_channels_without_send_many_send_one_by_one(self):
+        with mock.patch.dict(services.CHANNEL_REGISTRY, {"email": SingleSendChannel()}):
+            outcome = services.send_groups([(self.email, self.users)])
+        even = [user.pk for user in self.users if user.pk % 2 == 0]
+        self.assertEqual(outcome.sent[self.email.pk], even)
+        self.assertEqual(services.sent_pairs(outcome), {(self.email.pk, pk) for pk in even})
+        with transaction.atomic():
+            result = services.record_outcome(outcome)
+        self.assertEqual((result.sent, result.failed), (len(even), 7 - len(even)))
+
+
+class BroadcastTests(TestCase):
+    def test_in_app_sends_reach_subscribers_from_worker_threads(self):
+        alert = Alert.objects.create(title="Deploy", message="v2 is live")
+        alice, bob = User.objects.bulk_create([User(username="alice"), User(username="bob")])
+
+        async def receive():
+            broadcaster = broadcast.InProcessBroadcaster()
+            with mock.patch.object(broadcast, "_broadcaster", broadcaster):
+                subscription = broadcaster.subscribe(alice.pk)
+                sender = threading.Thread(target=services.InAppChannel().send_many, args=([alice, bob], alert))
+                sender.start()
+                event = await subscription.get(timeout=2)
+                sender.join()
+                broadcaster.unsubscribe(subscription)
+                return event, broadcaster.subscribed_user_ids()
+
+        event, remaining = asyncio.run(receive())
+        self.assertEqual(event["alert"], {"id": alert.pk, "title": "Deploy", "message": "v2 is live", "severity": "info"})
+        self.assertEqual(remaining, set())
+
+    def test_delivery_log_yields_new_in_app_rows_after_its_cursor(self):
+        alice, bob = User.objects.bulk_create([User(username="alice"), User(username="bob")])
+        alert = Alert.objects.create(title="Deploy", message="v2 is live")
+        deliver_alert(alert)  # already in the log when the stream starts
+        broadcaster = broadcast.DeliveryLogBroadcaster()
+        self.assertEqual(broadcaster._fetch(), [])
+        cursor = broadcaster._last_id
+        self.assertEqual(cursor, NotificationDelivery.objects.latest("pk").pk)
+
+        alert.message = "v2.1 is live"
+        alert.save()
+        deliver_alert(alert)
+        NotificationDelivery.objects.create(alert=alert, user=alice, channel=Alert.DeliveryType.EMAIL)
+        NotificationDelivery.objects.create(alert=alert, user=alice, status=NotificationDelivery.Status.FAILED)
+        rows = broadcaster._fetch()
+        self.assertEqual(
+            [(row["user_id"], row["revision__message"]) for row in rows],
+            [(alice.pk, "v2.1 is live"), (bob.pk, "v2.1 is live")],
+        )
+        self.assertTrue(all(row["pk"] > cursor for row in rows))
+
+        async def receive():
+            # Poll once with the rows above; only the subscribed user gets an event
+            polling = mock.patch.object(broadcaster, "POLL_INTERVAL", 0)
+            with mock.patch.object(broadcaster, "_fetch", return_value=rows), polling:
+                subscription = broadcaster.subscribe(alice.pk)
+                event = await subscription.get(timeout=2)
+                broadcaster.unsubscribe(subscription)
+                await broadcaster._poller
+            return event
+
+        event = asyncio.run(receive())
+        self.assertEqual((event["alert"]["id"], event["alert"]["message"]), (alert.pk, "v2.1 is live"))
+        self.assertIsNone(broadcaster._last_id)  # reset once nobody listens
+
+    def test_stream_is_not_served_under_wsgi(self):
+        user = User.objects.create(username="dave")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/api/my-alerts/stream/").status_code, 204)
+        self.assertNotContains(self.client.get("/dashboard/"), "EventSource(")
+
+
+class RetentionTests(TestCase):
+    def test_prune_deletes_expired_rows_in_batches_and_archives_them(self):
+        alert = Alert.objects.create(title="Old", message="Stale news")
+        user = User.objects.create(username="carol")
+        now = timezone.now()
+        rows = NotificationDelivery.objects.bulk_create(
+            [
+                NotificationDelivery(alert=alert, user=user, channel=channel, status=status, revision=alert.current_revision)
+                for channel, status in [("in_app", "sent")] * 5 + [("email", "failed")] * 2
+            ]
+        )
+        # auto_now_add ignores given values, so age the rows afterwards
+        NotificationDelivery.objects.filter(pk__in=[d.pk for d in rows[:4]]).update(sent_at=now - timedelta(days=40))
+        NotificationDelivery.objects.filter(pk__in=[d.pk for d in rows[5:]]).update(sent_at=now - timedelta(days=40))
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            result = retention.prune(
+                now=now, batch_size=3, archive_dir=archive_dir, policy={"*": 90, "in_app": 30, "*:failed": 180}
+            )
+            with gzip.open(result.archive, "rt") as archive:
+                archived = [json.loads(line) for line in archive]
+
+        self.assertEqual((result.deleted, result.batches), (4, 2))
+        self.assertEqual(sorted(row["id"] for row in archived), sorted(d.pk for d in rows[:4]))
+        self.assertEqual(archived[0]["message"], "Stale news")
+        self.assertEqual(NotificationDelivery.objects.count(), 3)
+
+
+class FanOutTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f"user{i}") for i in range(4)]
+        self.alert = Alert.objects.create(title="Deploy", message="v4 is out")
+        # A user whose badge is already materialized gets an incremental +1
+        self.assertEqual(unread.unread_count(self.users[0]), 0)
+
+    def test_delivers_to_the_audience_and_counts_each_preference_once(self):
+        self.assertEqual(deliver_alert(self.alert), 4)
+        prefs = UserAlertPreference.objects.filter(alert=self.alert)
+        self.assertEqual(sorted(prefs.values_list("user_id", flat=True)), [u.pk for u in self.users])
+        self.assertEqual(NotificationDelivery.objects.filter(alert=self.alert, status="sent").count(), 4)
+        self.assertEqual(UserUnreadCounter.objects.get(user=self.users[0]).unread, 1)
+        self.assertEqual(AlertStats.objects.get(alert=self.alert).preferences, 4)
+        self.assertEqual(AlertFunnel.objects.get(alert=self.alert).delivered, 4)
+
+        # Delivering again reuses the preferences: new delivery rows, but no recount
+        self.assertEqual(deliver_alert(self.alert), 4)
+        self.assertEqual(prefs.count(), 4)
+        self.assertEqual(NotificationDelivery.objects.filter(alert=self.alert).count(), 8)
+        self.assertEqual(UserUnreadCounter.objects.get(user=self.users[0]).unread, 1)
+        self.assertEqual(AlertStats.objects.get(alert=self.alert).preferences, 4)
+        self.assertEqual(AlertFunnel.objects.get(alert=self.alert).delivered, 4)
+        self.assertEqual(unread.reconcile(), 0)
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_a_preference_created_concurrently_is_counted_once(self):
+        insert_preferences = services.insert_preferences
+
+        def concurrent_insert(rows, stamp):
+            # The user lists their alerts between the batch lookup and its INSERT
+            with mock.patch.object(services, "insert_preferences", insert_preferences):
+                services.ensure_preferences(self.users[0], [self.alert.pk])
+            return insert_preferences(rows, stamp)
+
+        with mock.patch.object(services, "insert_preferences", concurrent_insert):
+            self.assertEqual(deliver_alert(self.alert), 4)
+        self.assertEqual(UserUnreadCounter.objects.get(user=self.users[0]).unread, 1)
+        self.assertEqual(AlertStats.objects.get(alert=self.alert).preferences, 4)
+        self.assertEqual(unread.reconcile(), 0)
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_inactive_alerts_are_not_delivered(self):
+        later = Alert.objects.create(title="Later", message="Not yet", start_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(deliver_alert(later), 0)
+        self.assertFalse(NotificationDelivery.objects.exists())
+        self.assertFalse(FanOutJob.objects.filter(alert=later).exists())
+
+    def test_query_count_does_not_depend_on_audience_size(self):
+        deliver_alert(Alert.objects.create(title="Warm-up", message="Caches"))
+        with CaptureQueriesContext(connection) as small:
+            deliver_alert(Alert.objects.create(title="Small", message="Four users"))
+        User.objects.bulk_create([User(username=f"extra{i}") for i in range(40)])
+        audience.rebuild_all()
+        with CaptureQueriesContext(connection) as large:
+            deliver_alert(Alert.objects.create(title="Large", message="Forty-four users"))
+        self.assertEqual(len(large), len(small))
+
+
+class DueRemindersTests(TestCase):
+    """``due_reminders`` selects in SQL exactly what ``should_remind`` accepts in Python."""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.users = [User.objects.create(username=f"user{i}") for i in range(6)]
+        self.prefs = {}
+
+    def alert(self, **fields) -> Alert:
+        fields.setdefault("start_at", self.now - timedelta(hours=2))
+        alert = Alert.objects.create(title="Check", message="Please look", reminder_frequency_minutes=60, **fields)
+        audience.rebuild_stale()
+        return alert
+
+    def pref(self, name, alert, user, next_reminder_at=None, **fields) -> UserAlertPreference:
+        # next_reminder_at is written as given, so a stale due time cannot hide a predicate the SQL lacks
+        pref = UserAlertPreference.objects.create(
+            alert=alert, user=user, next_reminder_at=next_reminder_at or self.now - timedelta(minutes=1), **fields
+        )
+        self.prefs[name] = pref
+        return pref
+
+    def test_predicate_matches_should_remind(self):
+        live = self.alert()
+        hour_ago = self.now - timedelta(hours=1)
+        self.pref("never reminded", live, self.users[0])
+        self.pref("read", live, self.users[1], is_read=True)
+        self.pref("snoozed", live, self.users[2], snoozed_until=self.now + timedelta(hours=1))
+        self.pref("snooze over", live, self.users[3], snoozed_until=hour_ago)
+        self.pref(
+            "reminded recently",
+            live,
+            self.users[4],
+            last_reminded_at=self.now - timedelta(minutes=30),
+            next_reminder_at=self.now + timedelta(minutes=30),
+        )
+        self.pref("reminded an hour ago", live, self.users[5], last_reminded_at=self.now - timedelta(minutes=61))
+        self.pref("expired", self.alert(expires_at=self.now - timedelta(minutes=1)), self.users[0])
+        self.pref("archived", self.alert(archived=True), self.users[0])
+        self.pref("reminders off", self.alert(reminders_enabled=False), self.users[0])
+        self.pref("not started", self.alert(start_at=self.now + timedelta(hours=1)), self.users[0])
+
+        due = set(services.due_reminders().values_list("pk", flat=True))
+        self.assertEqual(
+            {name for name, pref in self.prefs.items() if pref.pk in due},
+            {"never reminded", "snooze over", "reminded an hour ago"},
+        )
+        for name, pref in self.prefs.items():
+            with self.subTest(name):
+                pref.refresh_from_db()
+                self.assertEqual(services.should_remind(pref), pref.pk in due)
+
+    def test_users_dropped_from_the_audience_are_not_reminded(self):
+        alert = self.alert(visibility=Alert.VISIBILITY_USER)
+        alert.target_users.set(self.users[:2])
+        self.pref("kept", alert, self.users[0])
+        self.pref("dropped", alert, self.users[1])
+        alert.target_users.remove(self.users[1])
+        UserAlertPreference.objects.filter(pk=self.prefs["dropped"].pk).update(next_reminder_at=self.now)
+        self.assertEqual(list(services.due_reminders().values_list("pk", flat=True)), [self.prefs["kept"].pk])
+
+    def test_frequency_spaces_reminders(self):
+        alert = self.alert()
+        pref = self.pref("never reminded", alert, self.users[0])
+        self.assertEqual(services.trigger_reminders(), 1)
+        self.assertFalse(services.due_reminders().exists())
+        pref.refresh_from_db()
+        self.assertFalse(services.due_reminders(pref.last_reminded_at + timedelta(minutes=59)).exists())
+        self.assertEqual(list(services.due_reminders(pref.last_reminded_at + timedelta(minutes=60))), [pref])
+
+
+class ReminderScheduleTests(TestCase):
+    def setUp(self):
+        self.users = User.objects.bulk_create([User(username=f"user{i}") for i in range(3)])
+        self.now = timezone.now()
+
+    def test_due_range_is_empty_after_expiry(self):
+        alert = Alert.objects.create(title="Window", message="Maintenance", expires_at=self.now + timedelta(hours=5))
+        deliver_alert(alert)
+        prefs = UserAlertPreference.objects.filter(alert=alert)
+        self.assertEqual(prefs.filter(next_reminder_at__isnull=False).count(), 3)
+
+        later = self.now + timedelta(hours=6)
+        self.assertEqual(unread.sweep_expired(now=later), 1)
+        self.assertFalse(services.pending_reminders(later + timedelta(days=1)).exists())
+        self.assertFalse(prefs.filter(next_reminder_at__isnull=False).exists())
+
+    def test_short_lived_alert_schedules_no_reminder_past_expiry(self):
+        alert = Alert.objects.create(
+            title="Blip", message="Brief outage", start_at=self.now - timedelta(minutes=1),
+            expires_at=self.now + timedelta(minutes=30), reminder_frequency_minutes=60,
+        )
+        deliver_alert(alert)
+        self.assertEqual(
+            set(UserAlertPreference.objects.filter(alert=alert).values_list("next_reminder_at", flat=True)), {None}
+        )
+
+    def test_archiving_and_audience_removal_clear_reminders(self):
+        archived = Alert.objects.create(title="Old", message="Done")
+        direct = Alert.objects.create(title="You", message="Check in", visibility=Alert.VISIBILITY_USER)
+        direct.target_users.set(self.users)
+        deliver_alert(archived)
+        deliver_alert(direct)
+        UserAlertPreference.objects.update(next_reminder_at=self.now)
+
+        archived.archived = True
+        archived.save()
+        direct.target_users.remove(self.users[0])
+        scheduled = UserAlertPreference.objects.filter(next_reminder_at__isnull=False)
+        self.assertEqual(
+            sorted(scheduled.values_list("alert_id", "user_id")), [(direct.pk, u.pk) for u in self.users[1:]]
+        )
+
+
+    def test_each_send_schedules_the_next_reminder(self):
+        alert = Alert.objects.create(title="Check", message="Please look", reminder_frequency_minutes=30)
+        deliver_alert(alert)
+        prefs = UserAlertPreference.objects.filter(alert=alert)
+        first = prefs.first()
+        self.assertEqual(first.next_reminder_at, first.last_reminded_at + timedelta(minutes=30))
+        # Nothing due yet; the due-queue range up to the next reminder holds every row
+        self.assertEqual(services.trigger_reminders(), 0)
+        self.assertEqual(services.pending_reminders(first.next_reminder_at).count(), 3)
+        self.assertFalse(services.pending_reminders(first.next_reminder_at - timedelta(seconds=1)).exists())
+
+        prefs.update(next_reminder_at=timezone.now())
+        self.assertEqual(services.trigger_reminders(), 3)
+        for pref in prefs:
+            self.assertEqual(pref.reminder_count, 1)
+            self.assertEqual(pref.next_reminder_at, pref.last_reminded_at + timedelta(minutes=30))
+        self.assertEqual(services.trigger_reminders(), 0)
+
+    def test_only_schedule_edits_touch_preferences(self):
+        alert = Alert.objects.create(title="Window", message="Maintenance", reminder_frequency_minutes=60)
+        deliver_alert(alert)
+        prefs = UserAlertPreference.objects.filter(alert=alert).order_by("pk")
+        stamps = list(prefs.values_list("updated_at", flat=True))
+
+        alert.title, alert.message = "Window (updated)", "Maintenance, now at 22:00"
+        with CaptureQueriesContext(connection) as queries:
+            alert.save()
+        pref_table = UserAlertPreference._meta.db_table
+        self.assertFalse([q["sql"] for q in queries if q["sql"].startswith(f'UPDATE "{pref_table}"')])
+        self.assertEqual(list(prefs.values_list("updated_at", flat=True)), stamps)
+
+    def test_schedule_edit_matches_the_model_rule_and_skips_unmoved_rows(self):
+        alert = Alert.objects.create(
+            title="Window", message="Maintenance", start_at=self.now - timedelta(hours=1),
+            expires_at=self.now + timedelta(hours=5), reminder_frequency_minutes=60,
+        )
+        deliver_alert(alert)
+        prefs = UserAlertPreference.objects.filter(alert=alert).order_by("pk")
+        read, snoozed, fresh = prefs
+        services.mark_read(read, True)
+        wake = self.now + timedelta(hours=3)
+        UserAlertPreference.objects.filter(pk=snoozed.pk).update(snoozed_until=wake, next_reminder_at=wake)
+        UserAlertPreference.objects.filter(pk=fresh.pk).update(last_reminded_at=None)
+        before = dict(prefs.values_list("pk", "updated_at"))
+
+        alert.reminder_frequency_minutes = 120
+        alert.save()
+        for pref in prefs.select_related("alert"):
+            with self.subTest(pref=pref.pk):
+                self.assertEqual(pref.next_reminder_at, pref.compute_next_reminder_at())
+        # Read rows keep no reminder and the snooze still wins: neither row moved
+        after = dict(prefs.values_list("pk", "updated_at"))
+        self.assertEqual([after[pk] == before[pk] for pk in (read.pk, snoozed.pk)], [True, True])
+
+        # Pulling the expiry in before the snooze ends drops that row's reminder
+        alert.expires_at = self.now + timedelta(minutes=30)
+        alert.save()
+        self.assertEqual(list(prefs.values_list("next_reminder_at", flat=True)), [None, None, alert.start_at])
+
+
+class ReminderSchedulerTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.users = [User.objects.create(username=f"user{i}") for i in range(2)]
+        self.alert = Alert.objects.create(title="Check", message="Please look", start_at=self.now - timedelta(hours=1))
+        audience.rebuild_stale()
+        self.soon, self.later = (
+            UserAlertPreference.objects.create(alert=self.alert, user=user, next_reminder_at=self.now + delay)
+            for user, delay in zip(self.users, (timedelta(seconds=30), timedelta(seconds=90)))
+        )
+        self.scheduler = ReminderScheduler(horizon=timedelta(minutes=10), poll_interval=300)
+
+    def at(self, moment):
+        """Run the scheduler's clock at ``moment``."""
+        return mock.patch("notifications.scheduler.timezone", mock.Mock(now=lambda: moment))
+
+    def test_reloads_when_the_change_counter_moves_or_the_horizon_ends(self):
+        with self.at(self.now):
+            self.assertTrue(self.scheduler.needs_reload())
+            self.scheduler.reload()
+            self.assertFalse(self.scheduler.needs_reload())
+            services.bump_change_counter(services.REMINDER_SCHEDULE_COUNTER)
+            self.assertTrue(self.scheduler.needs_reload())
+            self.scheduler.reload()
+        with self.at(self.now + timedelta(minutes=10)):
+            self.assertTrue(self.scheduler.needs_reload())
+
+    def test_wakes_at_the_earliest_due_time(self):
+        with self.at(self.now):
+            self.scheduler.reload()
+            self.assertEqual(self.scheduler.seconds_until_next(), 30)
+            self.assertEqual(self.scheduler.run_pending(), 0)
+        with self.at(self.now + timedelta(seconds=31)):
+            self.assertEqual(self.scheduler.run_pending(), 1)
+            self.assertEqual(self.scheduler.seconds_until_next(), 59)
+        self.soon.refresh_from_db()
+        self.later.refresh_from_db()
+        self.assertEqual((self.soon.reminder_count, self.later.reminder_count), (1, 0))
+
+    def test_each_loop_flushes_deferred_sends_and_sweeps(self):
+        steps = mock.Mock()
+        steps.flush_deferred.return_value = services.DispatchResult()
+        names = ["rebuild_stale", "flush_deferred", "sweep_expired", "sweep_expired_snoozes"]
+        for name in names:
+            patcher = mock.patch(f"notifications.scheduler.{name}", getattr(steps, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        waits = []
+
+        def wait(seconds):
+            waits.append(seconds)
+            if len(waits) == 2:
+                self.scheduler.stop()
+
+        with mock.patch.object(self.scheduler._stop, "wait", side_effect=wait):
+            self.scheduler.run()
+        self.assertEqual([name for name, *_ in steps.mock_calls], names * 2)
+        # Reminders were due in 30 seconds, sooner than the poll interval
+        self.assertEqual(len(waits), 2)
+        self.assertLessEqual(waits[0], 30)
+
+    def test_sigterm_stops_the_command_cleanly(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+
+        def terminate(*args):
+            os.kill(os.getpid(), signal.SIGTERM)
+            return services.DispatchResult()
+
+        out = io.StringIO()
+        with mock.patch("notifications.scheduler.flush_deferred", side_effect=terminate):
+            call_command("run_scheduler", stdout=out)
+        self.assertIn("Stopping scheduler...", out.getvalue())
+        self.assertTrue(out.getvalue().rstrip().endswith("Reminder scheduler stopped"))
+
+
+class SnoozeTests(TestCase):
+    def test_duration_parsing(self):
+        for data, expected in [({"duration": "4h"}, "4h"), ({"duration": None}, None), ({}, "tomorrow")]:
+            with self.subTest(data=data):
+                serializer = SnoozeSerializer(data=data)
+                self.assertTrue(serializer.is_valid())
+                self.assertEqual(serializer.validated_data["duration"], expected)
+        self.assertFalse(SnoozeSerializer(data={"duration": "2d"}).is_valid())
+
+        user = User.objects.create(username="frank")
+        now = timezone.now()
+        self.assertEqual(services.snooze_until(user, services.SnoozeDuration.ONE_HOUR, now), now + timedelta(hours=1))
+        self.assertEqual(services.snooze_until(user, services.SnoozeDuration.FOUR_HOURS, now), now + timedelta(hours=4))
+
+    def test_tomorrow_is_midnight_in_the_users_time_zone(self):
+        # 20:00 UTC on March 10 is already 05:00 on March 11 in Tokyo
+        now = datetime(2026, 3, 10, 20, 0, tzinfo=dt_timezone.utc)
+        tokyo = User.objects.create(username="kenji", time_zone="Asia/Tokyo")
+        new_york = User.objects.create(username="nora", time_zone="America/New_York")
+        server = User.objects.create(username="sam")
+        tomorrow = services.SnoozeDuration.TOMORROW
+        self.assertEqual(services.snooze_until(tokyo, tomorrow, now), datetime(2026, 3, 11, 15, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(
+            services.snooze_until(new_york, tomorrow, now), datetime(2026, 3, 11, 4, 0, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(services.snooze_until(server, tomorrow, now), datetime(2026, 3, 11, 0, 0, tzinfo=dt_timezone.utc))
+
+    def test_manage_users_sets_time_zone(self):
+        self.client.force_login(User.objects.create(username="root", is_staff=True))
+        self.assertContains(self.client.get("/users/"), 'name="time_zone"')
+        self.client.post("/users/", {"username": "lena", "time_zone": "Europe/Berlin"})
+        self.assertEqual(User.objects.get(username="lena").time_zone, "Europe/Berlin")
+        response = self.client.post("/users/", {"username": "mo", "time_zone": "Mars/Olympus"})
+        self.assertContains(response, "Unknown time zone: Mars/Olympus")
+        self.assertFalse(User.objects.filter(username="mo").exists())
+
+
+class AudienceTests(TestCase):
+    def test_org_alert_audience_is_built_by_the_worker(self):
+        users = [User.objects.create(username=f"user{i}") for i in range(3)]
+        alert = Alert.objects.create(title="Org", message="Everyone")
+        alert.refresh_from_db()
+        self.assertTrue(alert.audience_stale)
+        self.assertFalse(AlertAudience.objects.filter(alert=alert).exists())
+
+        jobs.DeliveryWorker("w:1").run_once()
+        alert.refresh_from_db()
+        self.assertFalse(alert.audience_stale)
+        self.assertEqual(
+            sorted(AlertAudience.objects.filter(alert=alert).values_list("user_id", flat=True)), [u.pk for u in users]
+        )
+
+    def test_new_users_only_join_live_alerts(self):
+        now = timezone.now()
+        live = Alert.objects.create(title="Live", message="Still on")
+        archived = Alert.objects.create(title="Old", message="Done", archived=True)
+        expired = Alert.objects.create(title="Gone", message="Over", expires_at=now - timedelta(minutes=1))
+        unread.sweep_expired(now)
+        audience.rebuild_stale()
+
+        user = User.objects.create(username="newbie")
+        self.assertEqual(list(AlertAudience.objects.filter(user=user).values_list("alert_id", flat=True)), [live.pk])
+
+        # Reviving an alert queues a rebuild that picks up users created meanwhile
+        archived.archived = False
+        archived.save()
+        self.assertEqual(audience.rebuild_stale(), 1)
+        self.assertTrue(AlertAudience.objects.filter(user=user, alert=archived).exists())
+        self.assertFalse(AlertAudience.objects.filter(user=user, alert=expired).exists())
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="hana")
+        self.expiring = Alert.objects.create(
+            title="Expiring", message="Soon over", expires_at=timezone.now() + timedelta(hours=1)
+        )
+        self.alerts = [self.expiring] + [Alert.objects.create(title=f"Alert {i}", message="Body") for i in range(3)]
+        audience.rebuild_stale()
+        self.client.force_login(self.user)
+        self.client.get("/api/my-alerts/")
+        self.assertEqual(self.badge(), 4)  # creates the counter row
+        self.prefs = {pref.alert_id: pref for pref in UserAlertPreference.objects.filter(user=self.user)}
+
+    def badge(self) -> int:
+        return self.client.get("/api/my-alerts/unread-count/").json()["unread"]
+
+    def assertCounted(self, expected: int):
+        """The incremental count matches both ``expected`` and a recount from preferences."""
+        self.assertEqual(self.badge(), expected)
+        self.assertEqual(unread.count_for(self.user, unread.expiry_watermark()), expected)
+        self.assertEqual(unread.reconcile(), 0)
+
+    def post(self, url, data):
+        return self.client.post(url, data, content_type="application/json")
+
+    def test_mark_read_and_unread(self):
+        pref = self.prefs[self.alerts[1].pk]
+        self.post(f"/api/my-alerts/{pref.pk}/read/", {"is_read": True})
+        self.assertCounted(3)
+        self.post(f"/api/my-alerts/{pref.pk}/read/", {"is_read": True})  # no change, no double count
+        self.assertCounted(3)
+        self.post(f"/api/my-alerts/{pref.pk}/read/", {"is_read": False})
+        self.assertCounted(4)
+
+    def test_snooze_keeps_the_alert_unread(self):
+        pref = self.prefs[self.alerts[1].pk]
+        self.post(f"/api/my-alerts/{pref.pk}/snooze/", {"duration": "1h"})
+        self.assertCounted(4)
+        self.post("/api/my-alerts/bulk/", {"action": "snooze", "filter": {}})
+        self.assertCounted(4)
+
+    def test_bulk_read_and_unread(self):
+        ids = [self.prefs[alert.pk].pk for alert in self.alerts[1:3]]
+        self.assertEqual(self.post("/api/my-alerts/bulk/", {"action": "read", "ids": ids}).json()["updated"], 2)
+        self.assertCounted(2)
+        self.assertEqual(self.post("/api/my-alerts/bulk/", {"action": "read", "filter": {}}).json()["updated"], 2)
+        self.assertCounted(0)
+        self.post("/api/my-alerts/bulk/", {"action": "unread", "filter": {}})
+        self.assertCounted(4)
+
+    def test_expiry_is_counted_once_by_the_sweep(self):
+        later = self.expiring.expires_at + timedelta(minutes=1)
+        self.assertEqual(unread.sweep_expired(later), 1)
+        self.assertCounted(3)
+        self.assertEqual(unread.sweep_expired(later + timedelta(minutes=1)), 0)
+        self.assertCounted(3)
+        # Reading an expired alert does not move the count again
+        self.post(f"/api/my-alerts/{self.prefs[self.expiring.pk].pk}/read/", {"is_read": True})
+        self.assertCounted(3)
+
+    def test_archive_and_delete(self):
+        self.alerts[1].archived = True
+        self.alerts[1].save()
+        self.assertCounted(3)
+        self.alerts[1].archived = False
+        self.alerts[1].save()
+        self.assertCounted(4)
+        self.alerts[2].delete()
+        self.assertCounted(3)
+
+    def test_audience_removal_keeps_count_in_step(self):
+        direct = Alert.objects.create(title="Direct", message="Just you", visibility=Alert.VISIBILITY_USER)
+        direct.target_users.add(self.user)
+        audience.rebuild_stale()
+        self.client.get("/api/my-alerts/")
+        self.assertCounted(5)
+        direct.target_users.remove(self.user)
+        audience.rebuild_stale()
+        self.assertFalse(AlertAudience.objects.filter(alert=direct, user=self.user).exists())
+        # A preference already listed stays in the user's list, and so in the count
+        self.assertCounted(5)
+
+    def test_ensure_preferences_counts_only_rows_it_inserted(self):
+        fresh = [Alert.objects.create(title=f"Fresh {i}", message="Body") for i in range(2)]
+        ids = [alert.pk for alert in self.alerts + fresh]
+        with self.assertNumQueries(1):
+            self.assertEqual(services.ensure_preferences(self.user, ids[:4]), 0)
+
+        def concurrent_insert(rows, stamp):
+            # Another request lists fresh[0] between our lookup and our INSERT
+            UserAlertPreference.objects.create(user=self.user, alert=fresh[0])
+            unread.adjust([self.user.pk], 1)
+            stats.preferences_created([fresh[0].pk])
+            return insert_preferences(rows, stamp)
+
+        insert_preferences = services.insert_preferences
+        with mock.patch.object(services, "insert_preferences", concurrent_insert):
+            self.assertEqual(services.ensure_preferences(self.user, ids), 1)
+        self.assertCounted(6)
+        self.assertEqual(stats.reconcile(), 0)
+        self.assertEqual([AlertFunnel.objects.get(alert=alert).seen for alert in fresh], [0, 1])
+
+        # The other writer's row is marked seen on the next listing
+        self.assertEqual(services.ensure_preferences(self.user, ids), 0)
+        self.assertEqual([AlertFunnel.objects.get(alert=alert).seen for alert in fresh], [1, 1])
+        self.assertFalse(UserAlertPreference.objects.filter(user=self.user, seen_at__isnull=True).exists())
+
+
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        self.user, self.other = User.objects.create(username="ivan"), User.objects.create(username="jo")
+        self.alerts = [
+            Alert.objects.create(title=f"Alert {i}", message="Body", severity=severity)
+            for i, severity in enumerate([Alert.Severity.INFO, Alert.Severity.INFO, Alert.Severity.CRITICAL])
+        ]
+        audience.rebuild_stale()
+        self.client.force_login(self.user)
+
+    def bulk(self, data, status=200):
+        response = self.client.post("/api/my-alerts/bulk/", data, content_type="application/json")
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def stats(self, alert) -> tuple[int, int, int]:
+        stats = AlertStats.objects.get(alert=alert)
+        return stats.preferences, stats.read, stats.snoozed
+
+    def test_filter_covers_alerts_never_listed(self):
+        self.assertEqual(unread.unread_count(self.user), 0)  # counter row exists before any preference
+        self.assertEqual(self.bulk({"action": "read", "filter": {"is_read": False}}), {"action": "read", "updated": 3})
+        self.assertEqual(UserAlertPreference.objects.filter(user=self.user, is_read=True).count(), 3)
+        self.assertEqual(unread.unread_count(self.user), 0)
+        self.assertEqual([self.stats(alert) for alert in self.alerts], [(1, 1, 0)] * 3)
+        self.assertEqual([AlertFunnel.objects.get(alert=alert).read for alert in self.alerts], [1, 1, 1])
+        # Nothing left unread: a repeat changes nothing
+        self.assertEqual(self.bulk({"action": "read", "filter": {"is_read": False}})["updated"], 0)
+
+    def test_filter_by_severity(self):
+        self.assertEqual(self.bulk({"action": "read", "filter": {"severity": "critical"}})["updated"], 1)
+        self.assertEqual(unread.unread_count(self.user), 2)
+        self.assertEqual(self.stats(self.alerts[2]), (1, 1, 0))
+        self.assertEqual(self.stats(self.alerts[0]), (1, 0, 0))
+
+    def test_ids_of_another_user_are_ignored(self):
+        self.client.get("/api/my-alerts/")
+        self.client.force_login(self.other)
+        self.client.get("/api/my-alerts/")
+        theirs = list(UserAlertPreference.objects.filter(user=self.other).values_list("pk", flat=True))
+        mine = UserAlertPreference.objects.get(user=self.user, alert=self.alerts[0]).pk
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.bulk({"action": "read", "ids": theirs + [mine]})["updated"], 1)
+        self.assertFalse(UserAlertPreference.objects.filter(user=self.other, is_read=True).exists())
+        self.assertEqual(unread.unread_count(self.other), 3)
+        self.assertEqual(unread.unread_count(self.user), 2)
+        self.assertEqual(self.stats(self.alerts[0]), (2, 1, 0))
+
+    def test_snooze_and_unsnooze(self):
+        self.assertEqual(self.bulk({"action": "snooze", "filter": {}, "duration": "1h"})["updated"], 3)
+        self.assertEqual([self.stats(alert) for alert in self.alerts], [(1, 0, 1)] * 3)
+        self.client.force_login(User.objects.create(username="root", is_staff=True))
+        listed = self.client.get("/api/alerts/").json()["results"]
+        self.assertEqual([row["num_snoozed_today"] for row in listed], [1, 1, 1])
+        self.client.force_login(self.user)
+        self.assertEqual(unread.unread_count(self.user), 3)
+        self.assertEqual(self.bulk({"action": "unsnooze", "filter": {}})["updated"], 3)
+        self.assertEqual([self.stats(alert) for alert in self.alerts], [(1, 0, 0)] * 3)
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_rejects_both_or_neither_selector(self):
+        self.bulk({"action": "read"}, status=400)
+        self.bulk({"action": "read", "ids": [1], "filter": {}}, status=400)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(username="ada", is_staff=True)
+        self.client.force_login(self.staff)
+        self.now = datetime(2026, 3, 10, 12, 30, tzinfo=dt_timezone.utc)
+        events = Counter({(analytics.DELIVERY, "info", "email", "sent"): 2})
+        events[(analytics.DELIVERY, "critical", "sms", "sent")] += 1
+        analytics.record(events, at=self.now - timedelta(hours=1))
+        analytics.record(analytics.event(analytics.DELIVERY, "info", "email", "failed"), at=self.now)
+        analytics.record(analytics.event(analytics.DELIVERY, "info", "email", "sent"), at=self.now - timedelta(days=1))
+
+    def series(self, status=200, **params):
+        response = self.client.get("/api/analytics/timeseries/", params)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_hour_buckets(self):
+        response = self.series(bucket="hour", start="2026-03-10T00:00:00Z", end=self.now.isoformat())
+        self.assertEqual(
+            [(row["bucket"], row["count"]) for row in response.data["results"]],
+            [
+                (datetime(2026, 3, 10, 11, tzinfo=dt_timezone.utc), 3),
+                (datetime(2026, 3, 10, 12, tzinfo=dt_timezone.utc), 1),
+            ],
+        )
+
+    def test_day_buckets_grouped_by_severity(self):
+        end = self.now.isoformat()
+        response = self.series(bucket="day", start="2026-03-09T06:00:00Z", end=end, group_by="severity")
+        self.assertEqual(
+            [(row["bucket"].day, row["severity"], row["count"]) for row in response.data["results"]],
+            [(9, "info", 1), (10, "critical", 1), (10, "info", 3)],
+        )
+        self.assertEqual(analytics.day_total(analytics.DELIVERY, self.now), 4)
+
+    def test_query_validation(self):
+        start, end = "2026-03-01T00:00:00Z", self.now.isoformat()
+        self.assertIn("group_by", self.series(400, start=start, end=end, group_by="severity,colour").json())
+        self.series(400, start=end, end=end)
+        self.series(400, bucket="hour", start="2026-01-01T00:00:00Z", end=end)  # over 31 days of hours
+        self.series(200, bucket="day", start="2026-01-01T00:00:00Z", end=end)
+        self.series(400, metric="clicks")
+
+    def test_staff_only(self):
+        self.client.force_login(User.objects.create(username="bob"))
+        self.series(403)
+
+    def test_summary_keeps_snoozed_today(self):
+        user = User.objects.create(username="bob")
+        alert = Alert.objects.create(title="Heads up", message="Body")
+        audience.rebuild_stale()
+        self.client.force_login(user)
+        pref = self.client.get("/api/my-alerts/").json()["results"][0]
+        self.client.post(f"/api/my-alerts/{pref['id']}/snooze/", {"duration": "1h"}, content_type="application/json")
+        # A snooze recorded yesterday is not counted for today
+        analytics.record(analytics.event(analytics.SNOOZE, alert.severity), at=timezone.now() - timedelta(days=1))
+
+        response = self.client.get("/api/analytics/")  # open to any signed-in user
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["snoozed_today"], response.json()["snoozed"]), (1, 1))
+
+
+class StaleAudienceVisibilityTests(TestCase):
+    """New and retargeted alerts are visible to the right users before any worker run."""
+
+    def setUp(self):
+        self.red, self.blue = Team.objects.create(name="red"), Team.objects.create(name="blue")
+        self.rae = User.objects.create(username="rae", team=self.red)
+        self.bo = User.objects.create(username="bo", team=self.blue)
+        self.solo = User.objects.create(username="solo")
+
+    def visible_to(self, alert) -> list[str]:
+        return [user.username for user in (self.rae, self.bo, self.solo) if alert.pk in visible_alert_ids(user)]
+
+    def test_new_alert_is_visible_at_once(self):
+        alert = Alert.objects.create(title="Org", message="Everyone")
+        self.assertFalse(AlertAudience.objects.filter(alert=alert).exists())
+        self.assertEqual(self.visible_to(alert), ["rae", "bo", "solo"])
+
+        self.client.force_login(self.solo)
+        rows = self.client.get("/api/my-alerts/").json()["results"]
+        self.assertEqual([row["alert"]["id"] for row in rows], [alert.pk])
+        self.assertEqual(self.client.get("/api/my-alerts/unread-count/").json(), {"unread": 1})
+
+    def test_retargeting_applies_before_the_rebuild(self):
+        alert = Alert.objects.create(title="Team", message="Red only", visibility=Alert.VISIBILITY_TEAM)
+        alert.target_teams.add(self.red)
+        self.assertEqual(self.visible_to(alert), ["rae"])
+        audience.rebuild_stale()
+
+        # The old team's audience rows are still there, but no longer count
+        alert.target_teams.set([self.blue])
+        self.assertTrue(AlertAudience.objects.filter(alert=alert, user=self.rae).exists())
+        self.assertEqual(self.visible_to(alert), ["bo"])
+
+        alert.visibility = Alert.VISIBILITY_USER
+        alert.save()
+        alert.target_users.add(self.solo)
+        self.assertEqual(self.visible_to(alert), ["solo"])
+        audience.rebuild_stale()
+        rows = AlertAudience.objects.filter(alert=alert)
+        self.assertEqual(list(rows.values_list("user_id", flat=True)), [self.solo.pk])
+        self.assertEqual(self.visible_to(alert), ["solo"])
+
+    def test_reminder_command_rebuilds_stale_audiences(self):
+        alert = Alert.objects.create(title="Org", message="Everyone")
+        call_command("trigger_reminders", stdout=io.StringIO())
+        alert.refresh_from_db()
+        self.assertFalse(alert.audience_stale)
+        self.assertEqual(AlertAudience.objects.filter(alert=alert).count(), 3)
+
+
+class VisibilityCacheTests(TestCase):
+    """Cached visible-alert sets are dropped by every change that can alter them."""
+
+    def setUp(self):
+        cache.clear()
+        self.red, self.blue = Team.objects.create(name="red"), Team.objects.create(name="blue")
+        self.rae = User.objects.create(username="rae", team=self.red)
+        self.red_alert = Alert.objects.create(title="Red", message="Red only", visibility=Alert.VISIBILITY_TEAM)
+        self.red_alert.target_teams.add(self.red)
+        self.blue_alert = Alert.objects.create(title="Blue", message="Blue only", visibility=Alert.VISIBILITY_TEAM)
+        self.blue_alert.target_teams.add(self.blue)
+        audience.rebuild_stale()
+
+    def windows(self) -> dict[int, datetime | None]:
+        return {alert_id: expires_at for alert_id, _, expires_at in visible_alert_windows(self.rae)}
+
+    def test_warm_read_is_one_query(self):
+        self.assertEqual(list(self.windows()), [self.red_alert.pk])
+        with self.assertNumQueries(1):  # the alert version
+            self.assertEqual(list(self.windows()), [self.red_alert.pk])
+
+    def test_alert_edit(self):
+        self.windows()
+        expires_at = timezone.now() + timedelta(hours=1)
+        self.red_alert.expires_at = expires_at
+        self.red_alert.save()
+        self.assertEqual(self.windows(), {self.red_alert.pk: expires_at})
+        self.red_alert.delete()
+        self.assertEqual(self.windows(), {})
+
+    def test_retargeting(self):
+        self.windows()
+        self.blue_alert.target_teams.add(self.red)
+        self.assertEqual(sorted(self.windows()), [self.red_alert.pk, self.blue_alert.pk])
+        self.red.alerts.remove(self.red_alert)  # from the team side
+        self.assertEqual(list(self.windows()), [self.blue_alert.pk])
+
+    def test_team_move(self):
+        self.windows()
+        self.rae.team = self.blue
+        self.rae.save()
+        self.assertEqual(list(self.windows()), [self.blue_alert.pk])
+
+    def test_audience_rebuild(self):
+        self.windows()
+        self.red_alert.visibility = Alert.VISIBILITY_ORG
+        self.red_alert.save()
+        self.windows()
+        with self.assertNumQueries(2):  # still warm: one version read, one cache hit
+            self.windows()
+            self.windows()
+        audience.rebuild_stale()
+        with self.assertNumQueries(2):  # the version moved: one version read and one recomputation
+            self.assertEqual(list(self.windows()), [self.red_alert.pk])
+
+
+class MyAlertsListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="gina")
+        self.alerts = [Alert.objects.create(title=f"Alert {i}", message="Body") for i in range(7)]
+        audience.rebuild_stale()
+        self.client.force_login(self.user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            page = self.client.get(url).json()
+            ids += [row["id"] for row in page["results"]]
+            url = page["next"]
+        return ids
+
+    def test_same_timestamp_batch_pages_across_boundaries(self):
+        self.client.get("/api/my-alerts/")  # creates the preferences
+        response = self.client.post(
+            "/api/my-alerts/bulk/", {"action": "read", "filter": {}}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["updated"], 7)
+        prefs = UserAlertPreference.objects.filter(user=self.user)
+        self.assertEqual(prefs.values("updated_at").distinct().count(), 1)
+
+        first = self.client.get("/api/my-alerts/?page_size=3").json()
+        self.assertEqual([row["id"] for row in first["results"]], sorted(prefs.values_list("pk", flat=True))[:3])
+        # A row already served leaves the tied batch between polls: the next page still starts right
+        # after the cursor, and the changed row comes round again at the end
+        pks = sorted(prefs.values_list("pk", flat=True))
+        self.client.post(f"/api/my-alerts/{pks[0]}/read/", {"is_read": False}, content_type="application/json")
+        self.assertEqual(self.walk(first["next"]), pks[3:] + [pks[0]])
+
+    def test_etag_answers_304_until_data_changes(self):
+        response = self.client.get("/api/my-alerts/")
+        etag = response["ETag"]
+        self.assertEqual(self.client.get("/api/my-alerts/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        pref = UserAlertPreference.objects.filter(user=self.user).first()
+        self.client.post(f"/api/my-alerts/{pref.pk}/read/", {"is_read": True}, content_type="application/json")
+        changed = self.client.get("/api/my-alerts/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(self.client.get("/api/my-alerts/", HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 304)
+
+
+class RevisionTests(TestCase):
+    def test_identical_messages_share_a_revision(self):
+        alert = Alert.objects.create(title="Deploy", message="v6 is out")
+        first = alert.current_revision
+        alert.save()
+        alert.title = "Deploy done"
+        alert.save()
+        self.assertEqual(list(AlertRevision.objects.filter(alert=alert)), [first])
+
+        alert.message = "v6.1 is out"
+        alert.save()
+        self.assertNotEqual(alert.current_revision, first)
+        alert.message = "v6 is out"  # reverting reuses the original revision
+        alert.save()
+        alert.refresh_from_db()
+        self.assertEqual(alert.current_revision, first)
+        self.assertEqual(AlertRevision.objects.filter(alert=alert).count(), 2)
+        self.assertEqual(revisions.record(alert), first)
+        self.assertEqual(AlertRevision.objects.filter(alert=alert).count(), 2)
+
+
+class RevisionBackfillTests(TransactionTestCase):
+    """Migration 0023 turns delivery message snapshots into revisions before 0024 drops them."""
+
+    before = [("notifications", "0022_alert_revisions")]
+    after = [("notifications", "0023_backfill_alert_revisions")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_snapshots_become_revisions(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        user = apps.get_model("notifications", "User").objects.create(username="vic")
+        Alert = apps.get_model("notifications", "Alert")
+        alert = Alert.objects.create(title="Deploy", message="v7.1 is out")
+        quiet = Alert.objects.create(title="Quiet", message="Never sent")
+        Delivery = apps.get_model("notifications", "NotificationDelivery")
+        for snapshot in ["v7 is out", "v7 is out", "v7.1 is out"]:
+            Delivery.objects.create(alert=alert, user=user, channel="in_app", status="sent", message_snapshot=snapshot)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Alert = apps.get_model("notifications", "Alert")
+        Revision = apps.get_model("notifications", "AlertRevision")
+        messages = Revision.objects.filter(alert_id=alert.pk).values_list("message", flat=True)
+        self.assertEqual(sorted(messages), ["v7 is out", "v7.1 is out"])
+        self.assertEqual(Alert.objects.get(pk=alert.pk).current_revision.message, "v7.1 is out")
+        self.assertEqual(Alert.objects.get(pk=quiet.pk).current_revision.message, "Never sent")
+        deliveries = apps.get_model("notifications", "NotificationDelivery").objects.order_by("pk")
+        self.assertEqual(
+            [(row.message_snapshot, row.revision.message) for row in deliveries],
+            [("v7 is out", "v7 is out"), ("v7 is out", "v7 is out"), ("v7.1 is out", "v7.1 is out")],
+        )
+        self.assertEqual(
+            [revision.digest for revision in Revision.objects.filter(alert_id=alert.pk).order_by("message")],
+            [revisions.message_digest("v7 is out"), revisions.message_digest("v7.1 is out")],
+        )
+
+
+class FunnelTests(TestCase):
+    def test_percentile_interpolates_inside_buckets(self):
+        histogram = [0] * (len(funnel.LATENCY_BOUNDS) + 1)
+        self.assertIsNone(funnel.percentile(histogram, 50))
+        histogram[0] = 10  # ten reads within the first minute
+        self.assertEqual(funnel.percentile(histogram, 50), 30)
+        histogram[0], histogram[2] = 2, 2  # plus two between 5 and 15 minutes
+        self.assertEqual(funnel.percentile(histogram, 50), 60)
+        self.assertAlmostEqual(funnel.percentile(histogram, 90), 300 + 600 * 0.8)
+        # The open-ended last bucket reports its lower bound
+        self.assertEqual(funnel.percentile([0] * len(funnel.LATENCY_BOUNDS) + [3], 99), funnel.LATENCY_BOUNDS[-1])
+        self.assertEqual([funnel.bucket_for(s) for s in (0, 60, 61, 604800, 604801)], [0, 0, 1, 10, 11])
+
+    def test_endpoint(self):
+        users = [User.objects.create(username=f"user{i}") for i in range(4)]
+        alert = Alert.objects.create(title="Deploy", message="v5 is out")
+        deliver_alert(alert)
+        prefs = UserAlertPreference.objects.filter(alert=alert).order_by("user_id")
+        for pref, seconds in zip(prefs, (30, 120, 600)):
+            with mock.patch("django.utils.timezone.now", return_value=pref.delivered_at + timedelta(seconds=seconds)):
+                services.mark_read(pref, True)
+
+        self.client.force_login(users[0])
+        self.assertEqual(self.client.get(f"/api/alerts/{alert.pk}/funnel/").status_code, 403)
+        self.client.force_login(User.objects.create(username="root", is_staff=True))
+        self.assertEqual(self.client.get("/api/alerts/999999/funnel/").status_code, 404)
+        data = self.client.get(f"/api/alerts/{alert.pk}/funnel/").json()
+        self.assertEqual((data["delivered"], data["read"], data["read_rate"]), (4, 3, 0.75))
+        latency = data["time_to_read"]
+        self.assertEqual([bucket["count"] for bucket in latency["histogram"][:4]], [1, 1, 1, 0])
+        self.assertEqual(latency["histogram"][-1], {"le_seconds": None, "count": 0})
+        self.assertEqual(latency["p50_seconds"], 60 + 240 * 0.5)
+        self.assertAlmostEqual(latency["p90_seconds"], 300 + 600 * 0.7)
+        self.assertEqual(funnel.reconcile(), 0)
+
+
+class AlertStatusFilterTests(TestCase):
+    """``?status=`` on the admin list agrees with ``Alert.is_active_now`` at the window edges."""
+
+    def setUp(self):
+        self.now = timezone.now() + timedelta(minutes=5)
+        tick = timedelta(microseconds=1)
+        self.alerts = {
+            "open": Alert.objects.create(title="open", message="No window"),
+            "starts_now": Alert.objects.create(title="starts_now", message="Edge", start_at=self.now),
+            "starts_later": Alert.objects.create(title="starts_later", message="Edge", start_at=self.now + tick),
+            "expires_now": Alert.objects.create(title="expires_now", message="Edge", expires_at=self.now),
+            "expires_later": Alert.objects.create(title="expires_later", message="Edge", expires_at=self.now + tick),
+            "archived": Alert.objects.create(title="archived", message="Edge", archived=True),
+        }
+        self.staff = User.objects.create(username="root", is_staff=True)
+        self.client.force_login(self.staff)
+
+    def titles(self, status: str) -> list[str]:
+        with mock.patch("django.utils.timezone.now", return_value=self.now):
+            rows = self.client.get(f"/api/alerts/?status={status}&page_size=50").json()["results"]
+        for row in rows:
+            self.assertEqual(row["is_active_now"], status == "active")
+        return sorted(row["title"] for row in rows)
+
+    def test_status_matches_is_active_now(self):
+        with mock.patch("django.utils.timezone.now", return_value=self.now):
+            active = sorted(name for name, alert in self.alerts.items() if alert.is_active_now)
+        self.assertEqual(active, ["expires_later", "open", "starts_now"])
+        self.assertEqual(self.titles("active"), active)
+        self.assertEqual(self.titles("expired"), sorted(set(self.alerts) - set(active)))
+
+    def test_counts_come_from_the_stats_rows(self):
+        alert = self.alerts["starts_now"]
+        users = [User.objects.create(username=f"user{i}") for i in range(3)]
+        services.ensure_preferences(users[0], [alert.pk])
+        services.ensure_preferences(users[1], [alert.pk])
+        services.mark_read(UserAlertPreference.objects.get(user=users[0]), True)
+        AlertStats.objects.filter(alert=self.alerts["archived"]).delete()  # no stats row: zeros, not nulls
+
+        counts = {
+            name: (alert.num_preferences, alert.num_read, alert.num_unread, alert.num_snoozed)
+            for name, alert in ((a.title, a) for a in stats.annotate_counts(Alert.objects.all()))
+        }
+        self.assertEqual(counts["starts_now"], (2, 1, 1, 0))
+        self.assertEqual(counts["archived"], (0, 0, 0, 0))
+        self.assertEqual(stats.reconcile(), 0)  # the counted rows already match a recount
+
+
+class PreferenceRowTests(TestCase):
+    """``PreferenceRowSerializer`` renders ``values()`` rows exactly as ``UserAlertPreferenceSerializer`` would."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="pia")
+        self.alert = Alert.objects.create(
+            title="Maintenance", message="Down at noon", expires_at=timezone.now() + timedelta(days=1)
+        )
+        audience.rebuild_stale()
+        self.client.force_login(self.user)
+        self.client.get("/api/my-alerts/")
+        self.pref = UserAlertPreference.objects.get(user=self.user)
+        self.client.post(f"/api/my-alerts/{self.pref.pk}/snooze/", {"duration": "4h"}, content_type="application/json")
+        self.pref.refresh_from_db()  # snoozed_until and next_reminder_at are set, so datetimes are compared too
+
+    def get(self, query="", status=200):
+        response = self.client.get(f"/api/my-alerts/{query}")
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def test_matches_the_model_serializer(self):
+        expected = json.loads(json.dumps(UserAlertPreferenceSerializer(self.pref).data))
+        self.assertIsNotNone(expected["snoozed_until"])
+        self.assertEqual(self.get()["results"], [expected])
+        self.assertEqual(self.get(f"{self.pref.pk}/"), expected)
+        with timezone.override("Asia/Tokyo"):
+            expected = json.loads(json.dumps(UserAlertPreferenceSerializer(self.pref).data))
+            serializer = PreferenceRowSerializer()
+            rows = serializer.many(UserAlertPreference.objects.filter(pk=self.pref.pk).values(*serializer.columns))
+        self.assertTrue(expected["snoozed_until"].endswith("+09:00"))
+        self.assertEqual(rows, [expected])
+
+    def test_sparse_fields(self):
+        self.assertEqual(
+            self.get("?fields=id,is_read,alert.title")["results"],
+            [{"id": self.pref.pk, "is_read": False, "alert": {"title": "Maintenance"}}],
+        )
+        # "alert" on its own expands to every alert field
+        row = self.get("?fields=id,alert")["results"][0]
+        self.assertEqual(list(row), ["id", "alert"])
+        self.assertEqual(row["alert"], self.get()["results"][0]["alert"])
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.get("?fields=id,colour", status=400), {"fields": ["Unknown field(s): colour"]})
+        self.get("?fields=alert.colour", status=400)
+        self.get(f"{self.pref.pk}/?fields=colour", status=400)
+
+    def test_summary_view_drops_the_message(self):
+        full, summary = self.get()["results"][0], self.get("?view=summary")["results"][0]
+        self.assertNotIn("message", summary["alert"])
+        del full["alert"]["message"]
+        self.assertEqual(summary, full)
+        rows = self.get("?view=summary&fields=alert.title,alert.message")["results"]
+        self.assertEqual(rows, [{"alert": {"title": "Maintenance"}}])
+
+
+class ReconcileTests(TestCase):
+    def test_command_repairs_each_table(self):
+        user = User.objects.create(username="erin")
+        alert = Alert.objects.create(title="Drift", message="Counts went wrong")
+        deliver_alert(alert)
+        unread.unread_count(user)
+        AlertStats.objects.update(preferences=7, read=3)
+        AlertFunnel.objects.update(delivered=0)
+        UserUnreadCounter.objects.update(unread=5)
+
+        for table in ("stats", "funnel", "unread"):
+            with self.subTest(table=table):
+                out = io.StringIO()
+                call_command("reconcile_counts", table, stdout=out)
+                self.assertIn("Corrected 1 ", out.getvalue())
+        alert_stats = AlertStats.objects.get(alert=alert)
+        self.assertEqual((alert_stats.preferences, alert_stats.read), (1, 0))
+        self.assertEqual(AlertFunnel.objects.get(alert=alert).delivered, 1)
+        self.assertEqual(unread.unread_count(user), 1)
+        self.assertEqual([module.reconcile() for module in (stats, funnel, unread)], [0, 0, 0])
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f"user{i}") for i in range(3)]
+        self.alert = Alert.objects.create(title="Deploy", message="v3 is rolling out")
+
+    def test_deliver_alert_leaves_a_job_running_under_a_live_lease(self):
+        job = services.enqueue_fanout(self.alert)
+        FanOutJob.objects.filter(pk=job.pk).update(status=FanOutJob.Status.RUNNING, claimed_by="other:1")
+        self.assertEqual(deliver_alert(self.alert), 0)
+        self.assertFalse(NotificationDelivery.objects.exists())
+
+        FanOutJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - jobs.JOB_LEASE - timedelta(seconds=1))
+        self.assertEqual(deliver_alert(self.alert, worker_id="here:2"), 3)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.claimed_by), (FanOutJob.Status.COMPLETED, "here:2"))
+
+    def test_fanout_skips_snoozed_users(self):
+        now = timezone.now()
+        UserAlertPreference.objects.bulk_create(
+            [
+                UserAlertPreference(alert=self.alert, user=self.users[0], snoozed_until=now + timedelta(hours=1)),
+                UserAlertPreference(alert=self.alert, user=self.users[1], snoozed_until=now - timedelta(hours=1)),
+            ]
+        )
+        recipients = services.prepare_batch(self.alert, [user.pk for user in self.users])
+        self.assertEqual([user.pk for user in recipients], [user.pk for user in self.users[1:]])
+        self.assertEqual(deliver_alert(self.alert), 2)
+        self.assertFalse(NotificationDelivery.objects.filter(user=self.users[0]).exists())
+
+    def test_interrupted_fanout_resumes_after_its_checkpoint(self):
+        more = [User.objects.create(username=f"extra{i}") for i in range(2)]
+        users = self.users + more
+        send_groups = services.send_groups
+        calls = []
+
+        def crash_on_second_batch(groups):
+            calls.append(groups)
+            if len(calls) == 2:
+                raise RuntimeError("worker killed")
+            return send_groups(groups)
+
+        job = services.enqueue_fanout(self.alert)
+        with mock.patch.object(services, "DELIVERY_BATCH_SIZE", 2), mock.patch.object(
+            services, "send_groups", side_effect=crash_on_second_batch
+        ), self.assertLogs("notifications.jobs", "ERROR"):
+            jobs.run_job(jobs.claim_next_job("w:1"))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.processed, job.last_user_id), (FanOutJob.Status.PENDING, 2, users[1].pk))
+            self.assertEqual(NotificationDelivery.objects.count(), 2)
+
+            FanOutJob.objects.filter(pk=job.pk).update(not_before=timezone.now())
+            jobs.run_job(jobs.claim_next_job("w:2"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.sent), (FanOutJob.Status.COMPLETED, 5, 5))
+        # Every user got exactly one delivery, across both attempts
+        self.assertEqual(
+            sorted(NotificationDelivery.objects.values_list("user_id", flat=True)), [user.pk for user in users]
+        )
+
+    def test_claim_succeeds_once(self):
+        job = services.enqueue_fanout(self.alert)
+        self.assertTrue(jobs.claim_job(job, "a:1"))
+        self.assertEqual((job.status, job.claimed_by), (FanOutJob.Status.RUNNING, "a:1"))
+        self.assertFalse(jobs.claim_job(FanOutJob.objects.get(pk=job.pk), "b:2"))
+        self.assertIsNone(jobs.claim_next_job("b:2"))
+        self.assertEqual(FanOutJob.objects.get(pk=job.pk).claimed_by, "a:1")
+
+    def test_expired_lease_is_reclaimed_and_resumed(self):
+        job = services.enqueue_fanout(self.alert)
+        self.assertTrue(jobs.claim_job(job, "a:1"))
+        # The first holder checkpointed one user, then stopped heartbeating
+        FanOutJob.objects.filter(pk=job.pk).update(
+            last_user_id=self.users[0].pk, processed=1, updated_at=timezone.now() - jobs.JOB_LEASE
+        )
+        reclaimed = jobs.claim_next_job("b:2")
+        self.assertEqual((reclaimed.pk, reclaimed.claimed_by, reclaimed.last_user_id), (job.pk, "b:2", self.users[0].pk))
+        jobs.run_job(reclaimed)
+        self.assertEqual(reclaimed.processed, 3)
+        self.assertEqual(NotificationDelivery.objects.count(), 2)
+
+    def test_failed_attempts_back_off_then_fail(self):
+        job = services.enqueue_fanout(self.alert)
+        with mock.patch.object(jobs, "MAX_JOB_ATTEMPTS", 3), mock.patch.object(
+            jobs, "run_fanout", side_effect=RuntimeError("gateway down")
+        ), self.assertLogs("notifications.jobs", "ERROR"):
+            for attempt in (1, 2):
+                before = timezone.now()
+                jobs.run_job(jobs.claim_next_job("w:1"))
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.attempts), (FanOutJob.Status.PENDING, attempt))
+                self.assertGreaterEqual(job.not_before, before + jobs.JOB_RETRY_BACKOFF * 2 ** (attempt - 1))
+                self.assertIsNone(jobs.claim_next_job("w:1"))
+                FanOutJob.objects.filter(pk=job.pk).update(not_before=timezone.now())
+            jobs.run_job(jobs.claim_next_job("w:1"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (FanOutJob.Status.FAILED, 3, "RuntimeError('gateway down')"))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(jobs.claim_next_job("w:1"))
+
+    def test_deliver_now_queues_one_job_for_admins_only(self):
+        url = f"/api/alerts/{self.alert.pk}/deliver_now/"
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.post(url).status_code, 403)
+        self.assertFalse(FanOutJob.objects.exists())
+
+        staff = User.objects.create(username="admin", is_staff=True)
+        self.client.force_login(staff)
+        first, second = self.client.post(url).json(), self.client.post(url).json()
+        # Nothing is sent in the request; an unfinished job is reused rather than queued twice
+        self.assertEqual(first["id"], second["id"])
+        self.assertEqual(FanOutJob.objects.get().requested_by, staff)
+        self.assertFalse(NotificationDelivery.objects.exists())
+
+        jobs.DeliveryWorker("w:1").run_once()
+        self.assertEqual(NotificationDelivery.objects.count(), 4)
+        self.assertNotEqual(self.client.post(url).json()["id"], first["id"])
+
+    def test_status_endpoint_reports_progress(self):
+        staff = User.objects.create(username="admin", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.post(f"/api/alerts/{self.alert.pk}/deliver_now/")
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+        self.assertEqual(self.client.get(status_url).json()["status"], "pending")
+
+        self.assertEqual(jobs.DeliveryWorker("w:1").run_once(), 1)
+        progress = self.client.get(status_url).json()
+        self.assertEqual(
+            {key: progress[key] for key in ("status", "processed", "sent", "failed", "attempts")},
+            {"status": "completed", "processed": 4, "sent": 4, "failed": 0, "attempts": 1},
+        )
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(status_url).status_code, 403)
+
+
+class QueryBudgetTests(TestCase):
+    """The benchmark cases run a bounded number of statements, however much data there is.
+
+    Each case is measured in its steady state (after one warm-up run) on two
+    generated datasets, the larger with 20 times the users, at the real
+    delivery batch size. A change that adds a query per row, alert or user
+    therefore shows up as a difference between the two; a case whose rows
+    take more batches at the larger size may grow only with its batch count,
+    and each extra batch must cost the same statements. Budgets are ceilings,
+    so a change that saves queries needs no edit here.
+    """
+
+    SCALES = [
+        Scale(users=10, teams=2, alerts=3, preferences=30),
+        Scale(users=200, teams=5, alerts=12, preferences=480),
+    ]
+    BUDGETS = {
+        "deliver_alert": 33,
+        "run_fanout": 22,
+        "trigger_reminders": 10,
+        "flush_deferred": 13,
+        "prune_deliveries": 9,
+        "my_alerts_list": 5,
+        "my_alert_detail": 3,
+        "unread_count": 1,
+        "mark_read": 11,
+        "snooze": 10,
+        "mark_all_read": 11,
+        "bulk_snooze": 10,
+        "dashboard": 6,
+        "analytics_view": 4,
+        "analytics_timeseries": 1,
+        "alerts_admin_list": 2,
+        "alert_funnel": 2,
+        "deliver_now": 3,
+        "job_status": 1,
+    }
+    # Tables that grow with users x alerts; reading them must go through an index
+    LARGE_TABLES = [
+        UserAlertPreference._meta.db_table,
+        NotificationDelivery._meta.db_table,
+        "notifications_alertaudience",
+    ]
+
+    @staticmethod
+    def statements(queries: list[str]) -> list[str]:
+        """``queries`` with each bulk insert counted once.
+
+        Django splits a ``bulk_create`` into consecutive INSERTs sized to the
+        database's parameter limit (999 on SQLite), so their number follows
+        the row count by design.
+        """
+        folded = []
+        for sql in queries:
+            if not (folded and sql.startswith("INSERT") and folded[-1].split("(", 1)[0] == sql.split("(", 1)[0]):
+                folded.append(sql)
+        return folded
+
+    def capture(self, scale: Scale) -> dict[str, tuple[list[str], int]]:
+        """The SQL each case runs and its delivery batches, read off the row count it returns."""
+        cache.clear()
+        measured = {}
+        with transaction.atomic():
+            generate(scale)
+            for case in default_cases():
+                case.setup()()
+                operation = case.setup()
+                with CaptureQueriesContext(connection) as captured:
+                    result = operation()
+                rows = result if type(result) is int else 0
+                batches = max(math.ceil(rows / services.DELIVERY_BATCH_SIZE), 1)
+                measured[case.name] = ([query["sql"] for query in captured], batches)
+            transaction.set_rollback(True)
+        return measured
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small, large = (self.capture(scale) for scale in self.SCALES)
+        self.assertEqual(set(small), set(self.BUDGETS))
+        for name, budget in self.BUDGETS.items():
+            (queries, batches), (large_queries, large_batches) = small[name], large[name]
+            count, large_count = len(self.statements(queries)), len(self.statements(large_queries))
+            with self.subTest(name, batches=(batches, large_batches)):
+                self.assertLessEqual(count, budget)
+                if large_batches == batches:
+                    self.assertEqual(large_count, count)
+                else:
+                    # More rows than one batch holds: at most a whole run per batch (the exact
+                    # per-batch cost is checked by test_each_batch_costs_the_same_statements)
+                    self.assertLessEqual(large_count, count * large_batches)
+
+    def test_each_batch_costs_the_same_statements(self):
+        """Fan-out and reminders over 1, 2 and 3 full batches grow by a fixed step per batch."""
+        batch = services.DELIVERY_BATCH_SIZE
+        deliver_alert(Alert.objects.create(title="Warm-up", message="Caches"))
+        fanout, reminders = [], []
+        for batches in (1, 2, 3):
+            missing = batches * batch - User.objects.count()
+            User.objects.bulk_create([User(username=f"batch{batches}-{i}") for i in range(missing)])
+            with CaptureQueriesContext(connection) as captured:
+                deliver_alert(Alert.objects.create(title=f"Fan-out {batches}", message="Everyone"))
+            fanout.append(len(self.statements([query["sql"] for query in captured])))
+
+            UserAlertPreference.objects.update(is_read=True, next_reminder_at=None)
+            alert = Alert.objects.create(title=f"Reminder {batches}", message="Still on", reminder_frequency_minutes=60)
+            audience.rebuild_stale()
+            due = timezone.now() - timedelta(minutes=1)
+            UserAlertPreference.objects.bulk_create(
+                [UserAlertPreference(alert=alert, user=user, next_reminder_at=due) for user in User.objects.all()]
+            )
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(services.trigger_reminders(), batches * batch)
+            reminders.append(len(self.statements([query["sql"] for query in captured])))
+
+        for name, counts in [("deliver_alert", fanout), ("trigger_reminders", reminders)]:
+            with self.subTest(name, counts=counts):
+                self.assertGreater(counts[1], counts[0])
+                self.assertEqual(counts[2] - counts[1], counts[1] - counts[0])
+
+    @skipUnless(connection.vendor == "sqlite", "asserts SQLite EXPLAIN QUERY PLAN output")
+    def test_query_plans_use_indexes(self):
+        now = timezone.now()
+        self.assertIn("USING INDEX pref_due_reminder_idx", services.due_reminders(now).explain())
+        self.assertIn(
+            "USING INDEX delivery_retention_idx", retention.expired_deliveries("in_app", "sent", now).explain()
+        )
+        self.assertIn(
+            "USING INDEX pref_user_updated_idx",
+            UserAlertPreference.objects.filter(user_id=1).order_by("updated_at", "id").explain(),
+        )
+        self.assertIn("USING INDEX deferred_due_idx", DeferredDelivery.objects.filter(not_before__lte=now).explain())
+
+        for name, (queries, _) in self.capture(self.SCALES[-1]).items():
+            for sql in queries:
+                if not sql.startswith("SELECT"):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                    full_scans = [
+                        detail for *_, detail in cursor.fetchall() if detail in (f"SCAN {t}" for t in self.LARGE_TABLES)
+                    ]
+                with self.subTest(name, sql=sql):
+                    self.assertEqual(full_scans, [])
@@ -0,0 +1,108 @@
+"""Maintenance of the per-user ``UserUnreadCounter`` badge counts.
+
+A preference counts while it is unread and its alert is live: not archived
+and not expired as of the expiry watermark. Measuring expiry against the
+watermark rather than the clock keeps every adjustment consistent, because
+an alert stops counting exactly once, when ``sweep_expired`` moves the
+watermark past its ``expires_at`` (or when an edit moves it behind).
+
+Adjustments are relative ``F()`` updates issued in the same transaction as
+the preference write. Users without a counter row are skipped; their row is
+computed from scratch on first read. Any drift from races (e.g. two
+processes inserting the same preference) is repaired by ``reconcile``.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, QuerySet
+from django.utils import timezone
+
+from .models import Alert, SweepWatermark, User, UserAlertPreference, UserUnreadCounter
+from .reconciliation import count_of, reconcile_columns
+
+EXPIRY_WATERMARK = "unread-expiry"
+
+
+def expiry_watermark() -> datetime:
+    return SweepWatermark.current(EXPIRY_WATERMARK)
+
+
+def is_live(alert: Alert, watermark: datetime) -> bool:
+    return not alert.archived and (alert.expires_at is None or alert.expires_at > watermark)
+
+
+def live_alerts(watermark: datetime) -> QuerySet[Alert]:
+    return Alert.objects.filter(archived=False).filter(Q(expires_at__isnull=True) | Q(expires_at__gt=watermark))
+
+
+def counted_preferences(watermark: datetime) -> QuerySet[UserAlertPreference]:
+    return UserAlertPreference.objects.filter(is_read=False, alert__in=live_alerts(watermark))
+
+
+def adjust(user_ids: Iterable[int] | QuerySet, delta: int) -> None:
+    if delta:
+        UserUnreadCounter.objects.filter(user__in=user_ids).update(
+            unread=F("unread") + delta, updated_at=timezone.now()
+        )
+
+
+def alert_unread_users(alert: Alert) -> QuerySet:
+    return UserAlertPreference.objects.filter(alert=alert, is_read=False).values("user_id")
+
+
+def read_state_changed(user_id: int, alerts: Iterable[Alert], is_read: bool) -> None:
+    """Call after the user's preferences for ``alerts`` have flipped to ``is_read``."""
+    watermark = expiry_watermark()
+    live = sum(1 for alert in alerts if is_live(alert, watermark))
+    adjust([user_id], -live if is_read else live)
+
+
+def alert_changed(alert: Alert, was_live: bool) -> None:
+    """Apply an archive/unarchive or ``expires_at`` edit to every unread recipient."""
+    now_live = is_live(alert, expiry_watermark())
+    if now_live != was_live:
+        adjust(alert_unread_users(alert), 1 if now_live else -1)
+
+
+def sweep_expired(now: datetime | None = None) -> int:
+    """Stop counting alerts that expired since the last sweep; returns how many did."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        watermark = expiry_watermark()
+        if now <= watermark:
+            return 0
+        expired = list(live_alerts(watermark).filter(expires_at__lte=now))
+        for alert in expired:
+            adjust(alert_unread_users(alert), -1)
+        # Expired alerts never remind again; clear their rows out of the due-time index
+        UserAlertPreference.objects.filter(alert__in=expired, next_reminder_at__isnull=False).update(
+            next_reminder_at=None, updated_at=now
+        )
+        SweepWatermark.objects.filter(name=EXPIRY_WATERMARK).update(swept_until=now)
+    return len(expired)
+
+
+def count_for(user: User, watermark: datetime) -> int:
+    return counted_preferences(watermark).filter(user=user).count()
+
+
+def unread_count(user: User) -> int:
+    """The user's badge count: a primary-key read once the counter row exists."""
+    unread = UserUnreadCounter.objects.filter(pk=user.pk).values_list("unread", flat=True).first()
+    if unread is None:
+        with transaction.atomic():
+            counter, _ = UserUnreadCounter.objects.get_or_create(
+                user=user, defaults={"unread": count_for(user, expiry_watermark())}
+            )
+        unread = counter.unread
+    return unread
+
+
+def reconcile() -> int:
+    """Recompute every existing counter in one UPDATE; returns how many were wrong."""
+    with transaction.atomic():
+        actual = count_of(counted_preferences(expiry_watermark()).filter(user=OuterRef("user_id")), "user_id")
+        return reconcile_columns(UserUnreadCounter, {"unread": actual}, updated_at=timezone.now())
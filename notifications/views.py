@@ -1,18 +1,34 @@
-from django.db.models import Count, Q
+import hashlib
+from datetime import datetime
+
+import django_filters
+from django.db.models import Count, Max, Q, Sum
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
-from .models import Alert, NotificationDelivery, UserAlertPreference
+from . import analytics, funnel, stats
+from .models import Alert, AlertStats, FanOutJob, UserAlertPreference
 from .serializers import (
     AlertSerializer,
     AlertAdminListSerializer,
+    BulkPreferenceSerializer,
+    FanOutJobSerializer,
     MarkReadSerializer,
+    PreferenceRowSerializer,
     SnoozeSerializer,
+    TimeseriesQuerySerializer,
     UserAlertPreferenceSerializer,
 )
-from .services import deliver_alert
+from .services import enqueue_fanout, ensure_preferences, mark_read, read_change_counter
+from .unread import unread_count
+from .visibility import ALERTS_VERSION_COUNTER, visible_alert_ids
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -35,59 +51,200 @@ class AlertViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         qs = super().get_queryset()
+        # Same conditions as Alert.is_active_now, evaluated in SQL
         status_param = self.request.query_params.get('status')
+        now = timezone.now()
         if status_param == 'active':
-            qs = [a for a in qs if a.is_active_now]
+            qs = qs.filter(archived=False, start_at__lte=now).filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
         elif status_param == 'expired':
-            qs = [a for a in qs if not a.is_active_now]
-        # annotate metrics for admin list
-        from django.db.models import Count, Q
-        from django.utils import timezone as tz
-        today = tz.localdate()
-        return (
-            Alert.objects.filter(id__in=[a.id for a in qs])
-            .annotate(
-                num_preferences=Count('user_preferences', distinct=True),
-                num_read=Count('user_preferences', filter=Q(user_preferences__is_read=True), distinct=True),
-                num_unread=Count('user_preferences', filter=Q(user_preferences__is_read=False), distinct=True),
-                num_snoozed_today=Count('user_preferences', filter=Q(user_preferences__snoozed_on=today), distinct=True),
-            )
-            .order_by('-created_at')
-        )
+            qs = qs.filter(Q(archived=True) | Q(start_at__gt=now) | Q(expires_at__lte=now))
+        # Metrics for the admin list come from the incrementally maintained stats rows
+        return stats.annotate_counts(qs)
 
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAdminUser])
     def deliver_now(self, request, pk=None):
+        # Fan-out runs in the delivery worker; poll the job for progress
         alert = self.get_object()
-        count = deliver_alert(alert)
-        return Response({"delivered": count})
+        job = enqueue_fanout(alert, requested_by=request.user)
+        data = FanOutJobSerializer(job).data
+        data["status_url"] = reverse("delivery-jobs-detail", args=[job.pk], request=request)
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def funnel(self, request, pk=None):
+        # Read straight from the funnel rows; no need to load the alert itself
+        try:
+            summary = funnel.summary(int(pk))
+        except ValueError:
+            summary = None
+        if summary is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(summary)
+
+
+class DeliveryJobViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = FanOutJob.objects.all().order_by("-created_at")
+    serializer_class = FanOutJobSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filterset_fields = ["alert", "status"]
+
+
+class MyAlertsPagination(CursorPagination):
+    """Keyset pagination on ``(updated_at, id)``, oldest change first.
+
+    DRF's cursor filters on the first ordering field only and skips past ties
+    with an offset capped at ``offset_cutoff``. Bulk updates stamp every row
+    they touch with one ``updated_at``, so here the position carries the id
+    too: every position is unique and each page is a range scan starting
+    right after the previous one, however many rows share a timestamp.
+    """
+
+    ordering = ("updated_at", "id")
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def _get_position_from_instance(self, instance, ordering):
+        if not isinstance(instance, dict):
+            instance = {"updated_at": instance.updated_at, "id": instance.pk}
+        return f"{instance['updated_at'].isoformat()}|{instance['id']}"
+
+    def parse_position(self, position: str) -> tuple[datetime, int]:
+        try:
+            updated_at, pk = position.rsplit("|", 1)
+            return datetime.fromisoformat(updated_at), int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # DRF's implementation, with the position filter replaced by a (updated_at, id) comparison
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        if reverse:
+            queryset = queryset.order_by(*[f"-{field}" for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            updated_at, pk = self.parse_position(current_position)
+            if reverse:
+                queryset = queryset.filter(updated_at__lte=updated_at).exclude(updated_at=updated_at, id__gte=pk)
+            else:
+                queryset = queryset.filter(updated_at__gte=updated_at).exclude(updated_at=updated_at, id__lte=pk)
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_following = len(results) > len(self.page)
+        following = self._get_position_from_instance(results[-1], self.ordering) if has_following else None
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following
+            self.next_position, self.previous_position = current_position, following
+        else:
+            self.has_next = has_following
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following, current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class MyAlertsFilter(django_filters.FilterSet):
+    updated_since = django_filters.IsoDateTimeFilter(field_name="updated_at", lookup_expr="gt")
+
+    class Meta:
+        model = UserAlertPreference
+        fields = ["is_read"]
 
 
 class MyAlertsViewSet(viewsets.ReadOnlyModelViewSet):
+    """The current user's alert preferences.
+
+    Reads accept ``?fields=id,is_read,alert.title`` (sparse fieldset) and
+    ``?view=summary`` (no message bodies). They are rendered from ``values()``
+    rows by ``PreferenceRowSerializer``; the response shape matches
+    ``UserAlertPreferenceSerializer``.
+
+    The list is cursor-paginated by ``(updated_at, id)`` and can be narrowed with
+    ``?updated_since=``. It carries an ETag built from the user's latest
+    preference change and the alert version, so an unchanged poll sent with
+    ``If-None-Match`` gets a 304 without any rows being read.
+    """
+
     serializer_class = UserAlertPreferenceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MyAlertsPagination
+    filterset_class = MyAlertsFilter
 
     def get_queryset(self):
         # Ensure preferences exist for visible, active alerts
         user = self.request.user
-        now = timezone.now()
-        visible = Alert.objects.filter(archived=False).filter(
-            Q(visibility=Alert.VISIBILITY_ORG)
-            | Q(visibility=Alert.VISIBILITY_TEAM, target_teams__in=[user.team_id] if user.team_id else [])
-            | Q(visibility=Alert.VISIBILITY_USER, target_users=user)
-        ).distinct()
-        visible = visible.filter(start_at__lte=now).filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
-        # Create missing prefs
-        for alert in visible:
-            UserAlertPreference.objects.get_or_create(alert=alert, user=user)
+        ensure_preferences(user, visible_alert_ids(user))
         return UserAlertPreference.objects.filter(user=user).select_related("alert")
 
+    def get_row_serializer(self) -> PreferenceRowSerializer:
+        fields = self.request.query_params.get("fields")
+        return PreferenceRowSerializer(
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            summary=self.request.query_params.get("view") == "summary",
+        )
+
+    def get_etag(self, queryset) -> str:
+        """Change token for ``queryset``: one aggregate over the (user, updated_at) index.
+
+        Row count catches deletions, the alert version catches edits to the
+        embedded alerts, and the query string keeps representations apart.
+        """
+        stats = queryset.aggregate(latest=Max("updated_at"), count=Count("id"))
+        token = "|".join(
+            [
+                str(read_change_counter(ALERTS_VERSION_COUNTER)),
+                str(stats["count"]),
+                stats["latest"].isoformat() if stats["latest"] else "",
+                self.request.META.get("QUERY_STRING", ""),
+            ]
+        )
+        return quote_etag(hashlib.md5(token.encode(), usedforsecurity=False).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_row_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = self.get_etag(queryset)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            # The cursor is positioned on (updated_at, id), so both are selected even if not rendered
+            columns = [*rows.columns, *(column for column in ("updated_at", "id") if column not in rows.columns)]
+            page = self.paginate_queryset(queryset.values(*columns))
+            if page is not None:
+                response = self.get_paginated_response(rows.many(page))
+            else:
+                response = Response(rows.many(queryset.values(*columns)))
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        rows = self.get_row_serializer()
+        queryset = self.filter_queryset(self.get_queryset()).values(*rows.columns)
+        return Response(rows.to_representation(get_object_or_404(queryset, pk=kwargs["pk"])))
+
+    @action(detail=False, methods=["get"], url_path="unread-count")
+    def unread_count(self, request):
+        # Badge polling: one primary-key read, no preference rows touched
+        return Response({"unread": unread_count(request.user)})
+
     @action(detail=True, methods=["post"], url_path="read")
     def mark_read(self, request, pk=None):
         pref = self.get_object()
         serializer = MarkReadSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        pref.is_read = serializer.validated_data["is_read"]
-        pref.save(update_fields=["is_read", "updated_at"])
+        mark_read(pref, serializer.validated_data["is_read"])
         return Response({"is_read": pref.is_read})
 
     @action(detail=True, methods=["post"], url_path="snooze")
@@ -95,29 +252,57 @@ class MyAlertsViewSet(viewsets.ReadOnlyModelViewSet):
         pref = self.get_object()
         serializer = SnoozeSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(preference=pref)
-        return Response({"snoozed_on": pref.snoozed_on})
+        serializer.save(preference=pref, user=request.user)
+        return Response({"snoozed_until": pref.snoozed_until})
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        serializer = BulkPreferenceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # As for listing, so a filter such as "all unread" also covers alerts never listed yet
+        ensure_preferences(request.user, visible_alert_ids(request.user))
+        updated = serializer.save(user=request.user)
+        return Response({"action": serializer.validated_data["action"], "updated": updated})
 
 
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
 def analytics_view(request):
-    total_alerts = Alert.objects.count()
-    deliveries = NotificationDelivery.objects.count()
-    read_count = UserAlertPreference.objects.filter(is_read=True).count()
-    snoozed_today = UserAlertPreference.objects.filter(snoozed_on=timezone.localdate()).count()
-    severity_breakdown = (
-        Alert.objects.values("severity").annotate(count=Count("id")).order_by()
-    )
+    # Small tables and rollups only; never counts deliveries or preferences row by row
+    severity_breakdown = list(Alert.objects.values("severity").annotate(count=Count("id")).order_by())
+    prefs = AlertStats.objects.aggregate(read=Sum("read"), snoozed=Sum("snoozed"))
+    deliveries = analytics.totals(analytics.DELIVERY, group_by=["status"])
     return Response(
         {
-            "total_alerts": total_alerts,
-            "deliveries": deliveries,
-            "read": read_count,
-            "snoozed_today": snoozed_today,
-            "severity_breakdown": list(severity_breakdown),
+            "total_alerts": sum(row["count"] for row in severity_breakdown),
+            "deliveries": sum(row["count"] for row in deliveries if row["status"] != "deferred"),
+            "read": prefs["read"] or 0,
+            # Snoozes started today (local time), as before; "snoozed" counts those still in effect
+            "snoozed_today": analytics.day_total(analytics.SNOOZE),
+            "snoozed": prefs["snoozed"] or 0,
+            "severity_breakdown": severity_breakdown,
         }
     )
 
 
-# Create your views here.
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def analytics_timeseries(request):
+    """Bucketed event counts from the rollup tables.
+
+    ``?metric=delivery|alert_created|read|unread|snooze&bucket=hour|day
+    &start=&end=&group_by=severity,channel,status``
+    """
+    params = TimeseriesQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    query = params.validated_data
+    series = analytics.timeseries(query["metric"], query["bucket"], query["start"], query["end"], query["group_by"])
+    return Response(
+        {
+            "metric": query["metric"],
+            "bucket": query["bucket"],
+            "start": query["start"],
+            "end": query["end"],
+            "results": series,
+        }
+    )
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q, QuerySet
+from django.utils import timezone
+
+from .models import Alert, AlertAudience, User
+from .services import read_change_counter
+
+# Bumped by signals whenever an alert or its targeting changes
+ALERTS_VERSION_COUNTER = "alerts"
+CACHE_TIMEOUT = getattr(settings, "NOTIFICATIONS_VISIBILITY_CACHE_SECONDS", 300)
+
+
+def targets(user_id, team_id) -> Q:
+    """Condition on ``Alert`` rows aimed at user ``user_id`` of team ``team_id``: the targeting rule.
+
+    Both arguments may be values or ``OuterRef``s, so the same rule selects a
+    user's alerts here and an alert's users in ``audience.targeted_users``.
+    """
+    teams = Alert.target_teams.through.objects.filter(alert_id=OuterRef("pk"), team_id=team_id)
+    users = Alert.target_users.through.objects.filter(alert_id=OuterRef("pk"), user_id=user_id)
+    return (
+        Q(visibility=Alert.VISIBILITY_ORG)
+        | Q(Exists(teams), visibility=Alert.VISIBILITY_TEAM)
+        | Q(Exists(users), visibility=Alert.VISIBILITY_USER)
+    )
+
+
+def visible_alerts_query(user: User) -> QuerySet[Alert]:
+    """Non-archived alerts targeted at ``user`` through the org, their team or directly.
+
+    Reads the materialized audience, a lookup on its ``(alert, user)`` unique
+    index per alert. Alerts whose audience is stale (new or retargeted, and
+    not yet rebuilt by the worker) are matched with the targeting rule
+    instead, so they are visible to exactly the right users straight away.
+    """
+    built = AlertAudience.objects.filter(alert=OuterRef("pk"), user=user)
+    return Alert.objects.filter(archived=False).filter(
+        Q(Exists(built), audience_stale=False) | Q(targets(user.pk, user.team_id), audience_stale=True)
+    )
+
+
+def visible_alert_windows(user: User) -> list[tuple[int, datetime, datetime | None]]:
+    """``(id, start_at, expires_at)`` of every alert visible to ``user``, cached.
+
+    The cache key carries the global alert version and the user's team, so
+    any alert edit, retargeting or team move lands on a fresh key; reading
+    the version is a single primary-key lookup.
+    """
+    version = read_change_counter(ALERTS_VERSION_COUNTER)
+    key = f"visible-alerts:{version}:{user.pk}:{user.team_id}"
+    windows = cache.get(key)
+    if windows is None:
+        windows = list(visible_alerts_query(user).values_list("id", "start_at", "expires_at"))
+        cache.set(key, windows, CACHE_TIMEOUT)
+    return windows
+
+
+def visible_alert_ids(user: User, now: datetime | None = None) -> list[int]:
+    """Ids of alerts visible to ``user`` that are inside their active window right now."""
+    now = now or timezone.now()
+    return [
+        alert_id
+        for alert_id, start_at, expires_at in visible_alert_windows(user)
+        if start_at <= now and (expires_at is None or now < expires_at)
+    ]
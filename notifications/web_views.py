@@ -2,11 +2,13 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import logout as auth_logout
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
 
 from .forms import AlertForm, TeamForm, AdminUserForm
 from .models import Alert, Team, User, UserAlertPreference
-from .services import deliver_alert
+from .services import SnoozeDuration, enqueue_fanout, ensure_preferences, mark_read, snooze, snooze_until
+from .streams import supports_streaming
+from .unread import unread_count
+from .visibility import visible_alert_ids
 
 
 def home(request):
@@ -21,35 +23,20 @@ def logout_to_home(request):
 @login_required
 def dashboard(request):
     user = request.user
-    now = timezone.now()
-    # visible = Alert.objects.filter(archived=False).filter(
-    #     (Alert.objects.none() | Alert.objects.all())
-    # )
-    # # Same logic as API, expanded for readability
-    # visible = Alert.objects.filter(archived=False)
-    # visible = visible.filter(start_at__lte=now).filter(
-    #     (timezone.now() is not None)
-    # )
-    visible = Alert.objects.filter(archived=False, start_at__lte=now)
-
-    # Build visibility query
-    from django.db.models import Q
-
-    q = Q(visibility=Alert.VISIBILITY_ORG)
-    if user.team_id:
-        q |= Q(visibility=Alert.VISIBILITY_TEAM, target_teams__in=[user.team_id])
-    q |= Q(visibility=Alert.VISIBILITY_USER, target_users=user)
-    visible = visible.filter(q).distinct()
-
-    prefs = []
-    for alert in visible:
-        pref, _ = UserAlertPreference.objects.get_or_create(alert=alert, user=user)
-        prefs.append(pref)
+    alert_ids = visible_alert_ids(user)
+    ensure_preferences(user, alert_ids)
+    prefs = (
+        UserAlertPreference.objects.filter(user=user, alert_id__in=alert_ids)
+        .select_related("alert")
+        .order_by("alert_id")
+    )
     return render(
         request,
         "dashboard.html",
         {
             "preferences": prefs,
+            "unread_count": unread_count(user),
+            "live_updates": supports_streaming(request),
         },
     )
 
@@ -105,8 +92,8 @@ def manage_alerts(request, alert_id: int | None = None):
             form.save_m2m()
             messages.success(request, "Alert saved")
             if "deliver_now" in request.POST:
-                delivered = deliver_alert(alert)
-                messages.info(request, f"Delivered to {delivered} users")
+                job = enqueue_fanout(alert, requested_by=request.user)
+                messages.info(request, f"Delivery queued as job #{job.pk}")
             return redirect("manage_alerts")
     else:
         form = AlertForm(instance=alert_instance)
@@ -118,19 +105,21 @@ def manage_alerts(request, alert_id: int | None = None):
 
 @login_required
 def toggle_read(request, pref_id: int):
-    pref = get_object_or_404(UserAlertPreference, id=pref_id, user=request.user)
-    pref.is_read = not pref.is_read
-    pref.save(update_fields=["is_read", "updated_at"])
+    pref = get_object_or_404(UserAlertPreference.objects.select_related("alert"), id=pref_id, user=request.user)
+    mark_read(pref, not pref.is_read)
     messages.success(request, f"Marked as {'read' if pref.is_read else 'unread'}")
     return redirect("dashboard")
 
 
 @login_required
-def snooze_today(request, pref_id: int):
-    pref = get_object_or_404(UserAlertPreference, id=pref_id, user=request.user)
-    pref.snoozed_on = timezone.localdate()
-    pref.save(update_fields=["snoozed_on", "updated_at"])
-    messages.info(request, "Snoozed for today")
+def snooze_pref(request, pref_id: int):
+    pref = get_object_or_404(UserAlertPreference.objects.select_related("alert"), id=pref_id, user=request.user)
+    duration = request.GET.get("duration", SnoozeDuration.TOMORROW)
+    if duration not in SnoozeDuration.values:
+        messages.error(request, "Unknown snooze duration")
+        return redirect("dashboard")
+    snooze(pref, snooze_until(request.user, duration))
+    messages.info(request, f"Snoozed: {SnoozeDuration(duration).label.lower()}")
     return redirect("dashboard")
 
 